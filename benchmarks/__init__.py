@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарки Telegram Bot для 3X-UI.
+
+Запуск из корня репозитория:
+    python -m benchmarks.gen_authlog --lines 1000000 --output /tmp/auth.log
+    python -m benchmarks.run --output results.json --compare previous.json
+"""
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Общая подготовка окружения для бенчмарков"""
+
+import json
+import os
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(REPO_DIR, 'src')
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def prepare_environment(workdir=None, **overrides):
+    """
+    Подготовить рабочий каталог с тестовым config.json и сделать модули из src/ импортируемыми.
+    Модули бота читают config.json из текущего каталога при импорте, поэтому
+    функция меняет текущий каталог. Возвращает путь к рабочему каталогу.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix='bot-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    bench_config = {
+        "telegram_token": "123456:BENCHMARK",
+        "owner_chat_id": 1,
+        "panel_port": 54321,
+        "panel_url": "http://127.0.0.1:54321/panel",
+        "access_duration_minutes": 30,
+        "check_interval_seconds": 60,
+        "ssh_log_file": os.path.join(workdir, 'auth.log'),
+        "log_file": os.path.join(workdir, 'telegram-bot.log'),
+    }
+    bench_config.update(overrides)
+    with open(os.path.join(workdir, 'config.json'), 'w') as f:
+        json.dump(bench_config, f, indent=4)
+
+    os.chdir(workdir)
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+    return workdir
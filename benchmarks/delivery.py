@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Сравнение задержки «обновление -> ответ» в режимах polling и webhook.
+
+Бот запускается целиком (bot.main) против локального FakeTelegramServer;
+каждая команда /help внедряется только после получения ответа на предыдущую,
+поэтому измеряется чистая задержка доставки и обработки одного обновления.
+
+    python -m benchmarks.delivery --updates 300 --output delivery.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import queue
+import socket
+import statistics
+import threading
+import time
+
+from benchmarks.common import prepare_environment
+from benchmarks.fake_telegram import FakeTelegramServer
+
+OWNER_CHAT_ID = 1
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def measure(mode, updates, warmup, results):
+    """Выполняется в отдельном процессе: модуль bot читает конфиг один раз при импорте"""
+    server = FakeTelegramServer().start()
+    webhook_port = free_port()
+    prepare_environment(
+        owner_chat_id=OWNER_CHAT_ID,
+        telegram_api_url=server.url,
+        # Замер идет подряд из одного чата: ограничение частоты исказило бы результат
+        chat_rate_limit_per_minute=0,
+        delivery_mode=mode,
+        webhook={
+            "listen": "127.0.0.1",
+            "port": webhook_port,
+            "url_path": "telegram",
+            "public_url": f"http://127.0.0.1:{webhook_port}/telegram",
+        },
+    )
+    import bot
+
+    ready = threading.Event()
+    replies = queue.Queue()
+
+    def listener(timestamp, method, params):
+        if method in ('getUpdates', 'setWebhook'):
+            ready.set()
+        elif method == 'sendMessage':
+            replies.put(timestamp)
+
+    server.listeners.append(listener)
+    threading.Thread(target=bot.main, name="BotThread", daemon=True).start()
+    if not ready.wait(30):
+        results.put({"mode": mode, "error": "бот не начал принимать обновления"})
+        return
+    time.sleep(0.5)
+
+    latencies = []
+    for i in range(warmup + updates):
+        sent = time.perf_counter()
+        server.inject_message(OWNER_CHAT_ID, '/help')
+        try:
+            received = replies.get(timeout=15)
+        except queue.Empty:
+            results.put({"mode": mode, "error": f"нет ответа на обновление {i}"})
+            return
+        if i >= warmup:
+            latencies.append(received - sent)
+
+    results.put({
+        "mode": mode,
+        "updates": len(latencies),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка обновление -> ответ: polling против webhook")
+    parser.add_argument('--modes', nargs='*', default=['polling', 'webhook'], help="Режимы доставки")
+    parser.add_argument('--updates', type=int, default=200, help="Количество измеряемых обновлений")
+    parser.add_argument('--warmup', type=int, default=10, help="Количество прогревочных обновлений")
+    parser.add_argument('--output', help="Файл для записи результатов в JSON")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    report = []
+    for mode in args.modes:
+        results = context.Queue()
+        process = context.Process(target=measure, args=(mode, args.updates, args.warmup, results))
+        process.start()
+        result = results.get(timeout=600)
+        process.terminate()
+        process.join()
+        report.append(result)
+        if 'error' in result:
+            print(f"{mode:<8} ошибка: {result['error']}")
+        else:
+            print(f"{mode:<8} p50 {result['p50_ms']:.2f} мс  p95 {result['p95_ms']:.2f} мс  "
+                  f"p99 {result['p99_ms']:.2f} мс  (n={result['updates']})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный заменитель Telegram Bot API для бенчмарков.
+
+Понимает методы, которыми пользуется бот (getMe, getUpdates, sendMessage,
+setMyCommands, setWebhook/deleteWebhook, answerCallbackQuery и т.д.),
+раздает внедренные обновления через long polling или POST на webhook
+и запоминает время каждого исходящего вызова бота.
+
+Умеет внедрять обновления с заданной частотой (inject_at_rate) и имитировать
+ограничение Telegram на отправку сообщений в один чат: при превышении
+rate_limit_per_chat отвечает 429 с retry_after, как настоящий Bot API.
+"""
+
+import itertools
+import json
+import math
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+BOT_USER = {
+    "id": 123456, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot",
+    "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False,
+}
+
+SEND_METHODS = ('sendMessage', 'editMessageText', 'sendPhoto', 'sendDocument')
+
+INT_PARAMS = {'chat_id', 'message_id', 'offset', 'limit', 'timeout', 'max_connections'}
+
+
+def _decode_param(name, value):
+    if name in INT_PARAMS:
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    if value[:1] in ('{', '['):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+class FakeTelegramServer:
+    """HTTP сервер, имитирующий Bot API. Запускается в фоновом потоке"""
+
+    def __init__(self, host='127.0.0.1', port=0, rate_limit_per_chat=None):
+        self.rate_limit_per_chat = rate_limit_per_chat
+        self.chat_sends = {}      # chat_id -> времена последних отправок (для имитации 429)
+        self.throttled = 0
+        self.updates = []
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.condition = threading.Condition()
+        self.calls = []           # (время, метод, параметры)
+        self.listeners = []       # функции (время, метод, параметры)
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.webhook_pool = ThreadPoolExecutor(max_workers=8)
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="FakeTelegram", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.webhook_pool.shutdown(wait=False)
+
+    # --- внедрение обновлений ---
+
+    @staticmethod
+    def _user(chat_id):
+        return {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}
+
+    def make_message(self, chat_id, text):
+        message = {
+            "message_id": next(self.message_ids), "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "from": self._user(chat_id), "text": text,
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return message
+
+    def inject_message(self, chat_id, text):
+        """Внедрить текстовое сообщение (или команду) от пользователя"""
+        return self.inject_update({"message": self.make_message(chat_id, text)})
+
+    def inject_callback(self, chat_id, data):
+        """Внедрить нажатие inline кнопки"""
+        return self.inject_update({"callback_query": {
+            "id": str(next(self.message_ids)), "from": self._user(chat_id), "chat_instance": str(chat_id),
+            "data": data, "message": self.make_message(chat_id, "menu"),
+        }})
+
+    def inject_update(self, update):
+        """Поставить обновление в очередь getUpdates или отправить его на webhook"""
+        update = dict(update, update_id=next(self.update_ids))
+        if self.webhook_url:
+            self.webhook_pool.submit(self._post_webhook, update)
+        else:
+            with self.condition:
+                self.updates.append(update)
+                self.condition.notify_all()
+        return update['update_id']
+
+    def inject_at_rate(self, factory, count, rate, on_inject=None):
+        """
+        Внедрять count обновлений с частотой rate в секунду в фоновом потоке.
+        factory(i) возвращает (chat_id, text) для сообщения или (chat_id, None, data) для кнопки.
+        on_inject(i, chat_id, время) вызывается сразу после внедрения. Возвращает поток.
+        """
+        def worker():
+            interval = 1.0 / rate
+            started = time.perf_counter()
+            for i in range(count):
+                # Расписание от точки старта, чтобы задержки потока не снижали частоту
+                delay = started + i * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                item = factory(i)
+                chat_id = item[0]
+                if len(item) == 3:
+                    self.inject_callback(chat_id, item[2])
+                else:
+                    self.inject_message(chat_id, item[1])
+                if on_inject:
+                    on_inject(i, chat_id, time.perf_counter())
+
+        thread = threading.Thread(target=worker, name="FakeTelegramInjector", daemon=True)
+        thread.start()
+        return thread
+
+    def _post_webhook(self, update):
+        request = urllib.request.Request(
+            self.webhook_url, data=json.dumps(update).encode(), method='POST',
+            headers={"Content-Type": "application/json",
+                     "X-Telegram-Bot-Api-Secret-Token": self.webhook_secret or ""},
+        )
+        try:
+            urllib.request.urlopen(request, timeout=10).read()
+        except Exception as e:
+            print(f"fake_telegram: ошибка доставки на webhook: {e}")
+
+    # --- обработка методов Bot API ---
+
+    def _record(self, method, params):
+        now = time.perf_counter()
+        self.calls.append((now, method, params))
+        for listener in list(self.listeners):
+            listener(now, method, params)
+
+    def _retry_after(self, chat_id):
+        """Секунды до снятия ограничения для чата или None, если отправлять можно"""
+        if not self.rate_limit_per_chat:
+            return None
+        now = time.monotonic()
+        with self.condition:
+            window = [t for t in self.chat_sends.get(chat_id, []) if now - t < 1.0]
+            if len(window) >= self.rate_limit_per_chat:
+                self.chat_sends[chat_id] = window
+                self.throttled += 1
+                return max(1, math.ceil(1.0 - (now - window[0])))
+            window.append(now)
+            self.chat_sends[chat_id] = window
+        return None
+
+    def handle(self, method, params):
+        """Выполнить метод Bot API, вернуть (ok, result или описание ошибки, параметры ошибки)"""
+        if method in SEND_METHODS:
+            retry_after = self._retry_after(params.get('chat_id', 0))
+            if retry_after is not None:
+                self._record('throttled:' + method, params)
+                return False, (429, f"Too Many Requests: retry after {retry_after}"), {"retry_after": retry_after}
+        self._record(method, params)
+        if method == 'getMe':
+            return True, BOT_USER, None
+        if method == 'getUpdates':
+            return True, self._get_updates(params), None
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url') or None
+            self.webhook_secret = params.get('secret_token')
+            return True, True, None
+        if method == 'deleteWebhook':
+            self.webhook_url = None
+            return True, True, None
+        if method == 'getWebhookInfo':
+            return True, {"url": self.webhook_url or "", "has_custom_certificate": False,
+                          "pending_update_count": len(self.updates)}, None
+        if method in SEND_METHODS:
+            message = self.make_message(params.get('chat_id', 0), params.get('text') or params.get('caption') or '')
+            message["from"] = {k: BOT_USER[k] for k in ('id', 'is_bot', 'first_name', 'username')}
+            return True, message, None
+        return True, True, None
+
+    def _get_updates(self, params):
+        offset = params.get('offset', 0)
+        timeout = min(float(params.get('timeout', 0)), 30)
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                self.updates = [u for u in self.updates if u['update_id'] >= offset]
+                if self.updates or time.monotonic() >= deadline:
+                    return self.updates[:params.get('limit', 100)]
+                self.condition.wait(deadline - time.monotonic())
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Заголовки и тело уходят отдельными записями: без TCP_NODELAY задержка
+            # подтверждений добавляла бы ~40 мс к каждому ответу
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _params(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('application/json'):
+                    return json.loads(body or b'{}')
+                if content_type.startswith('multipart/form-data'):
+                    message = BytesParser(policy=default_policy).parsebytes(
+                        b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body
+                    )
+                    params = {}
+                    for part in message.iter_parts():
+                        name = part.get_param('name', header='content-disposition')
+                        if part.get_filename():
+                            params[name] = part.get_payload(decode=True)
+                        else:
+                            params[name] = _decode_param(name, part.get_content().strip())
+                    return params
+                return {name: _decode_param(name, values[-1])
+                        for name, values in parse_qs(body.decode()).items()}
+
+            def do_POST(self):
+                method = self.path.rstrip('/').rsplit('/', 1)[-1]
+                ok, result, error = server.handle(method, self._params())
+                if ok:
+                    payload = {"ok": True, "result": result}
+                    status = 200
+                else:
+                    payload = {"ok": False, "error_code": result[0], "description": result[1]}
+                    if error:
+                        payload["parameters"] = error
+                    status = result[0]
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент закрыл соединение (например, остановился long polling)
+                    pass
+
+            do_GET = do_POST
+
+        return Handler
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Генератор синтетического auth.log для бенчмарков.
+
+Смешивает ISO 8601 и syslog отметки времени, строки Accepted/Failed/Invalid user,
+«шумовые» строки sshd/CRON/sudo и адреса IPv4/IPv6. Основная масса неудачных
+попыток приходится на небольшой пул атакующих адресов, как при brute-force.
+
+    python -m benchmarks.gen_authlog --lines 1000000 --output /tmp/auth.log --seed 42
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta, timezone
+
+USERS = ['root', 'admin', 'ubuntu', 'test', 'oracle', 'postgres', 'git', 'user', 'deploy', 'ftpuser']
+LEGIT_USERS = ['root', 'deploy']
+AUTH_TYPES = ['password', 'publickey']
+
+NOISE_TEMPLATES = [
+    'sshd[{pid}]: Connection closed by {ip} port {port} [preauth]',
+    'sshd[{pid}]: Received disconnect from {ip} port {port}:11: Bye Bye [preauth]',
+    'sshd[{pid}]: Disconnected from authenticating user {user} {ip} port {port} [preauth]',
+    'sshd[{pid}]: pam_unix(sshd:auth): authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost={ip}',
+    'sshd[{pid}]: pam_unix(sshd:session): session opened for user {user}(uid=0) by (uid=0)',
+    'CRON[{pid}]: pam_unix(cron:session): session opened for user root(uid=0) by (uid=0)',
+    'CRON[{pid}]: pam_unix(cron:session): session closed for user root',
+    'systemd-logind[{pid}]: New session {pid} of user {user}.',
+    'sudo: pam_unix(sudo:session): session closed for user root',
+]
+
+
+def random_ipv4(rng):
+    return f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+
+def random_ipv6(rng):
+    return "2001:db8:" + ":".join(f"{rng.randint(0, 0xffff):x}" for _ in range(6))
+
+
+class AuthLogGenerator:
+    """Потоковый генератор строк auth.log с воспроизводимым зерном"""
+
+    def __init__(self, seed=42, iso_ratio=0.5, ipv6_ratio=0.1, attackers=50,
+                 start=None, hostname='vpn-node', lines_per_second=50):
+        self.rng = random.Random(seed)
+        self.iso_ratio = iso_ratio
+        self.ipv6_ratio = ipv6_ratio
+        self.hostname = hostname
+        self.step = 1.0 / lines_per_second
+        self.now = start or datetime(2025, 9, 17, 10, 0, 0, tzinfo=timezone(timedelta(hours=3)))
+        self.attacker_ips = [self._new_ip() for _ in range(attackers)]
+        self.legit_ips = [self._new_ip() for _ in range(3)]
+
+    def _new_ip(self):
+        if self.rng.random() < self.ipv6_ratio:
+            return random_ipv6(self.rng)
+        return random_ipv4(self.rng)
+
+    def _timestamp(self):
+        self.now += timedelta(seconds=self.rng.expovariate(1.0 / self.step))
+        if self.rng.random() < self.iso_ratio:
+            return self.now.isoformat(timespec='microseconds')
+        return f"{self.now:%b} {self.now.day:>2} {self.now:%H:%M:%S}"
+
+    def _attacker_ip(self):
+        # 80% попыток - от постоянного пула атакующих, остальные - случайные адреса
+        if self.rng.random() < 0.8:
+            return self.rng.choice(self.attacker_ips)
+        return self._new_ip()
+
+    def line(self):
+        """Сгенерировать одну строку лога (без перевода строки)"""
+        rng = self.rng
+        pid = rng.randint(1000, 99999)
+        port = rng.randint(1024, 65535)
+        kind = rng.random()
+
+        if kind < 0.50:
+            body = (f"sshd[{pid}]: Failed password for {rng.choice(USERS)} "
+                    f"from {self._attacker_ip()} port {port} ssh2")
+        elif kind < 0.65:
+            body = f"sshd[{pid}]: Invalid user {rng.choice(USERS)} from {self._attacker_ip()} port {port}"
+        elif kind < 0.67:
+            body = (f"sshd[{pid}]: Accepted {rng.choice(AUTH_TYPES)} for {rng.choice(LEGIT_USERS)} "
+                    f"from {rng.choice(self.legit_ips)} port {port} ssh2")
+        else:
+            body = rng.choice(NOISE_TEMPLATES).format(
+                pid=pid, port=port, ip=self._attacker_ip(), user=rng.choice(USERS)
+            )
+        return f"{self._timestamp()} {self.hostname} {body}"
+
+    def lines(self, count):
+        for _ in range(count):
+            yield self.line()
+
+
+def write_auth_log(path, count, batch=10000, mode='w', **kwargs):
+    """Записать count строк в файл; возвращает генератор для дозаписи"""
+    generator = AuthLogGenerator(**kwargs)
+    with open(path, mode) as f:
+        written = 0
+        while written < count:
+            size = min(batch, count - written)
+            f.write("\n".join(generator.lines(size)) + "\n")
+            written += size
+    return generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетического auth.log")
+    parser.add_argument('--lines', type=int, default=100000, help="Количество строк")
+    parser.add_argument('--output', default='auth.log', help="Путь к выходному файлу")
+    parser.add_argument('--seed', type=int, default=42, help="Зерно генератора (для воспроизводимости)")
+    parser.add_argument('--iso-ratio', type=float, default=0.5, help="Доля строк с ISO 8601 временем")
+    parser.add_argument('--ipv6-ratio', type=float, default=0.1, help="Доля IPv6 адресов")
+    parser.add_argument('--attackers', type=int, default=50, help="Размер пула атакующих адресов")
+    args = parser.parse_args()
+
+    write_auth_log(
+        args.output, args.lines, seed=args.seed, iso_ratio=args.iso_ratio,
+        ipv6_ratio=args.ipv6_ratio, attackers=args.attackers
+    )
+    print(f"Записано {args.lines} строк в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный прогон бота: тысячи команд и нажатий кнопок через настоящий Application.
+
+Обновления внедряются в FakeTelegramServer с заданной частотой, UFW/systemctl и
+прочие внешние команды заменены FakeSystem, поэтому прогон безопасен на любой машине.
+Отчет: пропускная способность, распределение задержек «обновление -> ответ»,
+простои цикла событий и сработавшие ограничения 429.
+
+С --stranger-share часть обновлений приходит из чужих чатов: на них бот должен
+ответить не больше одного раза на чат, остальное отбрасывается фильтром access.py.
+
+    python -m benchmarks.load --updates 3000 --rate 300
+    python -m benchmarks.load --updates 200 --rate 20 --real-cpu-sampling --rate-limit 20
+    python -m benchmarks.load --updates 3000 --rate 300 --stranger-share 0.9
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import Counter, deque
+
+from benchmarks.common import prepare_environment
+from benchmarks.fake_telegram import FakeTelegramServer
+
+OWNER_CHAT_ID = 1
+STRANGER_CHAT_IDS = range(1000, 1010)
+
+# Вес каждой операции в нагрузке: команда (текст) или кнопка (callback_data)
+DEFAULT_MIX = {
+    '/start': 3, '/help': 2, '/status': 2, '/perf': 1, '/getlink': 1, '/getlink 203.0.113.7': 1,
+    '/offlink': 1, '/sessions': 1,
+    '/open_ssh': 1, '/close_ssh': 1,
+    'button:status': 2, 'button:get_link': 1, 'button:close_link': 1, 'button:change_config': 1,
+}
+
+UFW_STATUS_HEADER = "Status: active\n\n     To                         Action      From\n     --                         ------      ----\n"
+
+
+class FakeSystem:
+    """Заменитель внешних команд (ufw, systemctl, hostname, lsb_release) с состоянием правил UFW"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.rules = []  # [(порт, действие, источник)]
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def _status(self, numbered):
+        lines = []
+        for number, (port, action, source) in enumerate(self.rules, 1):
+            prefix = f"[{number:>2}] " if numbered else ""
+            lines.append(f"{prefix}{port + '/tcp':<26} {action} IN    {source}")
+        return UFW_STATUS_HEADER + "\n".join(lines) + "\n"
+
+    def _set_rule(self, port, action):
+        self.rules = [rule for rule in self.rules if rule[::2] != (port, 'Anywhere')] + [(port, action, 'Anywhere')]
+
+    def run(self, args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        # ufw --force delete N
+        args = [str(arg) for arg in args if arg != '--force']
+        self.calls[" ".join(args[:2])] += 1
+        stdout = ""
+        with self.lock:
+            if args[:2] == ['ufw', 'status']:
+                stdout = self._status(numbered='numbered' in args)
+            elif args[:2] == ['ufw', 'allow']:
+                self._set_rule(args[-1], 'ALLOW')
+            elif args[:2] == ['ufw', 'deny']:
+                self._set_rule(args[-1], 'DENY ')
+            elif args[:2] == ['ufw', 'prepend']:
+                # ufw prepend allow from IP to any port N proto tcp
+                self.rules.insert(0, (args[7], 'ALLOW', args[4]))
+            elif args[:3] == ['ufw', 'delete', 'allow']:
+                self.rules = [rule for rule in self.rules if rule != (args[7], 'ALLOW', args[4])]
+            elif args[:2] == ['ufw', 'delete']:
+                index = int(args[-1]) - 1
+                if 0 <= index < len(self.rules):
+                    del self.rules[index]
+            elif args[:1] == ['systemctl']:
+                stdout = "active\n"
+            elif args == ['hostname']:
+                stdout = "load-test\n"
+            elif args == ['hostname', '-I']:
+                stdout = "203.0.113.10 2001:db8::10\n"
+            elif args[:1] == ['lsb_release']:
+                stdout = "Description:\tUbuntu 24.04.1 LTS\n"
+        return subprocess.CompletedProcess(args, 0, stdout if kwargs.get('text') else stdout.encode(), "")
+
+
+class LoopMonitor:
+    """Измерение простоев цикла событий: насколько позже запланированного просыпается sleep"""
+
+    def __init__(self, interval=0.01, stall_threshold=0.1):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.max_lag = 0.0
+        self.total_stall = 0.0
+        self.stalls = 0
+        self.samples = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - started - self.interval
+            self.samples += 1
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.stall_threshold:
+                self.stalls += 1
+                self.total_stall += lag
+
+
+def build_plan(count, mix, seed, stranger_share=0.0):
+    """Заранее выбранные операции: [(chat_id, text) или (chat_id, None, data)]"""
+    rng = random.Random(seed)
+    operations = list(mix)
+    weights = [mix[op] for op in operations]
+    plan = []
+    for _ in range(count):
+        op = rng.choices(operations, weights)[0]
+        chat_id = rng.choice(STRANGER_CHAT_IDS) if rng.random() < stranger_share else OWNER_CHAT_ID
+        if op.startswith('button:'):
+            plan.append((chat_id, None, op.split(':', 1)[1]))
+        else:
+            plan.append((chat_id, op))
+    return plan
+
+
+def percentile_ms(sketch, q):
+    value = sketch.quantile(q)
+    return None if value is None else value * 1000
+
+
+async def drive(options):
+    server = FakeTelegramServer(rate_limit_per_chat=options.rate_limit).start()
+    prepare_environment(
+        owner_chat_id=OWNER_CHAT_ID,
+        telegram_api_url=server.url,
+        chat_rate_limit_per_minute=options.chat_rate_limit,
+    )
+
+    import bot
+    import perf
+    from sketches import QuantileSketch
+
+    system = FakeSystem(latency=options.command_latency)
+    bot.run_command = system.run
+    if not options.real_cpu_sampling:
+        # psutil.cpu_percent(interval=1) в /status спит секунду; без флага меряем только накладные расходы бота
+        bot.psutil.cpu_percent = lambda interval=None: 5.0
+
+    plan = build_plan(options.updates, options.mix, options.seed, options.stranger_share)
+    # Ответа ждем только на обновления владельца; чужие чаты отсекает access.py
+    expected = sum(1 for item in plan if item[0] == OWNER_CHAT_ID)
+
+    # Сопоставление ответов с обновлениями: по порядку в пределах чата
+    pending = {}
+    latencies = QuantileSketch()
+    completed = 0
+    done = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    lock = threading.Lock()
+
+    def on_inject(i, chat_id, timestamp):
+        if chat_id != OWNER_CHAT_ID:
+            return
+        with lock:
+            pending.setdefault(chat_id, deque()).append(timestamp)
+
+    def on_call(timestamp, method, params):
+        nonlocal completed
+        if method not in ('sendMessage', 'throttled:sendMessage'):
+            return
+        with lock:
+            queue = pending.get(params.get('chat_id'))
+            if not queue:
+                return
+            latencies.add(timestamp - queue.popleft())
+            completed += 1
+            if completed >= expected:
+                loop.call_soon_threadsafe(done.set)
+
+    server.listeners.append(on_call)
+
+    application = bot.build_application()
+    monitor = LoopMonitor()
+    monitor_task = asyncio.create_task(monitor.run())
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+    await application.start()
+
+    started = time.perf_counter()
+    injector = server.inject_at_rate(plan.__getitem__, options.updates, options.rate, on_inject)
+    try:
+        await asyncio.wait_for(done.wait(), timeout=options.timeout)
+    except asyncio.TimeoutError:
+        print(f"Таймаут: получено {completed} ответов из {expected}")
+    elapsed = time.perf_counter() - started
+    # Последние чужие обновления могут прийти позже последнего ответа владельцу
+    await asyncio.to_thread(injector.join)
+    await asyncio.sleep(0.5)
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    monitor_task.cancel()
+    server.stop()
+    # Таймеры автозакрытия портов (threading.Timer) не дают процессу завершиться
+    for thread in threading.enumerate():
+        if isinstance(thread, threading.Timer):
+            thread.cancel()
+
+    api_calls = Counter(call[1] for call in server.calls)
+    # Отказ на нажатие кнопки уходит через answerCallbackQuery, где нет chat_id
+    stranger_calls = sum(1 for call in server.calls
+                         if (call[1] == 'sendMessage' and call[2].get('chat_id') in STRANGER_CHAT_IDS)
+                         or (call[1] == 'answerCallbackQuery' and 'нет доступа к этому боту' in call[2].get('text', '')))
+    return {
+        "updates": options.updates,
+        "expected": expected,
+        "completed": completed,
+        "offered_rate": options.rate,
+        "elapsed_s": elapsed,
+        "throughput_per_s": completed / elapsed if elapsed else None,
+        "latency_ms": {
+            "p50": percentile_ms(latencies, 0.5),
+            "p95": percentile_ms(latencies, 0.95),
+            "p99": percentile_ms(latencies, 0.99),
+            "max": latencies.max * 1000 if latencies.count else None,
+        },
+        "event_loop": {
+            "max_lag_ms": monitor.max_lag * 1000,
+            "stalls_over_100ms": monitor.stalls,
+            "total_stall_s": monitor.total_stall,
+        },
+        "throttled_429": server.throttled,
+        "stranger_updates": options.updates - expected,
+        "stranger_replies": stranger_calls,
+        "access_dropped": bot.access_control.dropped,
+        "access_throttled": bot.access_control.throttled,
+        "api_calls": dict(api_calls),
+        "system_calls": dict(system.calls),
+        "handlers": [
+            {"name": name, "count": count, "errors": errors,
+             "p50_ms": p50 * 1000, "p95_ms": p95 * 1000, "p99_ms": p99 * 1000}
+            for name, count, errors, p50, p95, p99, _ in perf.snapshot()
+        ],
+    }
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота против тестового Bot API")
+    parser.add_argument('--updates', type=int, default=2000, help="Количество обновлений")
+    parser.add_argument('--rate', type=float, default=200, help="Частота внедрения, обновлений в секунду")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="Смесь операций, например '/start=3,/status=1,button:get_link=1'")
+    parser.add_argument('--seed', type=int, default=42, help="Зерно для выбора операций")
+    parser.add_argument('--rate-limit', type=int, help="Имитировать 429: не больше N сообщений в секунду в чат")
+    parser.add_argument('--chat-rate-limit', type=float, default=0,
+                        help="chat_rate_limit_per_minute бота (0 - без ограничения, как по умолчанию в прогоне)")
+    parser.add_argument('--stranger-share', type=float, default=0.0,
+                        help="Доля обновлений из чужих чатов (0..1)")
+    parser.add_argument('--command-latency', type=float, default=0.0,
+                        help="Искусственная задержка каждой внешней команды, секунд")
+    parser.add_argument('--real-cpu-sampling', action='store_true',
+                        help="Оставить блокирующий psutil.cpu_percent(interval=1) в /status")
+    parser.add_argument('--timeout', type=float, default=600, help="Максимальная длительность прогона, секунд")
+    parser.add_argument('--output', help="Файл для записи отчета в JSON")
+    options = parser.parse_args()
+
+    report = asyncio.run(drive(options))
+
+    latency = report['latency_ms']
+    loop_stats = report['event_loop']
+    print(f"Обработано {report['completed']}/{report['expected']} за {report['elapsed_s']:.2f} с "
+          f"({report['throughput_per_s']:.1f} обновл./с при подаче {options.rate}/с)")
+    if latency['p50'] is not None:
+        print(f"Задержка: p50 {latency['p50']:.1f} мс, p95 {latency['p95']:.1f} мс, "
+              f"p99 {latency['p99']:.1f} мс, max {latency['max']:.1f} мс")
+    print(f"Цикл событий: max lag {loop_stats['max_lag_ms']:.1f} мс, простоев >100 мс: "
+          f"{loop_stats['stalls_over_100ms']} (всего {loop_stats['total_stall_s']:.2f} с)")
+    print(f"Ответов 429: {report['throttled_429']}")
+    print(f"Чужих обновлений: {report['stranger_updates']}, ответов на них: {report['stranger_replies']}, "
+          f"отброшено фильтром: {report['access_dropped']}, ограничено по частоте: {report['access_throttled']}")
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
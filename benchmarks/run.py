@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+"""
+Запуск воспроизводимых бенчмарков и запись результатов в JSON.
+
+    python -m benchmarks.run --lines 200000 --output results.json
+    python -m benchmarks.run --only parse_lines --compare results.json
+
+Каждый бенчмарк выполняется --repeat раз, в результат попадает медиана.
+Бенчмарки, модулям которых не хватает зависимостей (например, python-telegram-bot),
+помечаются как пропущенные, а не роняют весь прогон.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.common import DATA_DIR, REPO_DIR, prepare_environment
+from benchmarks.gen_authlog import AuthLogGenerator, write_auth_log
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Регистрация бенчмарка. Функция получает опции и возвращает (операций, секунд)"""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+@benchmark('parse_lines')
+def bench_parse_lines(options):
+    """Разбор строк auth.log функцией parse_ssh_log_line (строки уже в памяти)"""
+    import ssh_monitor
+
+    generator = AuthLogGenerator(seed=options.seed)
+    lines = list(generator.lines(options.lines))
+    parse = ssh_monitor.parse_ssh_log_line
+
+    start = time.perf_counter()
+    for line in lines:
+        parse(line)
+    return len(lines), time.perf_counter() - start
+
+
+@benchmark('tail_throughput')
+def bench_tail_throughput(options):
+    """Дозапись файла блоками и чтение хвоста logs.read_new_lines + разбор, как в цикле слежения"""
+    import logs
+    import ssh_monitor
+
+    path = os.path.join(options.workdir, 'tail-auth.log')
+    open(path, 'w').close()
+    generator = AuthLogGenerator(seed=options.seed)
+    block = max(1, options.lines // 100)
+    blocks = ["\n".join(generator.lines(block)) + "\n" for _ in range(max(1, options.lines // block))]
+
+    position = 0
+    processed = 0
+    elapsed = 0.0
+    with open(path, 'a') as writer:
+        for chunk in blocks:
+            writer.write(chunk)
+            writer.flush()
+            start = time.perf_counter()
+            new_lines, position = logs.read_new_lines(path, position)
+            for line in new_lines:
+                ssh_monitor.parse_ssh_log_line(line.strip())
+            elapsed += time.perf_counter() - start
+            processed += len(new_lines)
+    return processed, elapsed
+
+
+@benchmark('backlog_replay')
+def bench_backlog_replay(options):
+    """Воспроизведение пропущенного лога replay_backlog (mmap + пул процессов для больших объемов)"""
+    import ssh_monitor
+
+    path = os.path.join(options.workdir, 'replay-auth.log')
+    if not os.path.exists(path):
+        write_auth_log(path, options.lines, seed=options.seed)
+    size = os.path.getsize(path)
+
+    start = time.perf_counter()
+    ssh_monitor.replay_backlog(path, 0, size)
+    return options.lines, time.perf_counter() - start
+
+
+@benchmark('journald_parse')
+def bench_journald_parse(options):
+    """Разбор записанного потока journalctl -o json через JournaldSource"""
+    import ssh_monitor
+
+    with open(os.path.join(DATA_DIR, 'journald_sshd.jsonl'), 'r') as f:
+        recorded = [line for line in f if line.strip()]
+    stream = recorded * max(1, options.lines // len(recorded))
+
+    source = ssh_monitor.JournaldSource(stream=iter(stream), cursor_file=None)
+    source.start()
+    start = time.perf_counter()
+    try:
+        while True:
+            source.poll()
+    except EOFError:
+        pass
+    return len(stream), time.perf_counter() - start
+
+
+def make_ufw_output(rules, port=22):
+    """Синтетический вывод `ufw status numbered` с заданным количеством правил"""
+    lines = ["Status: active", "", "     To                         Action      From",
+             "     --                         ------      ----"]
+    for number in range(1, rules + 1):
+        if number % 50 == 0:
+            target = f"{port}/tcp"
+        else:
+            target = f"{10000 + number}/tcp"
+        action = "ALLOW IN" if number % 3 else "DENY IN "
+        lines.append(f"[{number:>2}] {target:<26} {action}    Anywhere")
+    return "\n".join(lines) + "\n"
+
+
+@benchmark('ufw_parse')
+def bench_ufw_parse(options):
+    """Поиск ALLOW правил порта в выводе ufw (find_ufw_allow_rules / is_port_allowed)"""
+    import bot
+
+    output = make_ufw_output(500)
+    iterations = 2000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        bot.find_ufw_allow_rules(output, 22)
+        bot.is_port_allowed(output, 54321)
+    return iterations, time.perf_counter() - start
+
+
+@benchmark('status_render')
+def bench_status_render(options):
+    """Формирование текста /status из готовых показателей"""
+    import bot
+
+    info = {
+        'hostname': 'vpn-node', 'os_version': 'Ubuntu 24.04.1 LTS', 'ip_address': '203.0.113.10',
+        'uptime': '12 дней, 3 часов, 4 минут', 'cpu_percent': 12.5,
+        'ram_used': 812 * 1024 ** 2, 'ram_total': 2 * 1024 ** 3, 'ram_percent': 39.6,
+        'disk_used': 11 * 1024 ** 3, 'disk_total': 40 * 1024 ** 3, 'disk_percent': 27.5,
+        'load_avg': (0.42, 0.35, 0.30), 'xui_active': True,
+    }
+    iterations = 20000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        bot.render_status(info)
+    return iterations, time.perf_counter() - start
+
+
+def make_proc_net_tcp(path, sockets, seed=42, ipv6=False):
+    """Синтетический /proc/net/tcp(6): слушающие порты и входящие/исходящие соединения"""
+    import random
+    rng = random.Random(seed)
+    listen_ports = [22, 443, 2053, 8443, 54321]
+    if ipv6:
+        header = ("  sl  local_address                         remote_address                        "
+                  "st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n")
+    else:
+        header = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+    def address(octets):
+        if ipv6:
+            # IPv4-mapped ::ffff:a.b.c.d, слова в порядке байт хоста
+            raw = bytes(10) + b'\xff\xff' + bytes(octets)
+            return "".join(raw[i:i + 4][::-1].hex().upper() for i in range(0, 16, 4))
+        return bytes(octets)[::-1].hex().upper()
+
+    local = address([203, 0, 113, 10])
+    rows = []
+    for port in listen_ports:
+        rows.append((address([0, 0, 0, 0]), port, address([0, 0, 0, 0]), 0, '0A'))
+    for _ in range(sockets - len(listen_ports)):
+        remote = address([rng.randint(1, 223), rng.randint(0, 255), rng.randint(0, 255), rng.randint(1, 254)])
+        if rng.random() < 0.8:
+            rows.append((local, rng.choice(listen_ports), remote, rng.randint(1024, 65535), '01'))
+        else:
+            rows.append((local, rng.randint(32768, 60999), remote, 443, rng.choice(['01', '06', '08'])))
+    with open(path, 'w') as f:
+        f.write(header)
+        for sl, (laddr, lport, raddr, rport, state) in enumerate(rows):
+            f.write(f"{sl:>4}: {laddr}:{lport:04X} {raddr}:{rport:04X} {state} 00000000:00000000 "
+                    f"00:00000000 00000000  1000        0 {100000 + sl} 1 0000000000000000 20 4 30 10 -1\n")
+
+
+@benchmark('connections_scan')
+def bench_connections_scan(options):
+    """Разбор /proc/net/tcp и tcp6 на 50k сокетов и сводка /connections"""
+    import connections
+
+    paths = (os.path.join(options.workdir, 'proc_net_tcp'), os.path.join(options.workdir, 'proc_net_tcp6'))
+    if not os.path.exists(paths[0]):
+        make_proc_net_tcp(paths[0], 30000, seed=options.seed)
+        make_proc_net_tcp(paths[1], 20000, seed=options.seed + 1, ipv6=True)
+
+    iterations = 5
+    start = time.perf_counter()
+    for _ in range(iterations):
+        stats = connections.scan_connections(paths)
+        connections.render_connections(stats, {22: 'SSH'})
+    return iterations, time.perf_counter() - start
+
+
+@benchmark('service_wheel')
+def bench_service_wheel(options):
+    """Час работы колеса таймеров на 500 юнитов с разными интервалами и пакетным systemctl show"""
+    import random
+    import types
+
+    import services
+
+    rng = random.Random(options.seed)
+    units = [services.WatchedUnit(f"unit{i}.service", interval=rng.choice((10, 15, 30, 60, 120, 300)))
+             for i in range(500)]
+    block = "Id={}\nLoadState=loaded\nActiveState=active\nSubState=running\nNRestarts=0"
+
+    def run_command(command, **kwargs):
+        names = command[command.index('--') + 1:]
+        return types.SimpleNamespace(stdout="\n\n".join(block.format(name) for name in names) + "\n")
+
+    watcher = services.ServiceWatcher(units, run_command)
+    wheel = services.TimerWheel(tick_seconds=1)
+    for unit in units:
+        wheel.schedule(unit.unit, unit.interval)
+
+    ticks = 3600
+    start = time.perf_counter()
+    for _ in range(ticks):
+        names = wheel.advance()
+        for name in names:
+            wheel.schedule(name, watcher.units[name].interval)
+        if names:
+            watcher.check(names)
+    return ticks, time.perf_counter() - start
+
+
+@benchmark('backup_snapshot')
+def bench_backup_snapshot(options):
+    """Снимок, gzip и дедупликация кусков для базы ~8 МБ (после первой копии в архиве)"""
+    import random
+    import sqlite3
+
+    import backup
+
+    db_path = os.path.join(options.workdir, 'x-ui.db')
+    archive_dir = os.path.join(options.workdir, 'backups')
+    if not os.path.exists(db_path):
+        rng = random.Random(options.seed)
+        db = sqlite3.connect(db_path)
+        db.execute('CREATE TABLE client_traffics (id INTEGER PRIMARY KEY, email TEXT, up INTEGER, down INTEGER)')
+        db.executemany('INSERT INTO client_traffics (email, up, down) VALUES (?, ?, ?)',
+                       [(f"{rng.getrandbits(128):032x}@example.com", rng.getrandbits(40), rng.getrandbits(40))
+                        for _ in range(100000)])
+        db.commit()
+        db.close()
+        os.remove(backup.create_backup(db_path, archive_dir).export_path)
+
+    iterations = 2
+    start = time.perf_counter()
+    for _ in range(iterations):
+        os.remove(backup.create_backup(db_path, archive_dir).export_path)
+    return iterations, time.perf_counter() - start
+
+
+@benchmark('client_scan')
+def bench_client_scan(options):
+    """Перечитывание 50k клиентов client_traffics после изменения 1% строк и поиск предупреждений"""
+    import random
+    import sqlite3
+
+    import clients
+
+    db_path = os.path.join(options.workdir, 'clients.db')
+    rng = random.Random(options.seed)
+    if not os.path.exists(db_path):
+        now = int(time.time() * 1000)
+        db = sqlite3.connect(db_path)
+        db.execute('CREATE TABLE client_traffics (id INTEGER PRIMARY KEY, inbound_id INTEGER, enable INTEGER, '
+                   'email TEXT, up INTEGER, down INTEGER, expiry_time INTEGER, total INTEGER, reset INTEGER)')
+        db.executemany('INSERT INTO client_traffics VALUES (?, 1, 1, ?, ?, ?, ?, ?, 0)', [
+            (i, f"user{i}@example.com", rng.getrandbits(34), rng.getrandbits(34),
+             now + rng.randrange(-5, 60) * 86400000 if rng.random() < 0.8 else 0,
+             rng.choice((0, 50 << 30, 100 << 30)))
+            for i in range(1, 50001)
+        ])
+        db.commit()
+        db.close()
+
+    scanner = clients.ClientScanner(db_path)
+    scanner.refresh()
+    scanner.check()
+    writer = sqlite3.connect(db_path)
+    iterations = 10
+    elapsed = 0.0
+    for _ in range(iterations):
+        writer.executemany('UPDATE client_traffics SET up = up + ? WHERE id = ?',
+                           [(rng.getrandbits(30), rng.randrange(1, 50001)) for _ in range(500)])
+        writer.commit()
+        start = time.perf_counter()
+        scanner.refresh()
+        scanner.check()
+        elapsed += time.perf_counter() - start
+    writer.close()
+    return iterations, elapsed
+
+
+@benchmark('ssh_stats')
+def bench_ssh_stats(options):
+    """Учет 100k событий sshd за 3 суток и запросы /ssh_stats за 30m, 24h и 7d"""
+    import random
+
+    import ssh_stats
+
+    rng = random.Random(options.seed)
+    now = time.time()
+    events = [('failed' if rng.random() < 0.95 else 'success',
+               f"203.0.{rng.randrange(8)}.{int(rng.paretovariate(1.2)) % 255}",
+               rng.choice(('root', 'admin', 'ubuntu', f"user{rng.randrange(1000)}")),
+               now - rng.random() * 3 * 86400)
+              for _ in range(100000)]
+
+    start = time.perf_counter()
+    stats = ssh_stats.SSHStats()
+    for event in events:
+        stats.record(*event)
+    queries = 0
+    for _ in range(20):
+        for window in (1800, 86400, 7 * 86400):
+            ssh_stats.render_stats(stats, window)
+            queries += 1
+    return len(events) + queries, time.perf_counter() - start
+
+
+@benchmark('probes')
+def bench_probes(options):
+    """Пять раундов TCP проб 500 целей на локальный порт из одного цикла событий"""
+    import asyncio
+    import socket
+    import threading
+
+    import probes
+
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(4096)
+    port = server.getsockname()[1]
+
+    def accept():
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                return
+            connection.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    monitor = probes.ProbeMonitor([probes.Target(f"t{i}", '127.0.0.1', port) for i in range(500)])
+
+    async def rounds(count):
+        semaphore = asyncio.Semaphore(monitor.max_concurrency)
+
+        async def probe(target):
+            async with semaphore:
+                await monitor.probe(target)
+
+        for _ in range(count):
+            await asyncio.gather(*(probe(target) for target in monitor.targets))
+
+    start = time.perf_counter()
+    asyncio.run(rounds(5))
+    elapsed = time.perf_counter() - start
+    server.close()
+    return monitor.probes, elapsed
+
+
+@benchmark('process_sample')
+def bench_process_sample(options):
+    """Обход процессов системы ProcessSampler и выбор топа по CPU и памяти"""
+    import processes
+
+    sampler = processes.ProcessSampler()
+    sampler.sample()
+    iterations = 20
+    start = time.perf_counter()
+    for _ in range(iterations):
+        sampler.sample()
+        processes.render_top(sampler)
+        processes.render_top(sampler, by='mem')
+    return iterations, time.perf_counter() - start
+
+
+@benchmark('logs_tail')
+def bench_logs_tail(options):
+    """/logs: хвост и поиск с конца лога (блоками) и по сжатой ротированной копии"""
+    import gzip
+    import shutil
+    import logs
+
+    path = os.path.join(options.workdir, 'logs-auth.log')
+    if not os.path.exists(path):
+        write_auth_log(path + '.1', options.lines, seed=options.seed + 1)
+        with open(path + '.1', 'rb') as src, gzip.open(path + '.1.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path + '.1')
+        write_auth_log(path, options.lines, seed=options.seed)
+    queries = [(50, None), (200, None), (20, 'Accepted'), (20, r'user \w+ from 10\.'), (20, 'не встречается')]
+
+    start = time.perf_counter()
+    for count, pattern in queries:
+        logs.tail(path, count, pattern)
+    return len(queries), time.perf_counter() - start
+
+
+@benchmark('prefix_match')
+def bench_prefix_match(options):
+    """Поиск самого длинного префикса для адресов SSH входов в дереве доверенных сетей (IPv4 и IPv6)"""
+    import ipaddress
+    import random
+    import prefixes
+
+    rng = random.Random(options.seed)
+    known = prefixes.KnownNetworks(path=os.path.join(options.workdir, 'known_networks.json'), log=lambda message: None)
+    for _ in range(5000):
+        known.add(ipaddress.ip_network((rng.getrandbits(32), rng.choice((8, 16, 20, 24, 28))), strict=False))
+        known.add(ipaddress.ip_network((rng.getrandbits(128), rng.choice((32, 48, 56, 64))), strict=False))
+    addresses = [str(ipaddress.ip_address(rng.getrandbits(32))) for _ in range(50000)]
+    addresses += [str(ipaddress.ip_address(rng.getrandbits(128))) for _ in range(10000)]
+
+    start = time.perf_counter()
+    for address in addresses:
+        known.match(address)
+    return len(addresses), time.perf_counter() - start
+
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, timeout=5)
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmarks(options):
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if options.only and name not in options.only:
+            continue
+        runs = []
+        try:
+            for _ in range(options.repeat):
+                ops, seconds = func(options)
+                runs.append((ops, seconds))
+        except ImportError as e:
+            results[name] = {"skipped": f"нет зависимости: {e}"}
+            print(f"{name:<18} пропущен ({e})")
+            continue
+
+        seconds = statistics.median(run[1] for run in runs)
+        ops = runs[0][0]
+        results[name] = {
+            "ops": ops,
+            "seconds": seconds,
+            "ops_per_sec": ops / seconds if seconds else None,
+            "runs": [run[1] for run in runs],
+        }
+        print(f"{name:<18} {ops:>10} оп. за {seconds:.4f} с  ({ops / seconds:,.0f} оп./с)")
+    return results
+
+
+def compare(results, previous_path):
+    """Вывести сравнение с предыдущим файлом результатов"""
+    with open(previous_path, 'r') as f:
+        previous = json.load(f).get('results', {})
+    print(f"\nСравнение с {previous_path}:")
+    for name, current in results.items():
+        old = previous.get(name)
+        if not old or 'ops_per_sec' not in old or 'ops_per_sec' not in current:
+            continue
+        ratio = current['ops_per_sec'] / old['ops_per_sec']
+        print(f"{name:<18} {ratio:>6.2f}x  ({old['ops_per_sec']:,.0f} -> {current['ops_per_sec']:,.0f} оп./с)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки Telegram Bot для 3X-UI")
+    parser.add_argument('--lines', type=int, default=100000, help="Размер синтетического лога в строках")
+    parser.add_argument('--repeat', type=int, default=3, help="Количество повторов каждого бенчмарка")
+    parser.add_argument('--seed', type=int, default=42, help="Зерно генератора данных")
+    parser.add_argument('--only', nargs='*', help="Запустить только указанные бенчмарки")
+    parser.add_argument('--workdir', help="Рабочий каталог (по умолчанию временный)")
+    parser.add_argument('--output', default='bench_results.json', help="Файл для записи результатов")
+    parser.add_argument('--compare', help="Файл предыдущих результатов для сравнения")
+    options = parser.parse_args()
+
+    output_path = os.path.abspath(options.output)
+    compare_path = os.path.abspath(options.compare) if options.compare else None
+    options.workdir = prepare_environment(options.workdir)
+    write_auth_log(os.path.join(options.workdir, 'auth.log'), 1000, seed=options.seed)
+
+    results = run_benchmarks(options)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "lines": options.lines,
+            "repeat": options.repeat,
+            "seed": options.seed,
+        },
+        "results": results,
+    }
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nРезультаты записаны в {output_path}")
+
+    if compare_path:
+        compare(results, compare_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -74,10 +74,32 @@ echo "🌐 Скачивание файлов проекта с GitHub..."
 cd /opt/telegram-bot
 
 # Скачиваем основные файлы
+curl -sSL -o alerts.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/alerts.py
+curl -sSL -o backup.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/backup.py
 curl -sSL -o bot.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/bot.py
 curl -sSL -o main.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/main.py
 curl -sSL -o monitor.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/monitor.py
 curl -sSL -o ssh_monitor.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/ssh_monitor.py
+curl -sSL -o access.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/access.py
+curl -sSL -o clients.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/clients.py
+curl -sSL -o connections.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/connections.py
+curl -sSL -o outbox.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/outbox.py
+curl -sSL -o logs.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/logs.py
+curl -sSL -o perf.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/perf.py
+curl -sSL -o dashboard.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/dashboard.py
+curl -sSL -o prefixes.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/prefixes.py
+curl -sSL -o probes.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/probes.py
+curl -sSL -o processes.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/processes.py
+curl -sSL -o profiler.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/profiler.py
+curl -sSL -o services.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/services.py
+curl -sSL -o sessions.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/sessions.py
+curl -sSL -o sketches.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/sketches.py
+curl -sSL -o ssh_stats.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/ssh_stats.py
+curl -sSL -o xray_monitor.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/xray_monitor.py
+mkdir -p checks checks.d
+curl -sSL -o checks/__init__.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/checks/__init__.py
+curl -sSL -o checks/clients.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/checks/clients.py
+curl -sSL -o checks/resources.py https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/checks/resources.py
 curl -sSL -o bot_ctl https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/bot_ctl
 curl -sSL -o requirements.txt https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/requirements.txt
 curl -sSL -o telegram-bot.service https://raw.githubusercontent.com/Rrezzak09VPN/telegram-3xui-bot/main/src/telegram-bot.service
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Контроль доступа и защита от флуда на уровне диспетчера.
+
+Фильтр регистрируется в группе обработчиков -1 и видит каждое обновление
+раньше обычных обработчиков. Чужие чаты получают один ответ «нет доступа»,
+после чего их обновления отбрасываются без единого вызова Bot API.
+Разрешенные чаты ограничиваются корзиной токенов (token bucket) на чат.
+"""
+
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop
+
+# Роли по возрастанию прав
+ROLES = {'viewer': 0, 'admin': 1, 'owner': 2}
+
+# Минимальная роль для команд и кнопок; не перечисленные требуют owner
+DEFAULT_COMMAND_ROLES = {
+    'start': 'viewer',
+    'help': 'viewer',
+    'status': 'viewer',
+    'sharing': 'viewer',
+    'connections': 'viewer',
+    'ssh_stats': 'viewer',
+    'dashboard': 'viewer',
+    'probes': 'viewer',
+    'top': 'viewer',
+    'getlink': 'admin',
+    'offlink': 'admin',
+    'sessions': 'admin',
+    'open_ssh': 'admin',
+    'close_ssh': 'admin',
+    'change_config': 'owner',
+    'backup': 'owner',
+    'perf': 'owner',
+    'profile': 'owner',
+    'memsnap': 'owner',
+    'logs': 'owner',
+    'trusted': 'owner',
+}
+
+# callback_data кнопок -> команда, права которой они требуют
+CALLBACK_COMMANDS = {
+    'status': 'status',
+    'dashboard_stop': 'dashboard',
+    'get_link': 'getlink',
+    'close_link': 'offlink',
+    'change_config': 'change_config',
+    'change_duration': 'change_config',
+    'change_url': 'change_config',
+    'change_port': 'change_config',
+    'change_alerts': 'change_config',
+    'back_to_main': 'start',
+}
+
+# Сколько чужих чатов помнить, чтобы не отвечать им повторно
+NOTIFIED_LIMIT = 10000
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity про запас"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def consume(self, now):
+        """Забрать один токен. False, если корзина пуста"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class AccessControl:
+    """Проверка роли чата и ограничение частоты запросов до диспетчеризации"""
+
+    def __init__(self, owner_chat_id, allowed_chats=None, command_roles=None,
+                 rate_per_minute=30, burst=10):
+        # JSON хранит ключи строками: {"123456789": "admin"}
+        self.roles = {int(chat_id): role for chat_id, role in (allowed_chats or {}).items()}
+        self.roles[int(owner_chat_id)] = 'owner'
+        self.command_roles = dict(DEFAULT_COMMAND_ROLES, **(command_roles or {}))
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.buckets = {}
+        self.throttled_chats = set()
+        self.notified = OrderedDict()
+        self.dropped = 0
+        self.throttled = 0
+
+    def role_of(self, chat_id):
+        return self.roles.get(chat_id)
+
+    def command_of(self, update):
+        """Команда, к которой относится обновление, или None для обычного текста"""
+        if update.callback_query:
+            return CALLBACK_COMMANDS.get(update.callback_query.data)
+        message = update.effective_message
+        if message and message.text and message.text.startswith('/'):
+            # "/status@my_bot arg" -> "status"
+            return message.text[1:].split(maxsplit=1)[0].split('@', 1)[0].lower()
+        return None
+
+    def required_role(self, update):
+        command = self.command_of(update)
+        if command is None:
+            # Текст вне команд нужен только для ввода значений /change_config
+            return self.command_roles['change_config']
+        return self.command_roles.get(command, 'owner')
+
+    def allow_rate(self, chat_id, now):
+        if not self.rate:
+            return True
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.buckets[chat_id] = TokenBucket(self.rate, self.burst, now)
+        return bucket.consume(now)
+
+    def remember_notified(self, chat_id):
+        """True, если чату еще не отвечали об отсутствии доступа"""
+        if chat_id in self.notified:
+            return False
+        self.notified[chat_id] = True
+        if len(self.notified) > NOTIFIED_LIMIT:
+            self.notified.popitem(last=False)
+        return True
+
+    async def reply(self, update, text):
+        message = update.effective_message
+        if update.callback_query:
+            await update.callback_query.answer(text, show_alert=False)
+        elif message:
+            await message.reply_text(text)
+
+    async def filter_update(self, update: Update, context):
+        """Обработчик группы -1: пропускает обновление дальше или останавливает его"""
+        chat = update.effective_chat
+        if chat is None:
+            self.dropped += 1
+            raise ApplicationHandlerStop
+
+        role = self.role_of(chat.id)
+        if role is None:
+            self.dropped += 1
+            if self.remember_notified(chat.id):
+                await self.reply(update, "❌ У вас нет доступа к этому боту.")
+            raise ApplicationHandlerStop
+
+        if not self.allow_rate(chat.id, time.monotonic()):
+            self.throttled += 1
+            # Предупреждаем один раз за серию, остальное отбрасываем молча
+            if chat.id not in self.throttled_chats:
+                self.throttled_chats.add(chat.id)
+                await self.reply(update, "⏳ Слишком много запросов, подождите немного.")
+            raise ApplicationHandlerStop
+        self.throttled_chats.discard(chat.id)
+
+        if ROLES[role] < ROLES[self.required_role(update)]:
+            if self.command_of(update) is not None:
+                await self.reply(update, "❌ У вас нет доступа к этой команде.")
+            raise ApplicationHandlerStop
+
+    def render_stats(self):
+        """Строка для /perf"""
+        return (f"🛡️ Отброшено чужих обновлений: {self.dropped}, "
+                f"ограничено по частоте: {self.throttled}")
+
+
+def from_config(config):
+    """Создать AccessControl по параметрам config.json"""
+    return AccessControl(
+        owner_chat_id=config['owner_chat_id'],
+        allowed_chats=config.get('allowed_chats', {}),
+        command_roles=config.get('command_roles', {}),
+        rate_per_minute=config.get('chat_rate_limit_per_minute', 30),
+        burst=config.get('chat_rate_limit_burst', 10),
+    )
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Оповещения о ресурсах сервера по правилам с гистерезисом.
+
+Правило: метрика, сравнение, порог срабатывания, порог сброса и время,
+в течение которого условие должно держаться. Пример из config.json:
+
+    {"name": "ram", "metric": "ram_percent", "op": ">", "threshold": 90, "clear": 80, "for_seconds": 300}
+
+Правило срабатывает, когда ram_percent > 90 держится 300 секунд, и сбрасывается
+только когда значение опустится ниже 80, поэтому колебания около порога
+не дают серию оповещений. Каждое измерение проверяется за O(количество правил).
+"""
+
+import os
+import re
+import time
+from collections import deque
+
+import psutil
+
+# Метрики, которые умеет собирать MetricSampler
+METRICS = {
+    'cpu_percent': 'Загрузка CPU, %',
+    'ram_percent': 'ОЗУ, %',
+    'swap_percent': 'Swap, %',
+    'disk_percent': 'Диск (/), %',
+    'load1': 'Нагрузка за 1 мин',
+    'load1_per_cpu': 'Нагрузка за 1 мин на ядро',
+    'net_rx_mbps': 'Входящий трафик, Мбит/с',
+    'net_tx_mbps': 'Исходящий трафик, Мбит/с',
+}
+
+OPERATORS = {
+    '>': lambda value, threshold: value > threshold,
+    '<': lambda value, threshold: value < threshold,
+}
+
+# Сравнение для сброса: для "> 90 clear 80" правило сбрасывается при значении < 80
+CLEAR_OPERATORS = {'>': '<', '<': '>'}
+
+# Строка правила для /change_config: "ram: ram_percent > 90 clear 80 for 300"
+RULE_PATTERN = re.compile(
+    r'^\s*(?P<name>[\w-]+)\s*:\s*(?P<metric>\w+)\s*(?P<op>[<>])\s*(?P<threshold>-?\d+(?:\.\d+)?)'
+    r'(?:\s+clear\s+(?P<clear>-?\d+(?:\.\d+)?))?(?:\s+for\s+(?P<for_seconds>\d+))?\s*$'
+)
+
+
+class Rule:
+    """Правило и его текущее состояние"""
+    __slots__ = ('name', 'metric', 'op', 'threshold', 'clear', 'for_seconds',
+                 'firing', 'pending_since', 'last_value')
+
+    def __init__(self, name, metric, op, threshold, clear=None, for_seconds=0):
+        if metric not in METRICS:
+            raise ValueError(f"Неизвестная метрика: {metric}")
+        if op not in OPERATORS:
+            raise ValueError(f"Неизвестное сравнение: {op}")
+        self.name = name
+        self.metric = metric
+        self.op = op
+        self.threshold = float(threshold)
+        self.clear = float(threshold if clear is None else clear)
+        if (op == '>' and self.clear > self.threshold) or (op == '<' and self.clear < self.threshold):
+            raise ValueError("Порог сброса должен быть по другую сторону от порога срабатывания")
+        self.for_seconds = int(for_seconds)
+        self.firing = False
+        self.pending_since = None
+        self.last_value = None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['metric'], data['op'], data['threshold'],
+                   data.get('clear'), data.get('for_seconds', 0))
+
+    def to_dict(self):
+        return {'name': self.name, 'metric': self.metric, 'op': self.op, 'threshold': self.threshold,
+                'clear': self.clear, 'for_seconds': self.for_seconds}
+
+    def definition(self):
+        """Параметры без состояния - для сравнения при перезагрузке правил"""
+        return (self.metric, self.op, self.threshold, self.clear, self.for_seconds)
+
+    def describe(self):
+        return (f"{self.name}: {self.metric} {self.op} {self.threshold:g} "
+                f"clear {self.clear:g} for {self.for_seconds}")
+
+    def evaluate(self, value, now):
+        """Учесть измерение. Возвращает 'fire', 'clear' или None"""
+        self.last_value = value
+        if self.firing:
+            # Гистерезис: сброс только после пересечения порога сброса в обратную сторону
+            if OPERATORS[CLEAR_OPERATORS[self.op]](value, self.clear):
+                self.firing = False
+                self.pending_since = None
+                return 'clear'
+            return None
+
+        if OPERATORS[self.op](value, self.threshold):
+            if self.pending_since is None:
+                self.pending_since = now
+            if now - self.pending_since >= self.for_seconds:
+                self.firing = True
+                return 'fire'
+        else:
+            self.pending_since = None
+        return None
+
+
+def parse_rule(text):
+    """Разобрать строку правила "name: metric > 90 clear 80 for 300". Возвращает Rule или бросает ValueError"""
+    match = RULE_PATTERN.match(text)
+    if not match:
+        raise ValueError("Формат: имя: метрика > порог [clear порог_сброса] [for секунд]")
+    return Rule(match.group('name'), match.group('metric'), match.group('op'), match.group('threshold'),
+                match.group('clear'), match.group('for_seconds') or 0)
+
+
+class AlertEngine:
+    """Набор правил, проверяемых на каждом измерении"""
+
+    def __init__(self, rules=()):
+        self.rules = []
+        self.set_rules(rules)
+
+    def set_rules(self, rules):
+        """Заменить правила, сохранив состояние тех, что не изменились"""
+        current = {rule.name: rule for rule in self.rules}
+        updated = []
+        for rule in rules:
+            old = current.get(rule.name)
+            updated.append(old if old is not None and old.definition() == rule.definition() else rule)
+        self.rules = updated
+
+    def evaluate(self, sample, now=None):
+        """Проверить измерение (словарь метрика -> значение). Возвращает [(rule, 'fire'|'clear', value)]"""
+        now = time.monotonic() if now is None else now
+        events = []
+        for rule in self.rules:
+            value = sample.get(rule.metric)
+            if value is None:
+                continue
+            transition = rule.evaluate(value, now)
+            if transition:
+                events.append((rule, transition, value))
+        return events
+
+
+def load_rules(config):
+    """Правила из config['alert_rules']; некорректные пропускаются с описанием ошибки"""
+    rules, errors = [], []
+    for data in config.get('alert_rules', []):
+        try:
+            rules.append(Rule.from_dict(data))
+        except (KeyError, ValueError) as e:
+            errors.append(f"{data.get('name', '?')}: {e}")
+    return rules, errors
+
+
+class MetricSampler:
+    """Неблокирующий сбор метрик: CPU и трафик считаются по разнице с прошлым замером"""
+
+    def __init__(self, disk_path='/'):
+        self.disk_path = disk_path
+        self.cpu_count = psutil.cpu_count() or 1
+        self.previous_cpu = None
+        self.previous_net = None
+
+    @staticmethod
+    def _net_bytes():
+        received = sent = 0
+        for name, counters in psutil.net_io_counters(pernic=True).items():
+            if name == 'lo':
+                continue
+            received += counters.bytes_recv
+            sent += counters.bytes_sent
+        return received, sent
+
+    def sample(self):
+        now = time.monotonic()
+        sample = {
+            'ram_percent': psutil.virtual_memory().percent,
+            'swap_percent': psutil.swap_memory().percent,
+            'disk_percent': psutil.disk_usage(self.disk_path).percent,
+        }
+        load1 = os.getloadavg()[0]
+        sample['load1'] = load1
+        sample['load1_per_cpu'] = load1 / self.cpu_count
+
+        cpu = psutil.cpu_times()
+        idle = cpu.idle + getattr(cpu, 'iowait', 0.0)
+        # guest уже учтено в user (как в psutil.cpu_percent)
+        total = sum(cpu) - getattr(cpu, 'guest', 0.0) - getattr(cpu, 'guest_nice', 0.0)
+        if self.previous_cpu is not None:
+            total_delta = total - self.previous_cpu[0]
+            idle_delta = idle - self.previous_cpu[1]
+            if total_delta > 0:
+                sample['cpu_percent'] = round(100.0 * (1 - idle_delta / total_delta), 1)
+        self.previous_cpu = (total, idle)
+
+        received, sent = self._net_bytes()
+        if self.previous_net is not None:
+            elapsed = now - self.previous_net[0]
+            if elapsed > 0:
+                sample['net_rx_mbps'] = max(0, received - self.previous_net[1]) * 8 / elapsed / 1e6
+                sample['net_tx_mbps'] = max(0, sent - self.previous_net[2]) * 8 / elapsed / 1e6
+        self.previous_net = (now, received, sent)
+        return sample
+
+
+def format_event(rule, transition, value):
+    """Текст оповещения (HTML)"""
+    title = METRICS.get(rule.metric, rule.metric)
+    if transition == 'fire':
+        duration = f" дольше {rule.for_seconds} с" if rule.for_seconds else ""
+        return (f"🚨 <b>{title}</b>: {value:.1f} {rule.op} {rule.threshold:g}{duration}\n"
+                f"Правило: <code>{rule.name}</code>")
+    return (f"✅ <b>{title}</b> в норме: {value:.1f} (порог сброса {rule.clear:g})\n"
+            f"Правило: <code>{rule.name}</code>")
+
+
+def render_rules(rules):
+    """Список правил для /change_config (HTML)"""
+    if not rules:
+        return "Правил нет."
+    return "\n".join(f"• <code>{rule.describe()}</code>" for rule in rules)
+
+
+class FlapDetector:
+    """
+    Обнаружение «дребезга» состояния проверки (сервис падает и поднимается по кругу).
+
+    Переключения хранятся в небольшом кольцевом буфере. Если за window_seconds
+    их набирается threshold, отправляется одно оповещение о дребезге, а отдельные
+    переключения дальше подавляются до тех пор, пока состояние не продержится
+    stable_seconds - тогда приходит сводка.
+    """
+
+    def __init__(self, window_seconds=600, threshold=4, stable_seconds=300, history=16):
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self.stable_seconds = stable_seconds
+        self.transitions = deque(maxlen=max(history, threshold))  # время каждого переключения
+        self.state = None
+        self.flapping = False
+        self.flapping_since = None
+        self.suppressed = 0
+
+    def update(self, state, now=None):
+        """
+        Учесть результат проверки. Возвращает событие или None:
+        ('change', состояние) - обычное переключение, о нем нужно сообщить;
+        ('flapping', переключений за окно) - начался дребезг;
+        ('stable', состояние, подавлено переключений, длительность дребезга) - дребезг закончился.
+        """
+        now = time.monotonic() if now is None else now
+        previous, self.state = self.state, state
+
+        if previous is not None and state != previous:
+            self.transitions.append(now)
+            if self.flapping:
+                self.suppressed += 1
+                return None
+            recent = sum(1 for moment in self.transitions if now - moment <= self.window_seconds)
+            if recent >= self.threshold:
+                self.flapping = True
+                self.flapping_since = self.transitions[-recent]
+                self.suppressed = 0
+                return ('flapping', recent)
+            return ('change', state)
+
+        if self.flapping and now - self.transitions[-1] >= self.stable_seconds:
+            self.flapping = False
+            duration = now - self.flapping_since
+            # История дребезга закрыта сводкой; следующее падение - обычное переключение
+            self.transitions.clear()
+            return ('stable', state, self.suppressed, duration)
+        return None
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Резервные копии базы 3X-UI (x-ui.db).
+
+Снимок делается через online backup API SQLite небольшими порциями страниц,
+поэтому панель не блокируется на все время копирования. Снимок читается
+один раз блоками: из этого же потока пишется gzip для отправки в Telegram
+и нарезаются куски для архива.
+
+Архив хранит куски по их SHA-256, поэтому неизменившиеся данные между
+копиями не записываются повторно. Границы кусков выбираются по содержимому
+страниц SQLite (страница, хеш которой попадает под маску, закрывает кусок),
+так что изменение одной страницы затрагивает только соседний кусок.
+Каждая копия - манифест со списком кусков; старые манифесты удаляются по
+правилам хранения, а куски без ссылок - сборкой мусора.
+
+Восстановление из архива:
+
+    python3 backup.py list
+    python3 backup.py restore [манифест] x-ui.db
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_DB_PATH = '/etc/x-ui/x-ui.db'
+DEFAULT_ARCHIVE_DIR = '/var/lib/telegram-bot/backups'
+
+SNAPSHOT_PAGES = 256        # страниц за один шаг backup API
+SNAPSHOT_SLEEP = 0.005      # пауза между шагами, чтобы панель успевала писать
+READ_PAGES = 256            # страниц за одно чтение снимка
+
+# Границы кусков: в среднем 16 страниц, не меньше 4 и не больше 64
+CHUNK_MASK = 0x0F
+CHUNK_MIN_PAGES = 4
+CHUNK_MAX_PAGES = 64
+
+UPLOAD_LIMIT = 50 * 1024 * 1024  # предел размера документа в Bot API
+
+MANIFEST_TIME_FORMAT = '%Y%m%d-%H%M%S'
+
+# /backup и копия по расписанию не должны писать в архив одновременно
+_backup_lock = threading.Lock()
+
+
+class BackupResult:
+    """Итог одной резервной копии"""
+    __slots__ = ('name', 'export_path', 'export_size', 'db_size', 'chunks', 'new_chunks',
+                 'new_bytes', 'changed', 'removed', 'duration')
+
+    def __init__(self, name):
+        self.name = name
+        self.export_path = None
+        self.export_size = 0
+        self.db_size = 0
+        self.chunks = 0
+        self.new_chunks = 0
+        self.new_bytes = 0
+        self.changed = True
+        self.removed = 0
+        self.duration = 0.0
+
+
+def snapshot_database(source_path, target_path, pages=SNAPSHOT_PAGES, sleep=SNAPSHOT_SLEEP):
+    """Согласованный снимок базы через backup API, порциями по pages страниц"""
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    target = sqlite3.connect(target_path)
+    try:
+        def pause(status, remaining, total):
+            # Между шагами блокировка чтения отпускается
+            if remaining and sleep:
+                time.sleep(sleep)
+        source.backup(target, pages=pages, progress=pause)
+        page_size = target.execute('PRAGMA page_size').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    return page_size
+
+
+def iter_chunks(stream, page_size):
+    """
+    Нарезка файла базы на куски по границам, зависящим от содержимого страниц.
+    Отдает bytes; в памяти одновременно не больше одного куска и одного блока чтения.
+    """
+    pages = []
+    while True:
+        block = stream.read(page_size * READ_PAGES)
+        if not block:
+            break
+        yield block, None
+        for offset in range(0, len(block), page_size):
+            page = block[offset:offset + page_size]
+            pages.append(page)
+            marker = hashlib.blake2b(page, digest_size=4).digest()[0]
+            if len(pages) >= CHUNK_MAX_PAGES or (len(pages) >= CHUNK_MIN_PAGES and marker & CHUNK_MASK == 0):
+                yield None, b''.join(pages)
+                pages = []
+    if pages:
+        yield None, b''.join(pages)
+
+
+class ChunkStore:
+    """Каталог архива: chunks/<2 символа>/<sha256>.gz и manifests/<время>.json"""
+
+    def __init__(self, root):
+        self.root = root
+        self.chunks_dir = os.path.join(root, 'chunks')
+        self.manifests_dir = os.path.join(root, 'manifests')
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest + '.gz')
+
+    def put(self, digest, data):
+        """Сохранить кусок, если его еще нет. Возвращает размер записанного или 0"""
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            return 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = gzip.compress(data, compresslevel=6)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp_path, path)
+        return len(compressed)
+
+    def read(self, digest):
+        with open(self.chunk_path(digest), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def manifests(self):
+        """Имена манифестов от старых к новым"""
+        return sorted(name[:-5] for name in os.listdir(self.manifests_dir) if name.endswith('.json'))
+
+    def load_manifest(self, name):
+        with open(os.path.join(self.manifests_dir, name + '.json'), 'r') as f:
+            return json.load(f)
+
+    def save_manifest(self, name, manifest):
+        path = os.path.join(self.manifests_dir, name + '.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(path + '.tmp', path)
+
+    def latest_time(self):
+        """Время последней копии (timestamp) или None"""
+        names = self.manifests()
+        if not names:
+            return None
+        return datetime.strptime(names[-1], MANIFEST_TIME_FORMAT).timestamp()
+
+    def collect_garbage(self):
+        """Удалить куски, на которые не ссылается ни один манифест. Возвращает количество удаленных"""
+        referenced = set()
+        for name in self.manifests():
+            referenced.update(self.load_manifest(name)['chunks'])
+        removed = 0
+        for prefix in os.listdir(self.chunks_dir):
+            directory = os.path.join(self.chunks_dir, prefix)
+            for filename in os.listdir(directory):
+                if filename[:-3] not in referenced:
+                    os.remove(os.path.join(directory, filename))
+                    removed += 1
+        return removed
+
+
+def select_retained(names, keep_last=7, keep_daily=14, keep_weekly=8):
+    """
+    Какие копии оставить: keep_last последних, по одной (последней) за каждый
+    из keep_daily последних дней и за каждую из keep_weekly последних недель.
+    """
+    keep = set(names[-keep_last:]) if keep_last else set()
+    days, weeks = {}, {}
+    for name in names:
+        moment = datetime.strptime(name, MANIFEST_TIME_FORMAT)
+        days[moment.date()] = name
+        weeks[moment.isocalendar()[:2]] = name
+    keep.update(days[day] for day in sorted(days)[-keep_daily:] if keep_daily)
+    keep.update(weeks[week] for week in sorted(weeks)[-keep_weekly:] if keep_weekly)
+    return keep
+
+
+def create_backup(db_path=DEFAULT_DB_PATH, archive_dir=DEFAULT_ARCHIVE_DIR, retention=None):
+    """
+    Снимок базы, gzip для отправки и запись в архив с дедупликацией.
+    Если содержимое не изменилось с прошлой копии, манифест не создается (result.changed = False).
+    """
+    with _backup_lock:
+        return _create_backup(db_path, archive_dir, retention)
+
+
+def _create_backup(db_path, archive_dir, retention):
+    started = time.monotonic()
+    store = ChunkStore(archive_dir)
+    # Имя копии - время с точностью до секунды; вторая копия в ту же секунду ждет следующей
+    while True:
+        name = datetime.now().strftime(MANIFEST_TIME_FORMAT)
+        export_path = os.path.join(archive_dir, f"x-ui-{name}.db.gz")
+        if not os.path.exists(export_path) and name not in store.manifests():
+            break
+        time.sleep(1)
+    result = BackupResult(name)
+    result.export_path = export_path
+
+    snapshot_path = os.path.join(archive_dir, 'snapshot.db')
+    try:
+        page_size = snapshot_database(db_path, snapshot_path)
+        digests = []
+        with open(snapshot_path, 'rb') as source, gzip.open(result.export_path, 'wb', compresslevel=6) as export:
+            for block, chunk in iter_chunks(source, page_size):
+                if block is not None:
+                    export.write(block)
+                    result.db_size += len(block)
+                    continue
+                digest = hashlib.sha256(chunk).hexdigest()
+                digests.append(digest)
+                written = store.put(digest, chunk)
+                if written:
+                    result.new_chunks += 1
+                    result.new_bytes += written
+        result.chunks = len(digests)
+        result.export_size = os.path.getsize(result.export_path)
+    except BaseException:
+        # Недописанный x-ui-*.db.gz выглядел бы как целая копия, а ротация его не удаляет
+        if os.path.exists(result.export_path):
+            os.remove(result.export_path)
+        raise
+    finally:
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+
+    names = store.manifests()
+    if names and store.load_manifest(names[-1])['chunks'] == digests:
+        result.changed = False
+    else:
+        store.save_manifest(name, {'created': name, 'page_size': page_size, 'size': result.db_size, 'chunks': digests})
+        names.append(name)
+
+    removed = [old for old in names if old not in select_retained(names, **(retention or {}))]
+    for old in removed:
+        os.remove(os.path.join(store.manifests_dir, old + '.json'))
+    if removed:
+        store.collect_garbage()
+    result.removed = len(removed)
+    result.duration = time.monotonic() - started
+    return result
+
+
+def restore_backup(archive_dir, name, output_path):
+    """Собрать базу из кусков манифеста name (None - последний)"""
+    store = ChunkStore(archive_dir)
+    name = name or store.manifests()[-1]
+    manifest = store.load_manifest(name)
+    with open(output_path, 'wb') as f:
+        for digest in manifest['chunks']:
+            f.write(store.read(digest))
+    return manifest
+
+
+def describe(result):
+    """Подпись к копии (HTML)"""
+    status = "изменилась" if result.changed else "без изменений с прошлой копии"
+    return (f"💾 <b>Резервная копия 3X-UI</b> {result.name}\n"
+            f"База: {result.db_size / 1024 / 1024:.1f} МБ, архив gzip: {result.export_size / 1024 / 1024:.1f} МБ\n"
+            f"Кусков: {result.chunks}, новых: {result.new_chunks} ({result.new_bytes / 1024:.0f} КБ), "
+            f"база {status}\n"
+            f"Удалено старых копий: {result.removed}, заняло {result.duration:.1f} с")
+
+
+class BackupScheduler:
+    """Задача в цикле событий бота, которая делает копии раз в interval_seconds"""
+
+    def __init__(self, interval_seconds, job, archive_dir=DEFAULT_ARCHIVE_DIR, log=print):
+        self.interval = interval_seconds
+        self.job = job
+        self.archive_dir = archive_dir
+        self.log = log
+        self.task = None
+
+    def start(self):
+        if self.task is None and self.interval > 0:
+            self.task = asyncio.get_running_loop().create_task(self.run(), name="backups")
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def first_delay(self):
+        """Отсчет от последней копии в архиве, чтобы перезапуск бота не сдвигал расписание"""
+        try:
+            latest = ChunkStore(self.archive_dir).latest_time()
+        except OSError:
+            latest = None
+        if latest is None:
+            return 60
+        return max(60, latest + self.interval - time.time())
+
+    async def run(self):
+        delay = self.first_delay()
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.interval
+            try:
+                await self.job()
+            except Exception as e:
+                self.log(f"Ошибка резервного копирования по расписанию: {e}")
+
+
+def main(argv):
+    archive_dir = DEFAULT_ARCHIVE_DIR
+    if os.path.exists('config.json'):
+        with open('config.json', 'r') as f:
+            archive_dir = json.load(f).get('backup_dir', DEFAULT_ARCHIVE_DIR)
+
+    if len(argv) >= 2 and argv[1] == 'list':
+        store = ChunkStore(archive_dir)
+        for name in store.manifests():
+            manifest = store.load_manifest(name)
+            print(f"{name}  {manifest['size'] / 1024 / 1024:.1f} МБ  кусков: {len(manifest['chunks'])}")
+        return 0
+    if len(argv) in (3, 4) and argv[1] == 'restore':
+        name = argv[2] if len(argv) == 4 else None
+        manifest = restore_backup(archive_dir, name, argv[-1])
+        print(f"Восстановлена копия {manifest['created']} в {argv[-1]}")
+        return 0
+    print("Использование: backup.py list | backup.py restore [манифест] файл.db")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
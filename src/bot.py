@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import functools
+import ipaddress
 import json
 import logging
 import threading
@@ -10,6 +12,7 @@ import requests
 import psutil
 import os
 import re
+import secrets
 from urllib.parse import urlparse
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -17,11 +20,30 @@ from telegram.ext import (
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes,
 )
 import asyncio
 
+import access
+import alerts
+import backup
+import checks
+import connections
+import dashboard
+import logs
+import monitor
+import perf
+import probes
+import processes
+import prefixes
+import profiler
+import sessions
+import ssh_monitor
+import ssh_stats
+import xray_monitor
+
 # Загрузка конфигурации
 with open('config.json', 'r') as f:
     config = json.load(f)
@@ -34,19 +56,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Глобальные переменные для отслеживания состояния
-active_session = False
-session_timer = None
+# Проверка прав и ограничение частоты запросов до вызова обработчиков (см. access.py)
+access_control = access.from_config(config)
+
+# Параллельные сессии доступа к панели (см. sessions.py).
+# run_command берется при каждом вызове, чтобы его можно было подменить (benchmarks/load.py)
+session_manager = sessions.SessionManager(
+    run_command=lambda *args, **kwargs: run_command(*args, **kwargs),
+    get_port=lambda: config['panel_port'],
+    log=lambda message: log_message(message),
+)
+
+# Резервные копии базы 3X-UI по расписанию (см. backup.py)
+backup_scheduler = backup.BackupScheduler(
+    config.get('backup_interval_hours', 24) * 3600,
+    job=None,  # задается в post_init, когда есть application
+    archive_dir=config.get('backup_dir', backup.DEFAULT_ARCHIVE_DIR),
+    log=lambda message: log_message(message),
+)
+
+# Сообщения /dashboard, которые бот правит на месте (см. dashboard.py).
+# render_dashboard берется при каждом вызове, как run_command у session_manager
+dashboard_manager = dashboard.DashboardManager(
+    render=lambda: render_dashboard(),
+    interval=config.get('dashboard_refresh_seconds', 10),
+    log=lambda message: log_message(message),
+)
+
+# Логи, доступные через /logs: компонент -> путь (см. logs.py)
+log_sources = logs.sources_from_config(config)
+
+# Снимки процессов для /top: фоновый поток считает CPU по разнице между обходами (см. processes.py)
+process_sampler = processes.ProcessSampler(
+    config.get('top_sample_seconds', processes.DEFAULT_INTERVAL),
+    log=lambda message: log_message(message),
+)
+
+# Повторный /getlink из того же чата с тем же IP в пределах этого времени возвращает уже открытую сессию
+GETLINK_DEDUP_SECONDS = 10
 
-# === Глобальные переменные для /change_config ===
-# Состояние ожидания ввода: None или ключ конфига ('access_duration_minutes', 'panel_url', 'panel_port')
-awaiting_input_for = None
-# ID чата владельца, который инициировал изменение (для безопасности)
-change_config_initiator_chat_id = None
+class BotState:
+    """
+    Изменяемое состояние обработчиков. Обновления обрабатываются параллельно
+    (concurrent_updates), поэтому у каждого ресурса свой asyncio.Lock: медленный
+    /status не держит /offlink, а двойное нажатие «Получить ссылку» не открывает
+    две сессии. Все поля меняются только из цикла событий бота.
+    """
 
-# === Глобальные переменные для SSH ===
-ssh_timer = None  # Таймер для автоматического закрытия SSH
-ssh_open_count = 0  # Счетчик вызовов /open_ssh для накопления времени
+    def __init__(self):
+        # /change_config: чат -> ключ конфига, ввод которого ожидается
+        self.awaiting_input = {}
+        self.config_lock = asyncio.Lock()
+        # /getlink: чат -> (источник, время, сессия) последнего открытия и блокировки по чатам
+        self.recent_links = {}
+        self.link_locks = {}
+        # /open_ssh: задача автоматического закрытия порта и накопленные часы
+        self.ssh_lock = asyncio.Lock()
+        self.ssh_task = None
+        self.ssh_open_count = 0
+
+    def link_lock(self, chat_id):
+        lock = self.link_locks.get(chat_id)
+        if lock is None:
+            lock = self.link_locks[chat_id] = asyncio.Lock()
+        return lock
+
+    def recent_link(self, chat_id, source):
+        """Сессия, открытая этим чатом для source меньше GETLINK_DEDUP_SECONDS назад и еще активная"""
+        recent = self.recent_links.get(chat_id)
+        if recent is None or recent[0] != source or time.monotonic() - recent[1] > GETLINK_DEDUP_SECONDS:
+            return None
+        return recent[2] if recent[2].id in session_manager.sessions else None
+
+    def cancel_ssh_timer(self):
+        if self.ssh_task is not None:
+            self.ssh_task.cancel()
+            self.ssh_task = None
+
+bot_state = BotState()
 
 def get_size(bytes, suffix="B"):
     """Масштабировать байты в надлежащие единицы измерения"""
@@ -81,39 +168,27 @@ def log_message(message):
     logger.info(message)
     print(message)
 
+def run_command(args, **kwargs):
+    """Запуск внешней команды с замером длительности (см. /perf)"""
+    return perf.timed_run(args, **kwargs)
+
 def check_server_status():
-    """Проверка доступности сервера"""
-    try:
-        # Простая проверка - сервер онлайн если мы можем получить uptime
-        with open('/proc/uptime', 'r') as f:
-            uptime = f.read()
-        return True
-    except:
-        return False
+    """Доступность сервера по пробам сети (см. probes.py)"""
+    return monitor.probe_monitor.network_online()
 
 def check_xui_status():
     """Проверка статуса x-ui сервиса"""
     try:
-        result = subprocess.run(['systemctl', 'is-active', 'x-ui'],
+        result = run_command(['systemctl', 'is-active', 'x-ui'],
                               capture_output=True, text=True, timeout=10)
         return result.stdout.strip() == 'active'
     except:
         return False
 
-def open_panel_port(port):
-    """Открытие порта панели через UFW"""
-    try:
-        subprocess.run(['ufw', 'allow', str(port)], check=True, capture_output=True)
-        log_message(f"Порт {port} (панель) открыт")
-        return True
-    except Exception as e:
-        log_message(f"Ошибка открытия порта {port} (панель): {e}")
-        return False
-
 def close_panel_port(port):
     """Закрытие порта панели через UFW"""
     try:
-        subprocess.run(['ufw', 'deny', str(port)], check=True, capture_output=True)
+        run_command(['ufw', 'deny', str(port)], check=True, capture_output=True)
         log_message(f"Порт {port} (панель) закрыт")
         return True
     except Exception as e:
@@ -123,13 +198,33 @@ def close_panel_port(port):
 def open_ssh_port():
     """Открытие SSH порта (22) через UFW"""
     try:
-        subprocess.run(['ufw', 'allow', '22'], check=True, capture_output=True)
+        run_command(['ufw', 'allow', '22'], check=True, capture_output=True)
         log_message("SSH порт (22) открыт")
         return True
     except Exception as e:
         log_message(f"Ошибка открытия SSH порта (22): {e}")
         return False
 
+def find_ufw_allow_rules(ufw_output, port):
+    """
+    Найти номера ALLOW правил для порта в выводе `ufw status numbered`.
+    Номера возвращаются по убыванию, чтобы удаление не сбивало нумерацию.
+    """
+    # Пример строки: [ 1] 22/tcp                     ALLOW IN    Anywhere
+    # \s*\[\s*(\d+)\s*\] - номер правила в квадратных скобках
+    # \s+22(/\w+)?\s+ - пробелы, порт, возможно /tcp или /udp, пробелы
+    # \s+ALLOW\s+ - пробелы, ALLOW, пробелы
+    pattern = re.compile(rf'^\s*\[\s*(\d+)\s*\]\s+{port}(/\w+)?\s+ALLOW\s+', re.MULTILINE)
+    rule_numbers = [int(match.group(1)) for match in pattern.finditer(ufw_output)]
+    return [str(number) for number in sorted(rule_numbers, reverse=True)]
+
+def is_port_allowed(ufw_output, port):
+    """Проверить по выводу `ufw status`, есть ли ALLOW правило для порта"""
+    # Ищем строку вида "14698 ALLOW Anywhere" или "14698/tcp ALLOW Anywhere"
+    # Это более надежный способ, чем просто проверка наличия числа в выводе
+    pattern = re.compile(rf'^\s*{port}(/tcp)?\s+ALLOW\s+', re.MULTILINE)
+    return pattern.search(ufw_output) is not None
+
 def close_ssh_port():
     """
     Закрытие SSH порта (22) через UFW.
@@ -137,33 +232,18 @@ def close_ssh_port():
     """
     try:
         # 1. Получаем текущий статус UFW
-        result = subprocess.run(['ufw', 'status', 'numbered'], capture_output=True, text=True, timeout=10, check=True)
+        result = run_command(['ufw', 'status', 'numbered'], capture_output=True, text=True, timeout=10, check=True)
         ufw_output = result.stdout
 
         # 2. Ищем все правила, связанные с портом 22 и ALLOW
-        # Пример строки: [ 1] 22/tcp                     ALLOW IN    Anywhere
-        # Мы хотим найти номера строк ([X]) для таких правил
-        lines_to_delete = []
-        for line in ufw_output.splitlines():
-            # Ищем строки с номером, 22, и ALLOW
-            # \s* - начало строки, возможно с пробелами
-            # $\s*(\d+)$ - номер правила в квадратных скобках
-            # \s+22(/\w+)?\s+ - пробелы, 22, возможно /tcp или /udp, пробелы
-            # \s+ALLOW\s+ - пробелы, ALLOW, пробелы
-            match = re.search(r'^\s*\[\s*(\d+)\s*\]\s+22(/\w+)?\s+ALLOW\s+', line)
-            if match:
-                rule_number = match.group(1)
-                # UFW удаляет правила по номерам, начиная с наибольшего, чтобы не сбить нумерацию.
-                # Поэтому добавляем в начало списка, чтобы потом отсортировать по убыванию.
-                lines_to_delete.insert(0, rule_number) # Вставляем в начало
+        lines_to_delete = find_ufw_allow_rules(ufw_output, 22)
 
         # 3. Удаляем найденные ALLOW правила
         for rule_num in lines_to_delete:
             try:
-                # Используем 'echo y' для автоматического подтверждения удаления
-                delete_process = subprocess.run(
-                    f"echo y | ufw delete {rule_num}",
-                    shell=True,
+                # --force отключает запрос подтверждения удаления
+                delete_process = run_command(
+                    ['ufw', '--force', 'delete', str(rule_num)],
                     check=True,
                     capture_output=True,
                     text=True
@@ -175,7 +255,7 @@ def close_ssh_port():
         # 4. Добавляем правило DENY (на всякий случай, если его нет)
         # Хотя если ALLOW правил не было, это может быть избыточно,
         # но гарантирует блокировку.
-        subprocess.run(['ufw', 'deny', '22'], check=True, capture_output=True)
+        run_command(['ufw', 'deny', '22'], check=True, capture_output=True)
         log_message("✅ SSH порт (22) закрыт (добавлено правило DENY)")
         return True
 
@@ -188,24 +268,16 @@ def close_ssh_port():
         log_message(error_msg)
         return False
 
-async def end_session(application):
-    """Функция завершения сессии панели"""
-    global active_session
-    close_panel_port(config['panel_port'])
-    active_session = False
-    # Отправляем сообщение владельцу о завершении сессии
-    try:
-        await application.bot.send_message(
-            chat_id=config['owner_chat_id'],
-            text="⚠️ Сессия доступа к панели завершена. Порт закрыт."
-        )
-    except Exception as e:
-        log_message(f"Ошибка отправки уведомления о завершении сессии панели: {e}")
-
-async def end_ssh_session(application):
-    """Функция завершения SSH сессии (закрытие порта)"""
-    global ssh_timer, ssh_open_count
-    if close_ssh_port():
+async def end_ssh_session(application, delay):
+    """Задача автоматического закрытия SSH порта через delay секунд"""
+    await asyncio.sleep(delay)
+    async with bot_state.ssh_lock:
+        # Задача больше не отменяется: /close_ssh, пришедший во время закрытия, просто дождется блокировки
+        bot_state.ssh_task = None
+        closed = await asyncio.to_thread(close_ssh_port)
+        # Сброс состояния SSH
+        bot_state.ssh_open_count = 0
+    if closed:
         try:
             await application.bot.send_message(
                 chat_id=config['owner_chat_id'],
@@ -216,10 +288,6 @@ async def end_ssh_session(application):
     else:
         log_message("Не удалось автоматически закрыть SSH порт (22)")
 
-    # Сброс состояния SSH
-    ssh_timer = None
-    ssh_open_count = 0
-
 async def set_bot_commands(application):
     """Устанавливаем команды для меню бота (все в нижнем регистре)"""
     try:
@@ -229,10 +297,23 @@ async def set_bot_commands(application):
             ("help", "Помощь по боту"),
             ("getlink", "Получить ссылку на панель"),
             ("offlink", "Закрыть доступ к панели"),
+            ("sessions", "Активные сессии доступа к панели"),
             ("status", "Статус сервера и ресурсов"),
             ("change_config", "Изменить настройки бота"),
             ("open_ssh", "Открыть SSH порт (22)"),
-            ("close_ssh", "Закрыть SSH порт (22)")
+            ("close_ssh", "Закрыть SSH порт (22)"),
+            ("perf", "Задержки обработчиков и вызовов"),
+            ("sharing", "Клиенты с подозрением на общий аккаунт"),
+            ("connections", "Текущие входящие TCP соединения"),
+            ("backup", "Резервная копия базы 3X-UI"),
+            ("dashboard", "Статус с автообновлением"),
+            ("ssh_stats", "Статистика SSH входов за период"),
+            ("probes", "Задержка и потери до узлов сети"),
+            ("top", "Процессы по CPU и памяти"),
+            ("logs", "Последние строки логов"),
+            ("trusted", "Доверенные сети для SSH"),
+            ("profile", "Профиль потоков бота"),
+            ("memsnap", "Снимок памяти бота")
         ]
 
         # Отправляем запрос Telegram API
@@ -341,13 +422,9 @@ def apply_port_change(old_port, new_port):
     """
     try:
         # Проверяем, открыт ли старый порт (ищем точное совпадение с ALLOW)
-        result = subprocess.run(['ufw', 'status'], capture_output=True, text=True, timeout=10)
-
-        # Ищем строку вида "14698 ALLOW Anywhere" или "14698/tcp ALLOW Anywhere"
-        # Это более надежный способ, чем просто проверка наличия числа в выводе
-        pattern = re.compile(rf'^\s*{old_port}(/tcp)?\s+ALLOW\s+', re.MULTILINE)
+        result = run_command(['ufw', 'status'], capture_output=True, text=True, timeout=10)
 
-        if pattern.search(result.stdout):
+        if is_port_allowed(result.stdout, old_port):
             # Порт открыт (ALLOW), закрываем его
             if close_panel_port(old_port):
                 log_message(f"✅ Старый порт {old_port} закрыт")
@@ -362,17 +439,32 @@ def apply_port_change(old_port, new_port):
         log_message(f"❌ Ошибка при проверке/закрытии старого порта: {e}")
         return False
 
+def apply_alert_rule_changes(current_rules, text):
+    """
+    Применить строки из чата к списку правил alert_rules.
+    "имя: метрика > порог ..." добавляет или заменяет правило, "-имя" удаляет.
+    """
+    rules = {rule['name']: rule for rule in current_rules}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('-'):
+            name = line[1:].strip()
+            if rules.pop(name, None) is None:
+                raise ValueError(f"Правило {name} не найдено")
+            continue
+        rule = alerts.parse_rule(line)
+        rules[rule.name] = rule.to_dict()
+    return list(rules.values())
+
 async def change_config_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка команды /change_config"""
-    if update.effective_chat.id != config['owner_chat_id']:
-        if update.message:
-            await update.message.reply_text("❌ У вас нет доступа к этой команде.")
-        return
-
     keyboard = [
         [InlineKeyboardButton("⏱️ Изменить время доступа", callback_data='change_duration')],
         [InlineKeyboardButton("🔗 Изменить URL панели", callback_data='change_url')],
         [InlineKeyboardButton("🚪 Изменить порт панели", callback_data='change_port')],
+        [InlineKeyboardButton("🚨 Правила оповещений", callback_data='change_alerts')],
         [InlineKeyboardButton("↩️ Назад", callback_data='back_to_main')]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -384,6 +476,7 @@ async def change_config_command(update: Update, context: ContextTypes.DEFAULT_TY
 ⏱️ <b>Время доступа</b> - Как долго ссылка будет активна
 🔗 <b>URL панели</b> - Адрес веб-интерфейса 3X-UI
 🚪 <b>Порт панели</b> - Порт, через который открывается доступ
+🚨 <b>Правила оповещений</b> - Пороги CPU, ОЗУ, диска, нагрузки и трафика
 
 ⚠️ <b>Внимание!</b> При изменении URL или порта старый порт будет автоматически закрыт."""
 
@@ -394,60 +487,69 @@ async def change_config_command(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def change_config_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка нажатий кнопок в меню /change_config"""
-    global awaiting_input_for, change_config_initiator_chat_id
-
     if not update.callback_query:
         return
 
     query = update.callback_query
     await query.answer()
-
-    if update.effective_chat.id != config['owner_chat_id']:
-        await query.message.reply_text("❌ У вас нет доступа к этой функции.")
-        return
+    chat_id = update.effective_chat.id
 
     # Исправление: добавляем обработку нажатия кнопки "Настройки" (change_config)
     if query.data == 'change_config':
         # Показываем меню настроек
         await change_config_command(update, context)
         # Сбрасываем состояние, если оно было установлено ранее
-        awaiting_input_for = None
-        change_config_initiator_chat_id = None
+        bot_state.awaiting_input.pop(chat_id, None)
         return
 
     if query.data == 'change_duration':
-        awaiting_input_for = 'access_duration_minutes'
-        change_config_initiator_chat_id = update.effective_chat.id
+        bot_state.awaiting_input[chat_id] = 'access_duration_minutes'
         await query.message.reply_text(f"Введите новое время доступа в минутах (текущее: {config['access_duration_minutes']} минут):")
 
     elif query.data == 'change_url':
-        awaiting_input_for = 'panel_url'
-        change_config_initiator_chat_id = update.effective_chat.id
+        bot_state.awaiting_input[chat_id] = 'panel_url'
         await query.message.reply_text(f"Введите новый URL панели (текущий: {config['panel_url']}):")
 
     elif query.data == 'change_port':
-        awaiting_input_for = 'panel_port'
-        change_config_initiator_chat_id = update.effective_chat.id
+        bot_state.awaiting_input[chat_id] = 'panel_port'
         await query.message.reply_text(f"Введите новый порт панели (текущий: {config['panel_port']}):")
 
+    elif query.data == 'change_alerts':
+        bot_state.awaiting_input[chat_id] = 'alert_rules'
+        rules, _ = alerts.load_rules(config)
+        metrics = ", ".join(f"<code>{name}</code>" for name in alerts.METRICS)
+        await query.message.reply_text(
+            f"🚨 <b>Правила оповещений</b>\n\n{alerts.render_rules(rules)}\n\n"
+            f"Отправьте правила, по одному на строку:\n"
+            f"<code>имя: метрика &gt; порог [clear порог_сброса] [for секунд]</code> - добавить или заменить\n"
+            f"<code>-имя</code> - удалить\n\n"
+            f"Пример: <code>ram: ram_percent &gt; 90 clear 80 for 300</code>\n"
+            f"Метрики: {metrics}",
+            parse_mode='HTML'
+        )
+
     elif query.data == 'back_to_main':
         # Возвращаемся в главное меню
         await start_command(update, context)
         # Сбрасываем состояние
-        awaiting_input_for = None
-        change_config_initiator_chat_id = None
+        bot_state.awaiting_input.pop(chat_id, None)
 
 async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка текстового ввода для /change_config"""
-    global awaiting_input_for, change_config_initiator_chat_id, config
-
-    # Проверяем, ожидаем ли мы ввод
-    if awaiting_input_for is None or change_config_initiator_chat_id != update.effective_chat.id:
+    # Проверяем, ожидаем ли мы ввод от этого чата (ожидание снимается сразу, повторный ввод игнорируется)
+    awaiting_input_for = bot_state.awaiting_input.pop(update.effective_chat.id, None)
+    if awaiting_input_for is None:
         # Если не ожидаем, просто игнорируем сообщение
         return
 
     user_input = update.message.text.strip()
 
+    # Изменения config.json и правил UFW выполняются по одному
+    async with bot_state.config_lock:
+        await apply_text_input(update, awaiting_input_for, user_input)
+
+async def apply_text_input(update, awaiting_input_for, user_input):
+    """Применить введенное значение настройки awaiting_input_for"""
     try:
         if awaiting_input_for == 'access_duration_minutes':
             is_valid, new_value, error_msg = validate_duration(user_input)
@@ -473,9 +575,11 @@ async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
                     # Если порт изменился, обновляем его и закрываем старый
                     if extracted_port != old_port:
-                        if apply_port_change(old_port, extracted_port):
+                        if await asyncio.to_thread(apply_port_change, old_port, extracted_port):
                             if update_config_file('panel_port', extracted_port):
                                 config['panel_port'] = extracted_port
+                                # Открытые сессии переносятся на новый порт
+                                session_manager.schedule_flush()
                                 await update.message.reply_text(
                                     f"✅ URL панели успешно изменен с:\n<code>{old_url}</code>\nна:\n<code>{user_input}</code>\n\n"
                                     f"Порт изменен с {old_port} на {extracted_port}. Старый порт закрыт.",
@@ -501,10 +605,12 @@ async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 old_port = config['panel_port']
 
                 # Закрываем старый порт
-                if apply_port_change(old_port, new_port):
+                if await asyncio.to_thread(apply_port_change, old_port, new_port):
                     # Обновляем порт в конфиге
                     if update_config_file('panel_port', new_port):
                         config['panel_port'] = new_port
+                        # Открытые сессии переносятся на новый порт
+                        session_manager.schedule_flush()
                         # Обновляем URL, если он содержит порт
                         old_url = config['panel_url']
                         try:
@@ -544,136 +650,139 @@ async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     await update.message.reply_text("❌ Не удалось закрыть старый порт.")
             else:
                 await update.message.reply_text(f"❌ {error_msg}")
+        elif awaiting_input_for == 'alert_rules':
+            try:
+                new_rules = apply_alert_rule_changes(config.get('alert_rules', []), user_input)
+            except ValueError as e:
+                await update.message.reply_text(f"❌ {e}")
+            else:
+                if update_config_file('alert_rules', new_rules):
+                    config['alert_rules'] = new_rules
+                    rules, _ = alerts.load_rules(config)
+                    await update.message.reply_text(
+                        f"✅ Правила оповещений обновлены:\n\n{alerts.render_rules(rules)}",
+                        parse_mode='HTML'
+                    )
+                else:
+                    await update.message.reply_text("❌ Ошибка при сохранении правил.")
     except Exception as e:
         error_msg = f"❌ Неожиданная ошибка при обработке ввода: {e}"
         log_message(error_msg)
         await update.message.reply_text(error_msg)
-    finally:
-        # Сбрасываем состояние ожидания ввода
-        awaiting_input_for = None
-        change_config_initiator_chat_id = None
 
 # ==================== НОВЫЕ ФУНКЦИИ ДЛЯ SSH ====================
 
 async def open_ssh_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка команды /open_ssh"""
-    global ssh_timer, ssh_open_count
-
-    if update.effective_chat.id != config['owner_chat_id']:
-        await update.message.reply_text("❌ У вас нет доступа к этой команде.")
-        return
-
-    # Открываем SSH порт
-    if open_ssh_port():
-        ssh_open_count += 1
-        total_minutes = ssh_open_count * 60  # 60 минут на каждый вызов
-
-        # Отменяем предыдущий таймер, если он есть
-        if ssh_timer and ssh_timer.is_alive():
-            ssh_timer.cancel()
-
-        # Запускаем новый таймер
-        # В v20+ используется asyncio, поэтому таймер должен быть asyncio.TimerHandle
-        # Но для совместимости с существующей логикой, оставим threading.Timer
-        # TODO: Рассмотреть переход на asyncio.sleep в отдельной задаче
-        ssh_timer = threading.Timer(
-            total_minutes * 60,  # Переводим минуты в секунды
-            lambda: asyncio.run(end_ssh_session(context.application))
+    async with bot_state.ssh_lock:
+        # Открываем SSH порт
+        if not await asyncio.to_thread(open_ssh_port):
+            await update.message.reply_text("❌ Ошибка открытия SSH порта (22).")
+            return
+
+        bot_state.ssh_open_count += 1
+        open_count = bot_state.ssh_open_count
+        total_minutes = open_count * 60  # 60 минут на каждый вызов
+
+        # Предыдущая задача закрытия заменяется новой с накопленным временем
+        bot_state.cancel_ssh_timer()
+        bot_state.ssh_task = asyncio.get_running_loop().create_task(
+            end_ssh_session(context.application, total_minutes * 60), name="ssh-auto-close"
         )
-        ssh_timer.start()
 
-        await update.message.reply_text(
-            f"✅ SSH порт (22) открыт!\n"
-            f"Будет автоматически закрыт через {total_minutes} минут ({ssh_open_count} час(-а/-ов)).\n"
-            f"Повторный вызов /open_ssh увеличит время на 1 час."
-        )
-    else:
-        await update.message.reply_text("❌ Ошибка открытия SSH порта (22).")
+    await update.message.reply_text(
+        f"✅ SSH порт (22) открыт!\n"
+        f"Будет автоматически закрыт через {total_minutes} минут ({open_count} час(-а/-ов)).\n"
+        f"Повторный вызов /open_ssh увеличит время на 1 час."
+    )
 
 async def close_ssh_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка команды /close_ssh"""
-    global ssh_timer, ssh_open_count
-
-    if update.effective_chat.id != config['owner_chat_id']:
-        await update.message.reply_text("❌ У вас нет доступа к этой команде.")
-        return
+    async with bot_state.ssh_lock:
+        # Отменяем задачу автоматического закрытия, если она есть
+        bot_state.cancel_ssh_timer()
 
-    # Отменяем таймер, если он есть
-    if ssh_timer and ssh_timer.is_alive():
-        ssh_timer.cancel()
+        # Закрываем SSH порт
+        closed = await asyncio.to_thread(close_ssh_port)
+        if closed:
+            bot_state.ssh_open_count = 0  # Сбрасываем счетчик
 
-    # Закрываем SSH порт
-    if close_ssh_port():
-        ssh_open_count = 0  # Сбрасываем счетчик
+    if closed:
         await update.message.reply_text("✅ SSH порт (22) закрыт.")
     else:
         await update.message.reply_text("❌ Ошибка закрытия SSH порта (22).")
 
 # ==================== НОВЫЕ ФУНКЦИИ ДЛЯ STATUS ====================
 
-async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка команды /status"""
-    if update.effective_chat.id != config['owner_chat_id']:
-        if update.message:
-            await update.message.reply_text("❌ У вас нет доступа к этому боту.")
-        return
+def collect_status():
+    """Собрать показатели сервера для /status в словарь"""
+    # 1. Имя хоста
+    hostname = run_command(['hostname'], capture_output=True, text=True, timeout=5).stdout.strip()
+
+    # 2. Версия ОС
+    os_info_result = run_command(['lsb_release', '-d'], capture_output=True, text=True, timeout=5)
+    os_version = os_info_result.stdout.split(":")[1].strip() if os_info_result.returncode == 0 else "Неизвестно"
+
+    # 3. IP адрес
+    ip_info_result = run_command(['hostname', '-I'], capture_output=True, text=True, timeout=5)
+    ip_address = ip_info_result.stdout.strip().split()[0] if ip_info_result.returncode == 0 and ip_info_result.stdout.strip() else "Не удалось определить"
+
+    # 4. Загрузка CPU (мгновенная)
+    cpu_percent = psutil.cpu_percent(interval=1) # 1-секундный интервал для актуальности
+
+    # 5. Использование ОЗУ и диска
+    svmem = psutil.virtual_memory()
+    disk_usage = psutil.disk_usage('/')
+
+    # 6. Статус 3X-UI
+    xui_status_result = run_command(['systemctl', 'is-active', 'x-ui'], capture_output=True, text=True, timeout=10)
+
+    return {
+        'hostname': hostname,
+        'os_version': os_version,
+        'ip_address': ip_address,
+        'uptime': get_uptime_string(),
+        'cpu_percent': cpu_percent,
+        'ram_used': svmem.used,
+        'ram_total': svmem.total,
+        'ram_percent': svmem.percent,
+        'disk_used': disk_usage.used,
+        'disk_total': disk_usage.total,
+        'disk_percent': disk_usage.percent,
+        'load_avg': os.getloadavg(),
+        'xui_active': xui_status_result.stdout.strip() == 'active',
+    }
+
+def render_status(info):
+    """Сформировать текст /status (HTML) из словаря collect_status()"""
+    load_avg = info['load_avg']
+    load_avg_str = f"{load_avg[0]:.2f}, {load_avg[1]:.2f}, {load_avg[2]:.2f}"
+    # Комментарии для Load Average (для 1 ядра)
+    if load_avg[0] > 1.0:
+        load_comment = " (Высокая нагрузка!)"
+    elif load_avg[0] > 0.7:
+        load_comment = " (Повышенная нагрузка)"
+    else:
+        load_comment = " (Нормально)"
 
-    try:
-        # 1. Имя хоста
-        hostname = subprocess.run(['hostname'], capture_output=True, text=True, timeout=5).stdout.strip()
-
-        # 2. Версия ОС
-        os_info_result = subprocess.run(['lsb_release', '-d'], capture_output=True, text=True, timeout=5)
-        os_version = os_info_result.stdout.split(":")[1].strip() if os_info_result.returncode == 0 else "Неизвестно"
-
-        # 3. IP адрес
-        ip_info_result = subprocess.run(['hostname', '-I'], capture_output=True, text=True, timeout=5)
-        ip_address = ip_info_result.stdout.strip().split()[0] if ip_info_result.returncode == 0 and ip_info_result.stdout.strip() else "Не удалось определить"
-
-        # 4. Аптайм
-        uptime_str = get_uptime_string()
-
-        # 5. Загрузка CPU (мгновенная)
-        cpu_percent = psutil.cpu_percent(interval=1) # 1-секундный интервал для актуальности
-
-        # 6. Использование ОЗУ
-        svmem = psutil.virtual_memory()
-        ram_used = get_size(svmem.used)
-        ram_total = get_size(svmem.total)
-        ram_percent = svmem.percent
-
-        # 7. Использование диска
-        disk_usage = psutil.disk_usage('/')
-        disk_used = get_size(disk_usage.used)
-        disk_total = get_size(disk_usage.total)
-        disk_percent = disk_usage.percent
-
-        # 8. Load Average
-        load_avg = os.getloadavg()
-        load_avg_str = f"{load_avg[0]:.2f}, {load_avg[1]:.2f}, {load_avg[2]:.2f}"
-        # Комментарии для Load Average (для 1 ядра)
-        load_comment = ""
-        if load_avg[0] > 1.0:
-            load_comment = " (Высокая нагрузка!)"
-        elif load_avg[0] > 0.7:
-            load_comment = " (Повышенная нагрузка)"
-        else:
-            load_comment = " (Нормально)"
-
-        # 9. Статус 3X-UI
-        xui_status_result = subprocess.run(['systemctl', 'is-active', 'x-ui'], capture_output=True, text=True, timeout=10)
-        xui_status = "🟢 Активен" if xui_status_result.stdout.strip() == 'active' else "🔴 Неактивен"
-
-        message = f"""🖥️ <b>Статус сервера</b> (<code>{hostname}</code>)
-🚀 <b>ОС:</b> {os_version}
-🌐 <b>IPv4:</b> {ip_address}
-⏱️ <b>Аптайм:</b> {uptime_str}
-📈 <b>Загрузка CPU:</b> {cpu_percent}%
-💾 <b>ОЗУ:</b> {ram_used} / {ram_total} ({ram_percent:.1f}%)
-📂 <b>Диск (/):</b> {disk_used} / {disk_total} ({disk_percent:.1f}%)
+    xui_status = "🟢 Активен" if info['xui_active'] else "🔴 Неактивен"
+
+    return f"""🖥️ <b>Статус сервера</b> (<code>{info['hostname']}</code>)
+🚀 <b>ОС:</b> {info['os_version']}
+🌐 <b>IPv4:</b> {info['ip_address']}
+⏱️ <b>Аптайм:</b> {info['uptime']}
+📈 <b>Загрузка CPU:</b> {info['cpu_percent']}%
+💾 <b>ОЗУ:</b> {get_size(info['ram_used'])} / {get_size(info['ram_total'])} ({info['ram_percent']:.1f}%)
+📂 <b>Диск (/):</b> {get_size(info['disk_used'])} / {get_size(info['disk_total'])} ({info['disk_percent']:.1f}%)
 📊 <b>Нагрузка (1/5/15 мин):</b> {load_avg_str}{load_comment}
 🎛️ <b>3X-UI:</b> <code>{xui_status}</code>"""
 
+async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /status"""
+    try:
+        # Сбор занимает около секунды (замер CPU, внешние команды) - вне цикла событий
+        message = render_status(await asyncio.to_thread(collect_status))
+
         if update.message:
             await update.message.reply_text(message, parse_mode='HTML')
         elif update.callback_query:
@@ -687,15 +796,256 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif update.callback_query:
             await update.callback_query.message.reply_text(error_msg)
 
+async def render_dashboard():
+    """Текст /dashboard: тот же статус, собранный вне цикла событий"""
+    info = await asyncio.to_thread(collect_status)
+    # Загрузка CPU с точностью до процента: мелкие колебания не должны давать правку сообщения
+    info['cpu_percent'] = round(info['cpu_percent'])
+    return render_status(info)
+
+async def dashboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /dashboard [минут]"""
+    minutes = config.get('dashboard_duration_minutes', 10)
+    if context.args:
+        try:
+            minutes = max(1, min(60, int(context.args[0])))
+        except ValueError:
+            await update.message.reply_text("❌ Укажите длительность в минутах, например: /dashboard 15")
+            return
+    try:
+        await dashboard_manager.open(context.bot, update.effective_chat.id, minutes * 60)
+    except Exception as e:
+        error_msg = f"❌ Ошибка получения статуса: {e}"
+        log_message(error_msg)
+        await update.effective_message.reply_text(error_msg)
+
+async def perf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /perf"""
+    report = (perf.render_report() + "\n\n" + checks.render_results(monitor.check_runner)
+              + "\n\n" + access_control.render_stats())
+    await update.message.reply_text(report, parse_mode='HTML')
+
+async def sharing_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /sharing"""
+    await update.message.reply_text(xray_monitor.render_sharing_report(), parse_mode='HTML')
+
+async def connections_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /connections [N]"""
+    limit = 10
+    if context.args:
+        try:
+            limit = max(1, min(50, int(context.args[0])))
+        except ValueError:
+            await update.message.reply_text("❌ Укажите количество строк числом, например: /connections 20")
+            return
+
+    port_labels = {22: 'SSH', config['panel_port']: 'панель'}
+    if config.get('delivery_mode') == 'webhook':
+        port_labels[config.get('webhook', {}).get('port', 8443)] = 'webhook'
+
+    try:
+        # Разбор таблиц сокетов в отдельном потоке, чтобы не задерживать другие обновления
+        stats = await asyncio.to_thread(connections.scan_connections)
+        message = connections.render_connections(stats, port_labels, limit)
+    except Exception as e:
+        message = f"❌ Ошибка чтения таблицы соединений: {e}"
+        log_message(message)
+    await update.message.reply_text(message, parse_mode='HTML')
+
+def run_backup():
+    """Резервная копия x-ui.db с настройками из config.json (выполняется в отдельном потоке)"""
+    retention = {
+        'keep_last': config.get('backup_keep_last', 7),
+        'keep_daily': config.get('backup_keep_daily', 14),
+        'keep_weekly': config.get('backup_keep_weekly', 8),
+    }
+    return backup.create_backup(
+        config.get('xui_db_path', backup.DEFAULT_DB_PATH),
+        config.get('backup_dir', backup.DEFAULT_ARCHIVE_DIR),
+        retention,
+    )
+
+async def send_backup(bot, chat_id, result):
+    """Отправить копию документом и удалить временный gzip"""
+    try:
+        if result.export_size > backup.UPLOAD_LIMIT:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=backup.describe(result) + "\n\n⚠️ Архив больше 50 МБ и не отправлен, копия сохранена в архиве на сервере.",
+                parse_mode='HTML'
+            )
+            return
+        with open(result.export_path, 'rb') as f:
+            await bot.send_document(
+                chat_id=chat_id,
+                document=f,
+                filename=os.path.basename(result.export_path),
+                caption=backup.describe(result),
+                parse_mode='HTML'
+            )
+    finally:
+        os.remove(result.export_path)
+
+async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /backup"""
+    await update.message.reply_text("💾 Создаю резервную копию базы 3X-UI...")
+    try:
+        result = await asyncio.to_thread(run_backup)
+    except Exception as e:
+        message = f"❌ Ошибка резервного копирования: {e}"
+        log_message(message)
+        await update.message.reply_text(message)
+        return
+    log_message(f"Резервная копия {result.name}: новых кусков {result.new_chunks}, изменилась: {result.changed}")
+    await send_backup(context.bot, update.effective_chat.id, result)
+
+async def scheduled_backup(application):
+    """Копия по расписанию: владельцу отправляется только изменившаяся база"""
+    result = await asyncio.to_thread(run_backup)
+    log_message(f"Резервная копия по расписанию {result.name}: новых кусков {result.new_chunks}, изменилась: {result.changed}")
+    if result.changed and config.get('backup_send_scheduled', True):
+        await send_backup(application.bot, config['owner_chat_id'], result)
+    else:
+        os.remove(result.export_path)
+
+async def ssh_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /ssh_stats [окно]"""
+    window = 24 * 3600
+    if context.args:
+        try:
+            window = ssh_stats.parse_window(context.args[0])
+        except ValueError:
+            await update.message.reply_text("❌ Укажите окно, например: /ssh_stats 30m, /ssh_stats 24h, /ssh_stats 7d")
+            return
+    await update.message.reply_text(ssh_stats.render_stats(ssh_monitor.stats, window), parse_mode='HTML')
+
+async def top_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /top [N] [mem]"""
+    limit, by = 10, 'cpu'
+    for arg in context.args or []:
+        if arg.isdigit():
+            limit = max(1, min(50, int(arg)))
+        elif arg.lower() in ('mem', 'rss', 'ram'):
+            by = 'mem'
+        elif arg.lower() != 'cpu':
+            await update.message.reply_text("❌ Формат: /top [N] [mem], например: /top 15 mem")
+            return
+    await update.message.reply_text(processes.render_top(process_sampler, limit, by), parse_mode='HTML')
+
+async def logs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /logs [компонент] [N] [шаблон]"""
+    args = list(context.args or [])
+    component, count = 'bot', logs.DEFAULT_LINES
+    if args and args[0] in log_sources:
+        component = args.pop(0)
+    if args and args[0].isdigit():
+        count = max(1, min(logs.MAX_LINES, int(args.pop(0))))
+    pattern = " ".join(args) or None
+
+    try:
+        # Чтение файлов - в отдельном потоке, чтобы поиск по большим логам не держал цикл событий
+        messages = await asyncio.to_thread(logs.render_logs, log_sources, component, count, pattern)
+    except OSError as e:
+        await update.message.reply_text(f"❌ Ошибка чтения лога: {e}")
+        return
+    for message in messages:
+        await update.message.reply_text(message, parse_mode='HTML')
+
+async def trusted_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /trusted [add|remove|check СЕТЬ]"""
+    known = ssh_monitor.known_networks
+    args = context.args or []
+    if not args or args[0].lower() == 'list':
+        await update.message.reply_text(prefixes.render_trusted(known), parse_mode='HTML')
+        return
+    action = args[0].lower()
+    if action not in ('add', 'remove', 'del', 'check') or len(args) != 2:
+        await update.message.reply_text(
+            "❌ Формат: /trusted, /trusted add 203.0.113.0/24, /trusted remove 203.0.113.0/24, /trusted check IP"
+        )
+        return
+    try:
+        if action == 'check':
+            network = known.match(str(ipaddress.ip_address(args[1])))
+            if network is None:
+                text = f"🚨 <code>{args[1]}</code> не входит ни в одну доверенную сеть"
+            else:
+                text = f"🛡 <code>{args[1]}</code> входит в доверенную сеть <code>{network}</code>"
+        elif action == 'add':
+            network = await asyncio.to_thread(known.add, args[1])
+            text = f"✅ Сеть <code>{network}</code> добавлена в доверенные"
+            log_message(f"Доверенная сеть SSH {network} добавлена пользователем {update.effective_chat.id}")
+        else:
+            removed = await asyncio.to_thread(known.remove, args[1])
+            text = (f"✅ Сеть <code>{args[1]}</code> удалена из доверенных" if removed
+                    else f"ℹ️ Сети <code>{args[1]}</code> нет в списке (удаляется точный префикс из /trusted)")
+            if removed:
+                log_message(f"Доверенная сеть SSH {args[1]} удалена пользователем {update.effective_chat.id}")
+    except ValueError:
+        await update.message.reply_text("❌ Некорректный адрес или сеть, пример: 203.0.113.0/24 или 2001:db8::/48")
+        return
+    await update.message.reply_text(text, parse_mode='HTML')
+
+async def probes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /probes"""
+    await update.message.reply_text(probes.render_probes(monitor.probe_monitor), parse_mode='HTML')
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /profile [секунд]"""
+    if not config.get('profiling_enabled', False):
+        await update.message.reply_text("ℹ️ Профилирование выключено (profiling_enabled в config.json).")
+        return
+    seconds = 30
+    if context.args:
+        try:
+            seconds = max(1, min(profiler.MAX_PROFILE_SECONDS, int(context.args[0])))
+        except ValueError:
+            await update.message.reply_text("❌ Укажите длительность в секундах, например: /profile 30")
+            return
+
+    await update.message.reply_text(f"🔬 Снимаю профиль всех потоков в течение {seconds} с...")
+    try:
+        # Опрос стеков идет в отдельном потоке: цикл событий продолжает работать и сам попадает в профиль
+        stacks, samples = await asyncio.to_thread(profiler.collect_stacks, seconds)
+    except RuntimeError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+
+    path = f"/tmp/profile-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+    await asyncio.to_thread(profiler.write_collapsed, stacks, path)
+    try:
+        with open(path, 'rb') as f:
+            await update.message.reply_document(
+                document=f,
+                filename=os.path.basename(path),
+                caption=f"Профиль за {seconds} с (collapsed stacks)"
+            )
+    finally:
+        os.remove(path)
+    await update.message.reply_text(profiler.render_profile_summary(stacks, samples, seconds), parse_mode='HTML')
+
+async def memsnap_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /memsnap [stop]"""
+    if not config.get('profiling_enabled', False):
+        await update.message.reply_text("ℹ️ Профилирование выключено (profiling_enabled в config.json).")
+        return
+    if context.args and context.args[0].lower() == 'stop':
+        stopped = profiler.stop_memory_tracing()
+        await update.message.reply_text("✅ Трассировка памяти выключена." if stopped else "ℹ️ Трассировка памяти не была включена.")
+        return
+
+    report = await asyncio.to_thread(profiler.memory_snapshot)
+    if report is None:
+        report = ("🧠 Трассировка памяти включена (tracemalloc), базовый снимок сохранен.\n"
+                  "Повторите /memsnap позже, чтобы увидеть места выделения и прирост. /memsnap stop - выключить.")
+        await update.message.reply_text(report)
+        return
+    await update.message.reply_text(report, parse_mode='HTML')
+
 # ==================== КОНЕЦ НОВЫХ ФУНКЦИЙ ====================
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка команды /start"""
-    if update.effective_chat.id != config['owner_chat_id']:
-        if update.message:  # Проверяем, что message существует
-            await update.message.reply_text("❌ У вас нет доступа к этому боту.")
-        return
-
     keyboard = [
         [InlineKeyboardButton("🔓 Получить ссылку", callback_data='get_link')],
         [InlineKeyboardButton("🔒 Закрыть доступ", callback_data='close_link')],
@@ -704,9 +1054,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    # Получаем текущий статус
+    # Получаем текущий статус (systemctl - вне цикла событий, как в /status)
     server_status = "🟢 Онлайн" if check_server_status() else "🔴 Офлайн"
-    xui_status = "🟢 Активен" if check_xui_status() else "🔴 Остановлен"
+    xui_status = "🟢 Активен" if await asyncio.to_thread(check_xui_status) else "🔴 Остановлен"
 
     message = f"""🤖 <b>Telegram Bot для управления 3X-UI</b>
 
@@ -714,11 +1064,24 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /start - Главное меню
 /help - Помощь
 /status - Статус сервера
-/getlink - Получить ссылку на панель
-/offlink - Закрыть доступ к панели
+/getlink [IP] - Получить ссылку на панель
+/offlink [сессия] - Закрыть доступ к панели
+/sessions - Активные сессии доступа
 /change_config - Изменить настройки
 /open_ssh - Открыть SSH порт
 /close_ssh - Закрыть SSH порт
+/perf - Производительность бота
+/sharing - Общие аккаунты VPN
+/connections - Входящие соединения
+/backup - Резервная копия 3X-UI
+/dashboard - Статус с автообновлением
+/ssh_stats - Статистика SSH
+/probes - Проверка сети
+/top - Процессы по CPU и памяти
+/logs - Логи сервера
+/trusted - Доверенные сети SSH
+/profile - Профиль потоков бота
+/memsnap - Снимок памяти бота
 
 <b>Статус системы:</b>
 🖥️ Сервер: {server_status}
@@ -730,11 +1093,6 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка команды /help"""
-    if update.effective_chat.id != config['owner_chat_id']:
-        if update.message:  # Проверяем, что message существует
-            await update.message.reply_text("❌ У вас нет доступа к этому боту.")
-        return
-
     message = """🤖 <b>Помощь по боту</b>
 
 <b>Основные функции:</b>
@@ -746,95 +1104,133 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /start - Главное меню
 /help - Эта справка
 /status - Статус сервера и ресурсов
-/getlink - Получить временную ссылку на панель
-/offlink - Закрыть доступ к панели
+/getlink - Получить временную ссылку на панель (порт открывается для всех)
+/getlink IP - Открыть панель только для указанного IP
+/offlink - Закрыть свои сессии доступа к панели
+/offlink ID - Закрыть одну сессию
+/sessions - Активные сессии доступа к панели
 /change_config - Изменить настройки бота
 /open_ssh - Открыть SSH порт (22) на 1 час (накапливается)
 /close_ssh - Закрыть SSH порт (22)
+/perf - Задержки обработчиков и внешних вызовов (p50/p95/p99)
+/sharing - Клиенты, к которым подключаются с большего числа IP, чем разрешено
+/connections [N] - Входящие TCP соединения по портам и IP (топ N)
+/backup - Резервная копия базы 3X-UI документом (копии по расписанию хранятся в архиве)
+/dashboard [минут] - Статус в одном сообщении, которое обновляется на месте (по умолчанию 10 минут)
+/ssh_stats [окно] - Входы и неудачные попытки SSH за 30m, 24h, 7d... с частыми IP и пользователями
+/probes - Задержка (p50/p95/p99) и потери до шлюза, DNS и внешних узлов
+/top [N] [mem] - Самые нагруженные процессы по CPU или по памяти (mem)
+/logs [компонент] [N] [шаблон] - Последние N строк лога (bot, auth, xray), при шаблоне - только совпадающие
+/trusted [add|remove|check СЕТЬ] - Доверенные сети SSH: входы из них не присылаются, из остальных - срочное оповещение
+/profile [N] - Профиль всех потоков за N секунд (файл для flamegraph), нужен profiling_enabled
+/memsnap [stop] - Места выделения памяти и прирост с прошлого снимка (tracemalloc)
 
 <b>Безопасность:</b>
-Доступ к панели предоставляется на 30 минут и автоматически закрывается."""
+Каждая сессия доступа к панели действует access_duration_minutes минут и закрывается автоматически; несколько сессий могут быть открыты одновременно."""
 
     await update.message.reply_text(message, parse_mode='HTML')
 
-async def get_link_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка команды /getlink"""
-    global active_session, session_timer
+def describe_session(session):
+    """Строка с описанием сессии доступа для ответов бота"""
+    scope = f"только с IP <code>{session.ip}</code>" if session.ip else "для всех IP"
+    return f"<code>{session.id}</code> - {scope}, осталось {session.remaining_minutes()} мин."
 
+async def get_link_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /getlink [IP]"""
     # Проверяем, что это сообщение, а не callback
     message_obj = update.message if hasattr(update, 'message') and update.message else None
     if not message_obj and hasattr(update, 'callback_query') and update.callback_query:
         message_obj = update.callback_query.message
 
-    if update.effective_chat.id != config['owner_chat_id']:
-        if message_obj:
-            await message_obj.reply_text("❌ У вас нет доступа к этому боту.")
-        return
-
-    if active_session:
-        if message_obj:
-            await message_obj.reply_text("⚠️ Сессия уже активна! Дождитесь завершения текущей сессии.")
-        return
-
-    # Открываем порт
-    if open_panel_port(config['panel_port']):
-        active_session = True
-        # Запускаем таймер для автоматического закрытия
-        # В v20+ используется asyncio, поэтому таймер должен быть asyncio.TimerHandle
-        # Но для совместимости с существующей логикой, оставим threading.Timer
-        # TODO: Рассмотреть переход на asyncio.sleep в отдельной задаче
-        session_timer = threading.Timer(
-            config['access_duration_minutes'] * 60,
-            lambda: asyncio.run(end_session(context.application))
-        )
-        session_timer.start()
+    # /getlink 203.0.113.7 - доступ только с этого адреса; без аргумента - для всех
+    ip = None
+    if update.message and context.args:
+        try:
+            ip = str(ipaddress.ip_address(context.args[0]))
+        except ValueError:
+            await message_obj.reply_text("❌ Некорректный IP адрес. Пример: /getlink 203.0.113.7")
+            return
+
+    chat_id = update.effective_chat.id
+    async with bot_state.link_lock(chat_id):
+        session = bot_state.recent_link(chat_id, ip or sessions.ANY_SOURCE)
+        if session is not None:
+            # Двойное нажатие: показываем только что открытую сессию, а не создаем вторую
+            if message_obj:
+                await message_obj.reply_text(
+                    f"ℹ️ Доступ уже открыт: {describe_session(session)}", parse_mode='HTML'
+                )
+            return
+        session, ok = await session_manager.open(chat_id, ip, config['access_duration_minutes'])
+        if not ok:
+            if message_obj:
+                await message_obj.reply_text("❌ Ошибка открытия доступа к панели.")
+            return
+        bot_state.recent_links[chat_id] = (session.source, time.monotonic(), session)
 
-        # Отправляем ссылку
-        message_text = f"""✅ <b>Доступ к панели открыт!</b>
+    scope = f"только с IP <code>{ip}</code>" if ip else "для всех IP"
+    message_text = f"""✅ <b>Доступ к панели открыт</b> ({scope})
 
 🔗 Ссылка: {config['panel_url']}
 
-⏰ Доступ будет автоматически закрыт через {config['access_duration_minutes']} минут."""
+🎫 Сессия: <code>{session.id}</code>
+⏰ Доступ будет автоматически закрыт через {config['access_duration_minutes']} минут.
+Закрыть раньше: /offlink {session.id}"""
 
-        if message_obj:
-            await message_obj.reply_text(message_text, parse_mode='HTML')
-    else:
-        if message_obj:
-            await message_obj.reply_text("❌ Ошибка открытия доступа к панели.")
+    if message_obj:
+        await message_obj.reply_text(message_text, parse_mode='HTML')
 
 async def off_link_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка команды /offlink"""
-    global active_session, session_timer
-
+    """Обработка команды /offlink [id сессии]"""
     # Проверяем, что это сообщение, а не callback
     message_obj = update.message if hasattr(update, 'message') and update.message else None
     if not message_obj and hasattr(update, 'callback_query') and update.callback_query:
         message_obj = update.callback_query.message
 
-    if update.effective_chat.id != config['owner_chat_id']:
-        if message_obj:
-            await message_obj.reply_text("❌ У вас нет доступа к этому боту.")
-        return
+    chat_id = update.effective_chat.id
+    if update.message and context.args:
+        session = session_manager.sessions.get(context.args[0])
+        # Чужие сессии может закрывать только владелец
+        if session is None or (session.chat_id != chat_id and access_control.role_of(chat_id) != 'owner'):
+            await message_obj.reply_text("ℹ️ Сессия не найдена или уже завершена.")
+            return
+        sessions = [session]
+    else:
+        sessions = session_manager.sessions_for(chat_id)
 
-    if not active_session:
+    if not sessions:
         if message_obj:
-            await message_obj.reply_text("ℹ️ Порт уже закрыт. Нет активной сессии.")
+            await message_obj.reply_text("ℹ️ Нет активных сессий доступа к панели.")
         return
 
-    # Отменяем таймер если он есть
-    if session_timer and session_timer.is_alive():
-        session_timer.cancel()
-
-    # Закрываем порт
-    if close_panel_port(config['panel_port']):
-        active_session = False
+    if await session_manager.close([session.id for session in sessions]):
         if message_obj:
-            await message_obj.reply_text("✅ Доступ к панели закрыт. Порт заблокирован.")
-        log_message("Порт панели закрыт по команде пользователя")
+            closed = "\n".join(describe_session(session) for session in sessions)
+            await message_obj.reply_text(f"✅ Доступ к панели закрыт:\n{closed}", parse_mode='HTML')
+        log_message(f"Сессии доступа к панели закрыты по команде пользователя: {', '.join(s.id for s in sessions)}")
     else:
         if message_obj:
             await message_obj.reply_text("❌ Ошибка закрытия доступа к панели.")
 
+async def sessions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /sessions"""
+    # Владелец видит все сессии, остальные - только свои
+    chat_id = update.effective_chat.id
+    owner = access_control.role_of(chat_id) == 'owner'
+    sessions = session_manager.sessions_for(None if owner else chat_id)
+    if not sessions:
+        await update.message.reply_text("ℹ️ Нет активных сессий доступа к панели.")
+        return
+    lines = "\n".join(describe_session(session) for session in sessions)
+    await update.message.reply_text(f"🎫 <b>Сессии доступа к панели</b>\n\n{lines}", parse_mode='HTML')
+
+async def notify_session_expired(application, session):
+    """Уведомление инициатору об истечении сессии"""
+    await application.bot.send_message(
+        chat_id=session.chat_id,
+        text=f"⚠️ Сессия доступа к панели {session.id} завершена. Доступ закрыт."
+    )
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка нажатий кнопок"""
     if not update.callback_query:
@@ -852,43 +1248,126 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data == 'status':
         # Создаем фиктивный update для вызова status_command
         await status_command(update, context)
-    elif query.data in ['change_config', 'change_duration', 'change_url', 'change_port', 'back_to_main']:
+    elif query.data == dashboard.STOP_CALLBACK:
+        await dashboard_manager.close(query.message.chat_id, context.bot)
+    elif query.data in ['change_config', 'change_duration', 'change_url', 'change_port', 'change_alerts', 'back_to_main']:
         # Обрабатываем кнопки меню /change_config
         await change_config_button_handler(update, context)
 
 async def post_init(application):
     """Функция, вызываемая после инициализации приложения"""
     await set_bot_commands(application)
+    # Единственная задача, которая закрывает истекшие сессии доступа к панели
+    session_manager.on_expire = functools.partial(notify_session_expired, application)
+    await asyncio.to_thread(session_manager.cleanup_scoped_rules)
+    session_manager.start()
+    backup_scheduler.job = functools.partial(scheduled_backup, application)
+    backup_scheduler.start()
+    process_sampler.start()
+
+async def post_shutdown(application):
+    """Функция, вызываемая при остановке приложения"""
+    await session_manager.stop()
+    await backup_scheduler.stop()
+    await dashboard_manager.stop()
+    bot_state.cancel_ssh_timer()
+
+def build_application():
+    """Создание приложения и регистрация обработчиков"""
+    # Запросы к Bot API идут через TimedRequest, чтобы их задержки попадали в /perf
+    builder = (
+        ApplicationBuilder()
+        .token(config['telegram_token'])
+        .request(perf.TimedRequest(connection_pool_size=8))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        # Обновления обрабатываются параллельно; общее состояние защищено блокировками BotState
+        .concurrent_updates(config.get('concurrent_updates', 32))
+    )
+    # Альтернативный адрес Bot API (локальный telegram-bot-api или тестовый сервер)
+    api_url = config.get('telegram_api_url')
+    if api_url:
+        api_url = api_url.rstrip('/')
+        builder = builder.base_url(f"{api_url}/bot").base_file_url(f"{api_url}/file/bot")
+    application = builder.build()
+
+    # Группа -1 обрабатывается первой: чужие чаты и флуд отсекаются до диспетчеризации
+    application.add_handler(TypeHandler(Update, access_control.filter_update), group=-1)
+
+    # Регистрация обработчиков команд (каждый обернут замером длительности)
+    commands = [
+        ("start", start_command),
+        ("help", help_command),
+        ("status", status_command),
+        ("getlink", get_link_command),
+        ("offlink", off_link_command),
+        ("sessions", sessions_command),
+        ("change_config", change_config_command),
+        ("open_ssh", open_ssh_command),
+        ("close_ssh", close_ssh_command),
+        ("perf", perf_command),
+        ("sharing", sharing_command),
+        ("connections", connections_command),
+        ("backup", backup_command),
+        ("dashboard", dashboard_command),
+        ("ssh_stats", ssh_stats_command),
+        ("probes", probes_command),
+        ("top", top_command),
+        ("logs", logs_command),
+        ("trusted", trusted_command),
+        ("profile", profile_command),
+        ("memsnap", memsnap_command),
+    ]
+    for name, callback in commands:
+        application.add_handler(CommandHandler(name, perf.timed_handler(name, callback)))
 
-def main():
-    """Основная функция бота"""
-    try:
-        # Создаем приложение
-        application = (
-            ApplicationBuilder()
-            .token(config['telegram_token'])
-            .post_init(post_init)
-            .build()
-        )
+    # Регистрация обработчика callback кнопок
+    application.add_handler(CallbackQueryHandler(perf.timed_handler("callback", button_handler)))
 
-        # Регистрация обработчиков команд
-        application.add_handler(CommandHandler("start", start_command))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("status", status_command))
-        application.add_handler(CommandHandler("getlink", get_link_command))
-        application.add_handler(CommandHandler("offlink", off_link_command))
-        application.add_handler(CommandHandler("change_config", change_config_command))
-        application.add_handler(CommandHandler("open_ssh", open_ssh_command))
-        application.add_handler(CommandHandler("close_ssh", close_ssh_command))
+    # Регистрация обработчика текстовых сообщений (для /change_config)
+    application.add_handler(MessageHandler(
+        filters.TEXT & ~filters.COMMAND,
+        perf.timed_handler("text_input", handle_text_input)
+    ))
+    return application
 
-        # Регистрация обработчика callback кнопок
-        application.add_handler(CallbackQueryHandler(button_handler))
+def run_application(application):
+    """
+    Запуск приема обновлений в режиме из конфига: polling (по умолчанию) или webhook.
+    """
+    run_kwargs = {}
+    if threading.current_thread() is not threading.main_thread():
+        # main.py запускает бота в отдельном потоке: там нет цикла событий по умолчанию,
+        # а обработчики сигналов можно ставить только из главного потока
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        run_kwargs['stop_signals'] = None
+
+    if config.get('delivery_mode', 'polling') == 'webhook':
+        webhook = config.get('webhook', {})
+        # Без заданного секрета генерируем случайный на время работы процесса:
+        # Telegram присылает его в заголовке X-Telegram-Bot-Api-Secret-Token
+        secret_token = webhook.get('secret_token') or secrets.token_urlsafe(32)
+        application.run_webhook(
+            listen=webhook.get('listen', '127.0.0.1'),
+            port=webhook.get('port', 8443),
+            url_path=webhook.get('url_path', 'telegram'),
+            cert=webhook.get('cert'),
+            key=webhook.get('key'),
+            webhook_url=webhook.get('public_url'),
+            secret_token=secret_token,
+            max_connections=webhook.get('max_connections', 40),
+            **run_kwargs
+        )
+    else:
+        application.run_polling(**run_kwargs)
 
-        # Регистрация обработчика текстовых сообщений (для /change_config)
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_input))
+def main():
+    """Основная функция бота"""
+    try:
+        application = build_application()
 
-        log_message("Бот запущен")
-        application.run_polling()
+        log_message(f"Бот запущен (режим: {config.get('delivery_mode', 'polling')})")
+        run_application(application)
 
     except Exception as e:
         log_message(f"Критическая ошибка бота: {e}")
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Реестр проверок системного мониторинга.
+
+Проверка - подкласс Check с именем, интервалом и асинхронным run(), который
+возвращает CheckResult: состояние ('ok', 'warn', 'fail'), тексты оповещений
+для владельца и числовые показатели. Проверки бывают трех видов:
+
+- встроенные (BUILTIN) - модули этого пакета;
+- подключаемые файлы - <checks_dir>/<имя>.py;
+- пакеты с точкой входа в группе ENTRY_POINT_GROUP.
+
+Список доступных проверок собирается без импорта: модуль загружается, только
+если проверка включена в config['checks']. Модуль проверки задает класс
+в переменной CHECK. Время и ошибки каждого запуска попадают в /perf
+как метрика check:<имя>, там же - последнее состояние и показатели каждой
+проверки и найденные, но не включенные проверки.
+"""
+
+import asyncio
+import html
+import importlib
+import importlib.util
+import os
+import time
+
+import perf
+
+BUILTIN = {
+    'resources': 'checks.resources',
+    'clients': 'checks.clients',
+}
+DEFAULT_CHECKS = ['resources', 'clients']
+DEFAULT_CHECKS_DIR = '/opt/telegram-bot/checks.d'
+ENTRY_POINT_GROUP = 'telegram_3xui_bot.checks'
+
+STATUS_ICONS = {'ok': '✅', 'warn': '⚠️', 'fail': '❌'}
+MAX_SHOWN_METRICS = 8  # сколько показателей проверки выводить в /perf
+
+STATUSES = ('ok', 'warn', 'fail')
+
+
+class CheckResult:
+    """Результат одного запуска проверки"""
+    __slots__ = ('status', 'messages', 'metrics')
+
+    def __init__(self, status='ok', messages=(), metrics=None):
+        if status not in STATUSES:
+            raise ValueError(f"неизвестное состояние проверки: {status}")
+        self.status = status
+        self.messages = list(messages)  # оповещения владельцу (HTML)
+        self.metrics = metrics or {}    # имя -> число
+
+
+class CheckContext:
+    """То, что монитор дает проверкам: конфиг, отправка оповещений, лог и сохраняемое состояние"""
+
+    def __init__(self, config, send, log, state=None):
+        self.config = config
+        self.send = send
+        self.log = log
+        self.state = state if state is not None else {}  # имя проверки -> dict, сохраняется в state.json
+
+    def state_for(self, name):
+        return self.state.setdefault(name, {})
+
+
+class Check:
+    """Базовый класс проверки"""
+    name = None
+    interval = 60   # по умолчанию, если в настройках нет interval_seconds
+    timeout = 60
+
+    def __init__(self, context, settings=None):
+        self.context = context
+        self.settings = settings or {}
+        self.interval = self.settings.get('interval_seconds') or self.default_interval(context.config)
+        self.timeout = self.settings.get('timeout_seconds', self.timeout)
+
+    def default_interval(self, config):
+        return self.interval
+
+    @property
+    def state(self):
+        return self.context.state_for(self.name)
+
+    async def setup(self):
+        """Подготовка при запуске мониторинга. False - проверку нельзя выполнять (она отключается)"""
+        return True
+
+    async def run(self):
+        raise NotImplementedError
+
+
+def _entry_points():
+    try:
+        from importlib.metadata import entry_points
+        return {entry.name: entry for entry in entry_points(group=ENTRY_POINT_GROUP)}
+    except Exception:
+        return {}
+
+
+def available(config):
+    """Имя -> источник ('builtin', 'file', 'entry_point') для всех найденных проверок, без импорта"""
+    found = {name: 'builtin' for name in BUILTIN}
+    for name in _entry_points():
+        found.setdefault(name, 'entry_point')
+    checks_dir = config.get('checks_dir', DEFAULT_CHECKS_DIR)
+    try:
+        for filename in sorted(os.listdir(checks_dir)):
+            if filename.endswith('.py') and not filename.startswith('_'):
+                found.setdefault(filename[:-3], 'file')
+    except OSError:
+        pass
+    return found
+
+
+def load_check_class(name, config):
+    """Импортировать модуль проверки и вернуть ее класс"""
+    if name in BUILTIN:
+        module = importlib.import_module(BUILTIN[name])
+    else:
+        entry = _entry_points().get(name)
+        if entry is not None:
+            loaded = entry.load()
+            return loaded if isinstance(loaded, type) else loaded.CHECK
+        path = os.path.join(config.get('checks_dir', DEFAULT_CHECKS_DIR), f"{name}.py")
+        if not os.path.exists(path):
+            raise LookupError(f"проверка {name} не найдена")
+        spec = importlib.util.spec_from_file_location(f"checks_d.{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module.CHECK
+
+
+def enabled_from_config(config):
+    """[(имя, настройки)] из config['checks']: строки ("clients") или объекты {"name": ..., ...}"""
+    entries = config.get('checks', DEFAULT_CHECKS)
+    enabled = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"name": entry}
+        enabled.append((entry['name'], entry))
+    return enabled
+
+
+def load_enabled(context):
+    """Экземпляры включенных проверок; ошибки загрузки пишутся в лог, проверка пропускается"""
+    checks = []
+    for name, settings in enabled_from_config(context.config):
+        started = time.perf_counter()
+        try:
+            check = load_check_class(name, context.config)(context, settings)
+            check.name = check.name or name
+            checks.append(check)
+        except Exception as e:
+            context.log(f"Проверка {name} не загружена: {e}")
+            continue
+        perf.record(f"check_load:{name}", time.perf_counter() - started)
+    return checks
+
+
+class CheckRunner:
+    """
+    Выполнение проверок в собственном цикле событий потока мониторинга:
+    проверки, срок которых пришелся на один тик, идут параллельно.
+    """
+
+    def __init__(self, checks, context):
+        self.checks = {check.name: check for check in checks}
+        self.context = context
+        self.last = {}   # имя -> (time.time(), последний CheckResult); читается ботом из другого потока
+        self.loop = asyncio.new_event_loop()
+        enabled = {name for name, _ in enabled_from_config(context.config)}
+        self.disabled = sorted(set(available(context.config)) - enabled)  # найдены, но не включены
+
+    def setup(self):
+        """Вызвать setup() всех проверок; отказавшиеся удаляются из списка"""
+        for name, check in list(self.checks.items()):
+            try:
+                ready = self.loop.run_until_complete(check.setup())
+            except Exception as e:
+                self.context.log(f"Ошибка подготовки проверки {name}: {e}")
+                ready = False
+            if ready is False:
+                del self.checks[name]
+        return list(self.checks.values())
+
+    async def run_check(self, check):
+        started = time.perf_counter()
+        error = False
+        try:
+            result = await asyncio.wait_for(check.run(), check.timeout)
+        except Exception as e:
+            error = True
+            self.context.log(f"Ошибка проверки {check.name}: {e or e.__class__.__name__}")
+            return None
+        finally:
+            perf.record(f"check:{check.name}", time.perf_counter() - started, error)
+        if result is None:
+            return None
+        previous = self.last.get(check.name)
+        self.last[check.name] = (time.time(), result)
+        if previous is not None and previous[1].status != result.status:
+            self.context.log(f"Проверка {check.name}: {previous[1].status} -> {result.status}")
+        for message in result.messages:
+            self.context.send(message)
+        return result
+
+    async def run_checks(self, checks):
+        return await asyncio.gather(*(self.run_check(check) for check in checks))
+
+    def run_due(self, names):
+        """Выполнить проверки с наступившим сроком (блокирует поток до завершения всех)"""
+        checks = [self.checks[name] for name in names if name in self.checks]
+        if checks:
+            self.loop.run_until_complete(self.run_checks(checks))
+
+
+def format_metric(value):
+    return f"{value:.1f}" if isinstance(value, float) else str(value)
+
+
+def render_results(runner):
+    """Последнее состояние и показатели проверок для /perf (HTML)"""
+    if runner is None:
+        return "🧩 <b>Проверки</b>: мониторинг еще не запущен"
+    lines = ["🧩 <b>Проверки</b>"]
+    now = time.time()
+    for name, check in sorted(runner.checks.items()):
+        last = runner.last.get(name)
+        title = f"<b>{html.escape(name)}</b> (каждые {check.interval} с)"
+        if last is None:
+            lines.append(f"⏳ {title}: еще не выполнялась")
+            continue
+        finished, result = last
+        metrics = ", ".join(f"{html.escape(str(key))}={format_metric(value)}"
+                            for key, value in list(result.metrics.items())[:MAX_SHOWN_METRICS])
+        lines.append(f"{STATUS_ICONS[result.status]} {title}: {int(now - finished)} с назад"
+                     + (f"\n    <code>{metrics}</code>" if metrics else ""))
+    if not runner.checks:
+        lines.append("Включенных проверок нет")
+    if runner.disabled:
+        lines.append("Найдены, но не включены: " + ", ".join(html.escape(name) for name in runner.disabled))
+    return "\n".join(lines)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Предупреждения о сроке и трафике клиентов 3X-UI и ежедневная сводка (см. clients.py)"""
+
+import asyncio
+import os
+from datetime import datetime
+
+import clients
+from checks import Check, CheckResult
+
+
+class ClientsCheck(Check):
+    """Индекс клиентов по базе x-ui (только чтение)"""
+    name = 'clients'
+
+    def __init__(self, context, settings=None):
+        super().__init__(context, settings)
+        self.scanner = None
+
+    def default_interval(self, config):
+        return config.get('client_scan_interval_seconds', 300)
+
+    async def setup(self):
+        """Построить индекс; текущие предупреждения не рассылаются, их покажет ежедневная сводка"""
+        config = self.context.config
+        db_path = config.get('xui_db_path', '/etc/x-ui/x-ui.db')
+        if not os.path.exists(db_path):
+            self.context.log(f"База 3X-UI {db_path} не найдена, проверка клиентов отключена")
+            return False
+        scanner = clients.ClientScanner(
+            db_path,
+            expiry_warn_days=config.get('client_expiry_warn_days', 3),
+            quota_warn_percent=config.get('client_quota_warn_percent', 90),
+        )
+        try:
+            await asyncio.to_thread(scanner.refresh)
+            scanner.check()
+        except Exception as e:
+            self.context.log(f"Ошибка чтения клиентов 3X-UI: {e}")
+            return False
+        self.scanner = scanner
+        self.context.log(f"Клиентов 3X-UI в индексе: {len(scanner.index)}")
+        return True
+
+    async def run(self):
+        scanner = self.scanner
+        messages = []
+        # Таблица перечитывается, только если база менялась; сроки проверяются в любом случае
+        await asyncio.to_thread(scanner.refresh)
+        warnings = scanner.check()
+        if warnings:
+            messages.append(await asyncio.to_thread(scanner.render_warnings, warnings))
+            self.context.log(f"Предупреждений о клиентах 3X-UI: {len(warnings)}")
+
+        digest_hour = self.context.config.get('client_digest_hour', 9)
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        if digest_hour is not None and now.hour >= digest_hour and self.state.get('last_digest') != today:
+            self.state['last_digest'] = today
+            messages.append(await asyncio.to_thread(scanner.render_digest))
+            self.context.log("Отправлена ежедневная сводка по клиентам 3X-UI")
+        return CheckResult('warn' if warnings else 'ok', messages,
+                           {'warnings': len(warnings), 'scans': scanner.scans})
+
+
+CHECK = ClientsCheck
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Оповещения о ресурсах по правилам alert_rules (CPU, ОЗУ, swap, диск, нагрузка, трафик)"""
+
+import json
+import os
+
+import alerts
+from checks import Check, CheckResult
+
+CONFIG_FILE = 'config.json'
+
+
+class ResourcesCheck(Check):
+    """Снять метрики и сравнить с правилами; правила перечитываются при изменении config.json"""
+    name = 'resources'
+
+    def __init__(self, context, settings=None):
+        super().__init__(context, settings)
+        self.engine = alerts.AlertEngine()
+        self.sampler = alerts.MetricSampler()
+        self.config_mtime = None
+
+    def default_interval(self, config):
+        return config['check_interval_seconds']
+
+    def reload_rules(self):
+        """Перечитать alert_rules, если config.json изменился (например, через /change_config)"""
+        try:
+            mtime = os.stat(CONFIG_FILE).st_mtime
+        except OSError:
+            return
+        if mtime == self.config_mtime:
+            return
+        self.config_mtime = mtime
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                current_config = json.load(f)
+        except Exception as e:
+            self.context.log(f"Ошибка чтения правил оповещений: {e}")
+            return
+        rules, errors = alerts.load_rules(current_config)
+        for error in errors:
+            self.context.log(f"Некорректное правило оповещения {error}")
+        self.engine.set_rules(rules)
+        self.context.log(f"Загружено правил оповещений: {len(rules)}")
+
+    async def run(self):
+        self.reload_rules()
+        if not self.engine.rules:
+            return CheckResult()
+        sample = self.sampler.sample()
+        messages = []
+        for rule, transition, value in self.engine.evaluate(sample):
+            messages.append(alerts.format_event(rule, transition, value))
+            self.context.log(f"Правило {rule.name}: {transition} ({rule.metric}={value:.1f})")
+        firing = any(rule.firing for rule in self.engine.rules)
+        return CheckResult('warn' if firing else 'ok', messages, sample)
+
+
+CHECK = ResourcesCheck
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Предупреждения об окончании срока и трафика клиентов 3X-UI.
+
+База x-ui открывается только на чтение. В памяти держится индекс из двух
+отсортированных массивов int64: ключ срока (время окончания, с) и ключ
+трафика (израсходовано, промилле от лимита), в младших 24 битах ключа - id
+строки client_traffics. Почта клиента в памяти не хранится и читается из
+базы только для строк, попавших в оповещение или сводку, поэтому десятки
+тысяч клиентов занимают единицы мегабайт.
+
+Обновление дешевое: PRAGMA data_version показывает, менял ли кто-то базу
+с прошлого опроса, и без изменений запрос к таблице не выполняется. В x-ui
+нет отметки времени изменения строки, поэтому при изменении таблица читается
+потоком по нужным столбцам, а индекс трогается только для клиентов, у которых
+поменялся ключ.
+"""
+
+import sqlite3
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+
+ID_BITS = 24
+ID_MASK = (1 << ID_BITS) - 1
+DAY_MS = 24 * 3600 * 1000
+
+# Ключи индекса считает сам SQLite (см. make_key); 0 - клиента нет в соответствующем массиве.
+# Отрицательный expiry_time в 3X-UI - срок, который начнет идти с первого подключения
+SCAN_QUERY = f"""
+SELECT id,
+       CASE WHEN enable AND expiry_time > 0 THEN ((expiry_time / 1000) << {ID_BITS}) | id ELSE 0 END,
+       CASE WHEN enable AND total > 0 THEN (min((up + down) * 1000 / total, {ID_MASK}) << {ID_BITS}) | id ELSE 0 END
+FROM client_traffics
+WHERE id BETWEEN 1 AND {ID_MASK}
+"""
+
+
+def make_key(value, row_id):
+    return (value << ID_BITS) | row_id
+
+
+def format_left(milliseconds):
+    hours = int(milliseconds // 3600000)
+    if hours >= 24:
+        return f"{hours // 24} д. {hours % 24} ч."
+    return f"{hours} ч. {int(milliseconds // 60000) % 60} мин."
+
+
+class ClientIndex:
+    """
+    Отсортированные ключи срока и трафика с точечным обновлением.
+    Текущий ключ клиента хранится в массиве по id: id в client_traffics идут подряд,
+    и 8 байт на клиента дешевле словаря.
+    """
+
+    def __init__(self):
+        self.expiry = array('q')     # make_key(expiry_time в секундах, id), только активные клиенты со сроком
+        self.quota = array('q')      # make_key(промилле трафика, id), только клиенты с лимитом
+        self.expiry_by_id = array('q')
+        self.quota_by_id = array('q')
+
+    def __len__(self):
+        return sum(1 for expiry_key, quota_key in zip(self.expiry_by_id, self.quota_by_id) if expiry_key or quota_key)
+
+    def reserve(self, row_id):
+        """Расширить массивы по id до row_id включительно"""
+        missing = row_id + 1 - len(self.expiry_by_id)
+        if missing > 0:
+            zeros = array('q', bytes(8 * missing))
+            self.expiry_by_id.extend(zeros)
+            self.quota_by_id.extend(zeros)
+
+    @staticmethod
+    def replace(sorted_keys, keys_by_id, row_id, key):
+        """Заменить ключ клиента в отсортированном массиве"""
+        old = keys_by_id[row_id]
+        if old:
+            del sorted_keys[bisect_left(sorted_keys, old)]
+        if key:
+            insort(sorted_keys, key)
+        keys_by_id[row_id] = key
+
+    def build(self, rows):
+        """Заполнить пустой индекс строками (id, ключ срока, ключ трафика) одной сортировкой"""
+        for row_id, expiry_key, quota_key in rows:
+            self.reserve(row_id)  # строки, добавленные после запроса max(id)
+            self.expiry_by_id[row_id] = expiry_key
+            self.quota_by_id[row_id] = quota_key
+        self.expiry = array('q', sorted(key for key in self.expiry_by_id if key))
+        self.quota = array('q', sorted(key for key in self.quota_by_id if key))
+
+    def remove(self, row_id):
+        self.replace(self.expiry, self.expiry_by_id, row_id, 0)
+        self.replace(self.quota, self.quota_by_id, row_id, 0)
+
+    def expiring(self, start_ms, end_ms):
+        """[(expiry_time в мс, id)] с окончанием в [start_ms, end_ms], по возрастанию срока"""
+        low = bisect_left(self.expiry, make_key(start_ms // 1000, 0))
+        high = bisect_right(self.expiry, make_key(end_ms // 1000, ID_MASK))
+        return [((key >> ID_BITS) * 1000, key & ID_MASK) for key in self.expiry[low:high]]
+
+    def over_quota(self, permille, limit=None):
+        """[(промилле, id)] с расходом не меньше permille, по убыванию"""
+        low = bisect_left(self.quota, make_key(permille, 0))
+        keys = self.quota[low:]
+        if limit is not None:
+            keys = keys[-limit:]
+        return [(key >> ID_BITS, key & ID_MASK) for key in reversed(keys)]
+
+
+class ClientScanner:
+    """Опрос базы x-ui и оповещения о сроке и трафике клиентов"""
+
+    def __init__(self, db_path, expiry_warn_days=3, quota_warn_percent=90):
+        self.db_path = db_path
+        self.expiry_warn_ms = int(expiry_warn_days * DAY_MS)
+        self.quota_warn_permille = int(quota_warn_percent * 10)
+        self.index = ClientIndex()
+        self.db = None
+        self.data_version = None
+        self.warned_expiry = set()
+        self.warned_quota = set()
+        self.scans = 0
+
+    def connect(self):
+        if self.db is None:
+            self.db = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        return self.db
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def refresh(self):
+        """Обновить индекс, если база менялась. Возвращает True, если таблица перечитывалась"""
+        db = self.connect()
+        version = db.execute('PRAGMA data_version').fetchone()[0]
+        if version == self.data_version:
+            return False
+        self.data_version = version
+        self.scans += 1
+
+        index = self.index
+        # Массивы по id расширяются один раз, а не построчно
+        max_id = db.execute('SELECT max(id) FROM client_traffics').fetchone()[0] or 0
+        index.reserve(min(max_id, ID_MASK))
+        rows = db.execute(SCAN_QUERY)
+        if not index.expiry and not index.quota:
+            index.build(rows)
+            return True
+
+        expiry_by_id, quota_by_id = index.expiry_by_id, index.quota_by_id
+        seen = bytearray(len(expiry_by_id))
+        for row_id, expiry_key, quota_key in rows:
+            if row_id >= len(seen):
+                index.reserve(row_id)
+                seen.extend(bytes(row_id + 1 - len(seen)))
+            seen[row_id] = 1
+            # Почти все строки не меняются: два сравнения и никаких вызовов
+            if expiry_by_id[row_id] != expiry_key:
+                index.replace(index.expiry, expiry_by_id, row_id, expiry_key)
+                # Продление срока снова включает предупреждение
+                self.warned_expiry.discard(row_id)
+            if quota_by_id[row_id] != quota_key:
+                index.replace(index.quota, quota_by_id, row_id, quota_key)
+                # Сброс трафика или новый лимит снова включают предупреждение
+                if quota_key >> ID_BITS < self.quota_warn_permille:
+                    self.warned_quota.discard(row_id)
+        # Удаленные из базы клиенты
+        for row_id in range(len(seen)):
+            if not seen[row_id] and (expiry_by_id[row_id] or quota_by_id[row_id]):
+                index.remove(row_id)
+                self.warned_expiry.discard(row_id)
+                self.warned_quota.discard(row_id)
+        return True
+
+    def emails(self, row_ids):
+        """Почта клиентов по id - только для строк, которые попадут в сообщение"""
+        if not row_ids:
+            return {}
+        placeholders = ','.join('?' * len(row_ids))
+        rows = self.connect().execute(
+            f'SELECT id, email FROM client_traffics WHERE id IN ({placeholders})', list(row_ids)
+        )
+        return dict(rows)
+
+    def check(self, now_ms=None):
+        """Новые предупреждения: [(тип, id, значение)], тип 'expiry' (мс до окончания) или 'quota' (промилле)"""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        warnings = []
+        for expiry_time, row_id in self.index.expiring(now_ms, now_ms + self.expiry_warn_ms):
+            if row_id not in self.warned_expiry:
+                self.warned_expiry.add(row_id)
+                warnings.append(('expiry', row_id, expiry_time - now_ms))
+        for permille, row_id in self.index.over_quota(self.quota_warn_permille):
+            if row_id not in self.warned_quota:
+                self.warned_quota.add(row_id)
+                warnings.append(('quota', row_id, permille))
+        return warnings
+
+    def render_warnings(self, warnings, limit=30):
+        """Одно сообщение с новыми предупреждениями, не больше limit строк (HTML)"""
+        shown = warnings[:limit]
+        emails = self.emails({row_id for _, row_id, _ in shown})
+        lines = []
+        for kind, row_id, value in shown:
+            email = emails.get(row_id, f"id {row_id}")
+            if kind == 'expiry':
+                lines.append(f"⏳ <code>{email}</code>: срок истекает через {format_left(value)}")
+            else:
+                lines.append(f"📶 <code>{email}</code>: израсходовано {value / 10:.0f}% трафика")
+        if len(warnings) > limit:
+            lines.append(f"... и еще {len(warnings) - limit}")
+        return "👥 <b>Клиенты 3X-UI</b>\n\n" + "\n".join(lines)
+
+    def render_digest(self, now_ms=None, days=7, limit=20):
+        """Ежедневная сводка: истекшие, истекающие за days дней и с наибольшим расходом трафика (HTML)"""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        expired = self.index.expiring(0, now_ms)
+        expiring = self.index.expiring(now_ms, now_ms + days * DAY_MS)
+        heavy = self.index.over_quota(800, limit)
+        emails = self.emails({row_id for _, row_id in expired[-limit:] + expiring[:limit] + heavy})
+
+        def name(row_id):
+            return f"<code>{emails.get(row_id, f'id {row_id}')}</code>"
+
+        sections = [f"📋 <b>Сводка по клиентам 3X-UI</b> (в индексе: {len(self.index)})"]
+        if expired:
+            sections.append(f"<b>Срок истек, клиент включен</b> ({len(expired)}):\n" +
+                            "\n".join(f"• {name(row_id)}" for _, row_id in expired[-limit:]))
+        if expiring:
+            sections.append(f"<b>Истекают в ближайшие {days} дн.</b> ({len(expiring)}):\n" +
+                            "\n".join(f"• {name(row_id)} - через {format_left(expiry - now_ms)}"
+                                      for expiry, row_id in expiring[:limit]))
+        if heavy:
+            sections.append("<b>Израсходовано 80% трафика и больше</b>:\n" +
+                            "\n".join(f"• {name(row_id)} - {permille / 10:.0f}%" for permille, row_id in heavy))
+        if len(sections) == 1:
+            sections.append("Истекающих сроков и исчерпанного трафика нет.")
+        return "\n\n".join(sections)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Текущие TCP соединения из /proc/net/tcp и /proc/net/tcp6 без запуска ss/netstat.
+
+Файлы читаются блоками в заранее выделенный буфер, строки разбираются
+по мере чтения, а в словари попадают сырые hex-поля: адреса переводятся
+в привычный вид только для итоговой сводки.
+"""
+
+import heapq
+import ipaddress
+
+PROC_FILES = ('/proc/net/tcp', '/proc/net/tcp6')
+
+# Состояния в /proc/net/tcp (include/net/tcp_states.h)
+TCP_ESTABLISHED = b'01'
+TCP_LISTEN = b'0A'
+
+# ::ffff:a.b.c.d в /proc/net/tcp6: за префиксом идет адрес в формате /proc/net/tcp
+IPV4_MAPPED_PREFIX = b'0000000000000000FFFF0000'
+
+READ_BUFFER_SIZE = 256 * 1024
+
+
+def iter_proc_lines(path, buffer):
+    """Строки файла пачками, с чтением через buffer (bytearray) без выделения памяти на каждый блок"""
+    view = memoryview(buffer)
+    tail = b''
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            lines = (tail + view[:size]).split(b'\n')
+            # Последняя строка блока может быть неполной - дочитаем ее со следующим блоком
+            tail = lines.pop()
+            yield lines
+    if tail:
+        yield [tail]
+
+
+def decode_address(hex_address):
+    """Адрес из /proc/net/tcp(6) (hex, порядок байт хоста) в строку IP"""
+    raw = bytes.fromhex(hex_address.decode('ascii'))
+    if len(raw) == 4:
+        return str(ipaddress.IPv4Address(raw[::-1]))
+    # IPv6 хранится как четыре 32-битных слова, каждое в порядке байт хоста
+    return str(ipaddress.IPv6Address(b''.join(raw[i:i + 4][::-1] for i in range(0, 16, 4))))
+
+
+class ConnectionStats:
+    """
+    Сводка входящих соединений: по локальным портам и по удаленным IP.
+    Входящими считаются соединения на порты, для которых есть слушающий сокет,
+    поэтому исходящие соединения (эфемерные локальные порты) в сводку не попадают.
+    """
+
+    def __init__(self):
+        self.sockets = 0
+        self.established = 0
+        self.listening = set()     # hex порты в состоянии LISTEN
+        self.port_remotes = {}     # hex порт -> {hex адрес: количество соединений}
+
+    def inbound(self):
+        return {port: remotes for port, remotes in self.port_remotes.items() if port in self.listening}
+
+    @property
+    def inbound_count(self):
+        return sum(sum(remotes.values()) for remotes in self.inbound().values())
+
+    def top_ports(self, limit=10):
+        """[(порт, соединений, уникальных IP)] по убыванию количества соединений"""
+        rows = [(int(port, 16), sum(remotes.values()), len(remotes)) for port, remotes in self.inbound().items()]
+        return heapq.nlargest(limit, rows, key=lambda row: row[1])
+
+    def top_remotes(self, limit=10):
+        """[(IP, соединений)] по убыванию; IPv4-mapped адреса из tcp6 сливаются с IPv4"""
+        merged = {}
+        for remotes in self.inbound().values():
+            for address, count in remotes.items():
+                if address.startswith(IPV4_MAPPED_PREFIX):
+                    address = address[len(IPV4_MAPPED_PREFIX):]
+                merged[address] = merged.get(address, 0) + count
+        # В строку переводятся только адреса, попавшие в вывод
+        top = heapq.nlargest(limit, merged.items(), key=lambda item: item[1])
+        return [(decode_address(address), count) for address, count in top]
+
+
+def scan_connections(paths=PROC_FILES, buffer=None):
+    """Разобрать таблицы сокетов и вернуть ConnectionStats"""
+    buffer = buffer or bytearray(READ_BUFFER_SIZE)
+    stats = ConnectionStats()
+    listening = stats.listening
+    port_remotes = stats.port_remotes
+    sockets = 0
+    established = 0
+
+    for path in paths:
+        try:
+            for lines in iter_proc_lines(path, buffer):
+                for line in lines:
+                    # "  12: 0100007F:0016 0A00020F:C35A 01 ..." - дальше состояния поля не нужны
+                    fields = line.split(None, 4)
+                    if len(fields) < 4 or fields[0] == b'sl':
+                        continue
+                    sockets += 1
+                    state = fields[3]
+                    if state == TCP_LISTEN:
+                        listening.add(fields[1][-4:])
+                        continue
+                    if state != TCP_ESTABLISHED:
+                        continue
+                    established += 1
+                    local_port = fields[1][-4:]
+                    remote = fields[2][:-5]
+                    remotes = port_remotes.get(local_port)
+                    if remotes is None:
+                        remotes = port_remotes[local_port] = {}
+                    remotes[remote] = remotes.get(remote, 0) + 1
+        except FileNotFoundError:
+            # Нет tcp6 при отключенном IPv6
+            continue
+
+    stats.sockets = sockets
+    stats.established = established
+    return stats
+
+
+def render_connections(stats, port_labels=None, limit=10):
+    """Текст отчета /connections (HTML)"""
+    port_labels = port_labels or {}
+    inbound = stats.inbound_count
+    if not inbound:
+        return f"🔌 <b>Соединения</b>\n\nВходящих TCP соединений нет (сокетов всего: {stats.sockets})."
+
+    port_lines = []
+    for port, count, unique in stats.top_ports(limit):
+        label = port_labels.get(port)
+        name = f"{port} ({label})" if label else str(port)
+        port_lines.append(f"{name:<18} {count:>7} {unique:>7}")
+
+    remote_lines = [f"{ip:<39} {count:>7}" for ip, count in stats.top_remotes(limit)]
+
+    return (
+        f"🔌 <b>Соединения</b>: входящих {inbound}, установленных всего {stats.established}, "
+        f"сокетов {stats.sockets}\n\n"
+        f"<b>Локальные порты</b>\n<pre>{'порт':<18} {'соедин.':>7} {'IP':>7}\n" + "\n".join(port_lines) + "</pre>\n"
+        f"<b>Удаленные IP</b>\n<pre>{'IP':<39} {'соедин.':>7}\n" + "\n".join(remote_lines) + "</pre>"
+    )
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Обновляемый статус: одно сообщение, которое бот правит на месте.
+
+/dashboard отправляет сообщение и в течение заданного времени раз в
+refresh секунд перерисовывает его. editMessageText вызывается, только если
+текст действительно изменился. На RetryAfter (429) задача ждет указанное
+Telegram время и удваивает свой интервал, после успешных правок интервал
+постепенно возвращается к исходному. В каждом чате не больше одного
+обновляемого сообщения: новый /dashboard останавливает предыдущий.
+"""
+
+import asyncio
+import time
+from datetime import timedelta
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+STOP_CALLBACK = 'dashboard_stop'
+MAX_INTERVAL = 120  # потолок интервала после RetryAfter, с
+
+
+def retry_seconds(retry_after):
+    """RetryAfter.retry_after - число секунд или timedelta (зависит от версии PTB)"""
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class LiveMessage:
+    """Обновляемое сообщение в одном чате"""
+    __slots__ = ('chat_id', 'message_id', 'text', 'until', 'interval', 'edits', 'skipped', 'task')
+
+    def __init__(self, chat_id, message_id, text, until, interval):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+        self.until = until          # по time.time()
+        self.interval = interval
+        self.edits = 0
+        self.skipped = 0
+        self.task = None
+
+
+class DashboardManager:
+    """Задачи обновления сообщений /dashboard в цикле событий бота"""
+
+    def __init__(self, render, interval=10, log=print):
+        self.render = render      # async функция без аргументов -> текст (HTML)
+        self.interval = interval
+        self.log = log
+        self.live = {}            # chat_id -> LiveMessage
+
+    def footer(self, live):
+        until = time.strftime('%H:%M', time.localtime(live.until))
+        return f"\n\n<i>🔄 Обновляется каждые {self.interval} с до {until}</i>"
+
+    @staticmethod
+    def stop_markup():
+        return InlineKeyboardMarkup([[InlineKeyboardButton("⏹ Остановить", callback_data=STOP_CALLBACK)]])
+
+    async def open(self, bot, chat_id, duration_seconds):
+        """Отправить новое обновляемое сообщение (предыдущее в чате останавливается)"""
+        await self.close(chat_id, bot)
+        text = await self.render()
+        live = LiveMessage(chat_id, None, text, time.time() + duration_seconds, self.interval)
+        message = await bot.send_message(chat_id, text + self.footer(live), parse_mode='HTML',
+                                         reply_markup=self.stop_markup())
+        live.message_id = message.message_id
+        live.task = asyncio.get_running_loop().create_task(self.run(bot, live), name=f"dashboard-{chat_id}")
+        self.live[chat_id] = live
+        return live
+
+    async def edit(self, bot, live, text, final=False):
+        if final:
+            footer = (f"\n\n<i>⏹ Обновление остановлено: правок {live.edits}, "
+                      f"без изменений пропущено {live.skipped}</i>")
+            markup = None
+        else:
+            footer, markup = self.footer(live), self.stop_markup()
+        await bot.edit_message_text(text + footer, chat_id=live.chat_id, message_id=live.message_id,
+                                    parse_mode='HTML', reply_markup=markup)
+
+    async def run(self, bot, live):
+        """Цикл обновления до истечения срока; при ошибке сообщения (удалено, бот заблокирован) - выход"""
+        while time.time() + live.interval <= live.until:
+            await asyncio.sleep(live.interval)
+            try:
+                text = await self.render()
+            except Exception as e:
+                self.log(f"Ошибка обновления /dashboard: {e}")
+                continue
+            if text == live.text:
+                # Ничего не изменилось - запрос к Telegram не нужен
+                live.skipped += 1
+                continue
+            try:
+                await self.edit(bot, live, text)
+            except RetryAfter as e:
+                delay = retry_seconds(e.retry_after)
+                live.interval = min(MAX_INTERVAL, live.interval * 2)
+                self.log(f"/dashboard в чате {live.chat_id}: RetryAfter {delay:.0f} с, интервал {live.interval} с")
+                await asyncio.sleep(delay)
+                continue
+            except BadRequest as e:
+                if 'not modified' in str(e).lower():
+                    live.text = text
+                    continue
+                self.log(f"/dashboard в чате {live.chat_id} остановлен: {e}")
+                self.forget(live)
+                return
+            except Forbidden:
+                self.forget(live)
+                return
+            live.text = text
+            live.edits += 1
+            live.interval = max(self.interval, live.interval // 2)
+        self.forget(live)
+        await self.finish(bot, live)
+
+    def forget(self, live):
+        if self.live.get(live.chat_id) is live:
+            del self.live[live.chat_id]
+
+    async def finish(self, bot, live):
+        """Последняя правка: итог без кнопки остановки"""
+        try:
+            await self.edit(bot, live, live.text, final=True)
+        except Exception as e:
+            self.log(f"Ошибка завершения /dashboard: {e}")
+
+    async def close(self, chat_id, bot=None):
+        """Остановить обновление в чате; с bot - еще и убрать кнопку. Возвращает True, если было что остановить"""
+        live = self.live.pop(chat_id, None)
+        if live is None:
+            return False
+        live.task.cancel()
+        try:
+            await live.task
+        except asyncio.CancelledError:
+            pass
+        if bot is not None:
+            await self.finish(bot, live)
+        return True
+
+    async def stop(self):
+        """Отменить все задачи (остановка бота)"""
+        for chat_id in list(self.live):
+            await self.close(chat_id)
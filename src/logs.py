@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Хвост и поиск по логам сервера для /logs.
+
+Файл читается с конца блоками фиксированного размера, поэтому последние
+строки многогигабайтного лога находятся за миллисекунды и файл целиком в
+память не загружается. При поиске блок, в котором нет совпадения, не
+разбивается на строки. Если в текущем файле строк не хватило, поиск
+продолжается по ротированным копиям (auth.log.1, auth.log.2.gz, ...) от
+новых к старым. Сжатые копии с конца читать нельзя: они читаются подряд, а
+в памяти держатся только последние N подходящих строк.
+
+Здесь же чтение новых строк с байтовой позиции для мониторов, которые
+следят за дописываемыми логами (auth.log, access.log Xray).
+"""
+
+import collections
+import gzip
+import html
+import os
+import re
+
+BLOCK_SIZE = 64 * 1024
+DEFAULT_LINES = 20
+MAX_LINES = 200
+MESSAGE_LIMIT = 4096  # максимальная длина сообщения Telegram
+
+# Суффиксы ротации logrotate: .1, .2.gz, -20250101, -20250101.gz
+ROTATED_SUFFIX = re.compile(r'^[.-](\d+)(\.gz)?$')
+
+
+def sources_from_config(config):
+    """Компоненты для /logs: имя -> путь к текущему файлу лога"""
+    sources = {
+        'bot': config['log_file'],
+        'auth': config.get('ssh_log_file', '/var/log/auth.log'),
+    }
+    if config.get('xray_access_log'):
+        sources['xray'] = config['xray_access_log']
+    sources.update(config.get('log_sources', {}))
+    return sources
+
+
+def rotated_files(path):
+    """Текущий файл и его ротированные копии от новых к старым"""
+    directory, base = os.path.split(path)
+    siblings = []
+    try:
+        names = os.listdir(directory or '.')
+    except OSError:
+        names = []
+    for name in names:
+        if name.startswith(base) and ROTATED_SUFFIX.match(name[len(base):]):
+            sibling = os.path.join(directory, name)
+            try:
+                siblings.append((os.path.getmtime(sibling), sibling))
+            except OSError:
+                continue
+    siblings.sort(reverse=True)
+    files = [path] if os.path.exists(path) else []
+    return files + [sibling for _, sibling in siblings]
+
+
+def compile_pattern(pattern):
+    """Регулярное выражение без учета регистра; некорректное ищется как обычный текст"""
+    if not pattern:
+        return None
+    try:
+        return re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+    except re.error:
+        return re.compile(re.escape(pattern), re.IGNORECASE)
+
+
+def reverse_blocks(f, block_size=BLOCK_SIZE):
+    """
+    Текст целых строк файла блоками от конца к началу.
+    Блок режется по первому переводу строки: неполная строка в начале блока
+    переходит в следующий (более ранний) блок, поэтому многобайтовые символы
+    UTF-8 не разрываются.
+    """
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    remainder = b''
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+        data = f.read(size) + remainder
+        if position == 0:
+            yield data.decode('utf-8', 'replace'), size
+            break
+        cut = data.find(b'\n')
+        if cut < 0:
+            remainder = data
+            continue
+        remainder = data[:cut]
+        yield data[cut + 1:].decode('utf-8', 'replace'), size
+
+
+def tail_plain(path, count, matcher=None, block_size=BLOCK_SIZE):
+    """Последние count подходящих строк обычного файла (новые первыми) и число прочитанных байт"""
+    found = []
+    scanned = 0
+    with open(path, 'rb') as f:
+        for text, size in reverse_blocks(f, block_size):
+            scanned += size
+            if matcher is not None and not matcher.search(text):
+                continue
+            for line in reversed(text.split('\n')):
+                if line and (matcher is None or matcher.search(line)):
+                    found.append(line)
+                    if len(found) >= count:
+                        return found, scanned
+    return found, scanned
+
+
+def tail_gzip(path, count, matcher=None):
+    """То же для сжатой копии: чтение подряд с окном из последних count строк"""
+    window = collections.deque(maxlen=count)
+    with gzip.open(path, 'rb') as f:
+        for raw in f:
+            line = raw.decode('utf-8', 'replace').rstrip('\n')
+            if line and (matcher is None or matcher.search(line)):
+                window.append(line)
+        scanned = f.fileobj.tell()
+    return list(reversed(window)), scanned
+
+
+def tail(path, count=DEFAULT_LINES, pattern=None, block_size=BLOCK_SIZE):
+    """
+    Последние count строк лога и его ротированных копий, подходящих под pattern.
+    Возвращает (строки от старых к новым, просмотрено файлов, прочитано байт).
+    """
+    matcher = compile_pattern(pattern)
+    lines = []
+    files = 0
+    scanned = 0
+    for file_path in rotated_files(path):
+        files += 1
+        if file_path.endswith('.gz'):
+            found, size = tail_gzip(file_path, count - len(lines), matcher)
+        else:
+            found, size = tail_plain(file_path, count - len(lines), matcher, block_size)
+        lines.extend(found)
+        scanned += size
+        if len(lines) >= count:
+            break
+    lines.reverse()
+    return lines, files, scanned
+
+
+def read_lines_from(f, position, final=False):
+    """
+    Прочитать строки открытого файла после байтовой позиции position.
+    Недописанная последняя строка остается до следующего чтения, кроме final=True
+    (ротированный файл дочитывается до конца). Возвращает (строки, новая позиция)
+    """
+    f.seek(position)
+    data = f.read()
+    end = len(data) if final else data.rfind(b'\n') + 1
+    lines = data[:end].decode('utf-8', errors='replace').splitlines()
+    return lines, position + end
+
+
+def read_new_lines(path, position):
+    """То же по пути к файлу"""
+    with open(path, 'rb') as f:
+        return read_lines_from(f, position)
+
+
+def format_size(size):
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def chunk_messages(header, lines, limit=MESSAGE_LIMIT):
+    """Заголовок и строки в блоках <pre>, каждое сообщение не длиннее limit символов"""
+    messages = []
+    current, size = [], 0
+    budget = limit - len(header) - len("\n<pre></pre>")
+    for line in lines:
+        line = html.escape(line)
+        if len(line) > limit - len("<pre></pre>") - 1:
+            # Обрезка по экранированной строке может задеть сущность &...; - убираем хвост до '&'
+            line = line[:limit - len("<pre></pre>") - 2]
+            amp = line.rfind('&')
+            if amp > line.rfind(';'):
+                line = line[:amp]
+            line += "…"
+        if current and size + len(line) + 1 > budget:
+            messages.append(current)
+            current, size = [], 0
+            budget = limit - len("<pre></pre>")
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        messages.append(current)
+    texts = [f"<pre>{chr(10).join(chunk)}</pre>" for chunk in messages]
+    if texts:
+        texts[0] = f"{header}\n{texts[0]}"
+        if len(texts[0]) > limit:
+            # Первая строка не поместилась вместе с заголовком
+            texts[0:1] = [header, texts[0][len(header) + 1:]]
+    return texts or [header]
+
+
+def render_logs(sources, component, count=DEFAULT_LINES, pattern=None):
+    """Сообщения ответа /logs (HTML)"""
+    path = sources[component]
+    lines, files, scanned = tail(path, count, pattern)
+    where = f" с «{html.escape(pattern)}»" if pattern else ""
+    if files == 0:
+        return [f"❌ Файл лога <code>{html.escape(path)}</code> не найден."]
+    if not lines:
+        return [f"📜 <b>{component}</b>: строк{where} не найдено "
+                f"(файлов: {files}, прочитано {format_size(scanned)})"]
+    header = (f"📜 <b>{component}</b>: последние {len(lines)} строк{where}\n"
+              f"<i>Файлов: {files}, прочитано {format_size(scanned)}</i>")
+    return chunk_messages(header, lines)
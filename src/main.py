@@ -98,6 +98,15 @@ def start_ssh_monitor():
     except Exception as e:
         log_message(f"Ошибка запуска SSH мониторинга: {e}")
 
+def start_xray_monitor():
+    """Запуск анализа access.log Xray"""
+    try:
+        log_message("Запуск мониторинга access.log Xray...")
+        import xray_monitor
+        xray_monitor.monitor_xray_access_log()
+    except Exception as e:
+        log_message(f"Ошибка запуска мониторинга access.log Xray: {e}")
+
 def main():
     """Главная функция запуска всех компонентов"""
     log_message("Запуск Telegram Bot для 3X-UI...")
@@ -122,6 +131,11 @@ def main():
     ssh_thread = threading.Thread(target=start_ssh_monitor, name="SSHThread", daemon=True)
     ssh_thread.start()
     threads.append(ssh_thread)
+
+    # Анализ access.log Xray (совместное использование аккаунтов)
+    xray_thread = threading.Thread(target=start_xray_monitor, name="XrayThread", daemon=True)
+    xray_thread.start()
+    threads.append(xray_thread)
     
     log_message("Все компоненты запущены")
     
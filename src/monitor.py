@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import json
-import subprocess
 import time
 import requests
 import threading
@@ -9,7 +8,12 @@ import psutil
 import os
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 from datetime import datetime
-from telegram import Bot
+
+import alerts
+import checks
+import outbox
+import probes
+import services
 
 # Загрузка конфигурации
 with open('config.json', 'r') as f:
@@ -22,6 +26,33 @@ previous_xui_status = None     # None = неизвестно
 # Путь к файлу состояния
 STATE_FILE = '/var/lib/telegram-bot/state.json'
 
+# Подавление дребезга: сервис, который падает и поднимается по кругу, дает одно оповещение и сводку
+FLAP_SETTINGS = dict(
+    window_seconds=config.get('flap_window_minutes', 10) * 60,
+    threshold=config.get('flap_threshold', 4),
+    stable_seconds=config.get('flap_stable_minutes', 5) * 60,
+)
+server_flaps = alerts.FlapDetector(**FLAP_SETTINGS)
+
+# Список слежения за systemd юнитами (watch_units), у каждого свой интервал.
+# Проверки раскладываются по колесу таймеров с шагом MONITOR_TICK_SECONDS
+WATCHED_UNITS = services.units_from_config(config, FLAP_SETTINGS)
+service_watcher = services.ServiceWatcher(WATCHED_UNITS)
+MONITOR_TICK_SECONDS = 1
+SYSTEM_CHECK = object()  # элемент колеса для проверки сервера и сохранения состояния
+
+# Задержка и потери до шлюза, DNS и внешних узлов (probe_targets): асинхронные пробы в своем потоке
+probe_monitor = probes.from_config(
+    config,
+    alert=lambda message: send_telegram_message(message),
+    log=lambda message: log_message(message),
+)
+
+# Подключаемые проверки (config['checks'], см. checks/): загружаются при запуске мониторинга,
+# в колесе стоят как ('check', имя)
+check_runner = None
+check_state = {}  # состояние проверок, сохраняется в state.json
+
 def log_message(message):
     """Функция для логирования сообщений"""
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -74,37 +105,59 @@ def get_system_uptime():
         return 0
 
 def send_telegram_message(message):
-    """Отправка сообщения в Telegram владельцу"""
+    """Постановка сообщения владельцу в очередь отправки (outbox.py)"""
     try:
-        bot = Bot(token=config['telegram_token'])
-        bot.send_message(chat_id=config['owner_chat_id'], text=message, parse_mode='HTML')
+        outbox.shared(config, log_message).enqueue(config['owner_chat_id'], message)
         return True
     except Exception as e:
-        log_message(f"Ошибка отправки Telegram сообщения: {e}")
+        log_message(f"Ошибка постановки сообщения в очередь: {e}")
         return False
 
 def check_server_status():
-    """Проверка доступности сервера"""
-    try:
-        # Простая проверка - сервер онлайн если мы можем получить uptime
-        with open('/proc/uptime', 'r') as f:
-            uptime = f.read()
-        return True
-    except:
-        return False
+    """Доступность сервера по пробам сети: False, только если не отвечает ни одна цель"""
+    return probe_monitor.network_online()
 
-def check_xui_status():
-    """Проверка статуса x-ui сервиса"""
+def check_services(names):
+    """Опросить юниты одним вызовом systemctl show и разослать оповещения"""
+    global previous_xui_status
     try:
-        result = subprocess.run(['systemctl', 'is-active', 'x-ui'], 
-                              capture_output=True, text=True, timeout=10)
-        return result.stdout.strip() == 'active'
-    except:
-        return False
+        events = service_watcher.check(names)
+    except Exception as e:
+        log_message(f"Ошибка опроса systemd юнитов: {e}")
+        return
+    for event in events:
+        unit = event[1]
+        log_message(f"Юнит {unit.unit}: {event[0]} {event[2] if len(event) > 2 else ''} ({unit.state})")
+        send_telegram_message(services.format_event(event))
+    xui = service_watcher.units.get('x-ui')
+    if xui is not None and xui.active is not None:
+        previous_xui_status = xui.active
+
+def report_state(detector, state, title, up_message, down_message, up_text="доступен", down_text="недоступен"):
+    """Сообщить о смене состояния проверки с учетом дребезга"""
+    event = detector.update(state)
+    if event is None:
+        return
+    if event[0] == 'change':
+        message = up_message if state else down_message
+        log_message(f"{title}: {up_text if state else down_text}")
+    elif event[0] == 'flapping':
+        minutes = detector.window_seconds // 60
+        message = (f"⚠️ <b>{title}: нестабильное состояние</b>\n"
+                   f"{event[1]} переключений за {minutes} мин. Отдельные уведомления приостановлены до стабилизации.")
+        log_message(f"{title}: дребезг, {event[1]} переключений за {minutes} мин.")
+    else:
+        _, stable_state, suppressed, duration = event
+        state_text = up_text if stable_state else down_text
+        icon = "✅" if stable_state else "❌"
+        message = (f"{icon} <b>{title}: состояние стабилизировалось</b> ({state_text})\n"
+                   f"Дребезг длился {int(duration // 60)} мин., подавлено переключений: {suppressed}.")
+        log_message(f"{title}: стабилизировался ({state_text}), подавлено переключений: {suppressed}")
+    send_telegram_message(message)
 
 def check_initial_status():
     """Проверка начального состояния при запуске"""
-    global previous_server_status, previous_xui_status
+    global previous_server_status
     
     log_message("Проверка начального состояния системы...")
     
@@ -124,81 +177,122 @@ def check_initial_status():
         send_telegram_message(message)
         log_message("Обнаружена перезагрузка по uptime")
     
+    # Пробы сети: первые результаты придут через несколько секунд, до этого статус считается онлайн
+    probe_monitor.start()
+    
     # Проверяем сервер
     current_server_status = check_server_status()
     previous_server_status = current_server_status
+    server_flaps.update(current_server_status)
     
-    # Проверяем x-ui
-    current_xui_status = check_xui_status()
-    previous_xui_status = current_xui_status
+    # Проверяем все юниты из списка слежения одним вызовом
+    check_services(list(service_watcher.units))
+    
+    # Подключаемые проверки: импортируются только включенные
+    start_checks(state)
     
     # Отправляем начальный статус
     server_status_text = "🟢 Онлайн" if current_server_status else "🔴 Офлайн"
-    xui_status_text = "🟢 Активен" if current_xui_status else "🔴 Остановлен"
+    unit_lines = []
+    for unit in WATCHED_UNITS:
+        if unit.missing:
+            unit_status_text = "❓ Не найден"
+        elif unit.active is None:
+            unit_status_text = "❔ Неизвестно"
+        elif unit.active:
+            unit_status_text = "🟢 Активен"
+        else:
+            unit_status_text = f"🔴 Остановлен ({unit.state})"
+        unit_lines.append(f"🎛️ {unit.title}: {unit_status_text}")
+    units_text = "\n".join(unit_lines)
     
     message = f"""🔄 <b>Мониторинг запущен</b>
 
 <b>Текущий статус:</b>
 🖥️ Сервер: {server_status_text}
-🎛️ 3X-UI: {xui_status_text}"""
+{units_text}"""
     
     send_telegram_message(message)
-    log_message(f"Начальный статус: Сервер={server_status_text}, X-UI={xui_status_text}")
+    log_message(f"Начальный статус: Сервер={server_status_text}, " +
+                ", ".join(f"{unit.unit}={unit.state}" for unit in WATCHED_UNITS))
 
-def monitor_system():
-    """Основной цикл мониторинга системы"""
-    global previous_server_status, previous_xui_status
+def start_checks(state):
+    """Загрузить и подготовить включенные проверки"""
+    global check_runner, check_state
+    check_state = state.get("checks", {})
+    # Дата сводки по клиентам раньше хранилась отдельным ключом
+    if state.get("last_client_digest"):
+        check_state.setdefault("clients", {}).setdefault("last_digest", state["last_client_digest"])
+    context = checks.CheckContext(config, send_telegram_message, log_message, check_state)
+    check_runner = checks.CheckRunner(checks.load_enabled(context), context)
+    ready = check_runner.setup()
+    log_message("Проверки: " + (", ".join(f"{check.name} ({check.interval} с)" for check in ready) or "нет"))
+    if check_runner.disabled:
+        log_message("Проверки найдены, но не включены в checks: " + ", ".join(check_runner.disabled))
+
+def check_system():
+    """Проверка сервера и сохранение состояния"""
+    global previous_server_status
     
+    # Проверяем статус сервера
+    current_server_status = check_server_status()
+    report_state(
+        server_flaps, current_server_status, "Сервер",
+        "✅ <b>Сервер восстановлен</b>\nСервер снова доступен!",
+        "❌ <b>Сервер недоступен</b>\nПотеряна связь с сетью: не отвечает ни одна цель проверки!",
+    )
+    previous_server_status = current_server_status
+    
+    # Сохраняем текущее состояние с uptime
+    state = {
+        "last_status": {
+            "server": current_server_status,
+            "xui": previous_xui_status if previous_xui_status is not None else True
+        },
+        "last_check": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "last_uptime": get_system_uptime(),
+        "checks": check_state
+    }
+    save_state(state)
+
+def monitor_system():
+    """Основной цикл мониторинга: колесо таймеров с шагом MONITOR_TICK_SECONDS"""
     log_message("Системный мониторинг запущен")
     
     # Проверяем начальное состояние
     check_initial_status()
     
+    wheel = services.TimerWheel(tick_seconds=MONITOR_TICK_SECONDS)
+    wheel.schedule(SYSTEM_CHECK, config['check_interval_seconds'])
+    for unit in WATCHED_UNITS:
+        wheel.schedule(unit.unit, unit.interval)
+    job_intervals = {SYSTEM_CHECK: config['check_interval_seconds']}
+    for check in check_runner.checks.values():
+        wheel.schedule(('check', check.name), check.interval)
+        job_intervals[('check', check.name)] = check.interval
+    next_tick = time.monotonic()
+    
     while True:
+        due = wheel.advance()
+        # Повторная постановка до проверок: ошибка проверки не должна выбить ее из колеса
+        for item in due:
+            interval = job_intervals[item] if item in job_intervals else service_watcher.units[item].interval
+            wheel.schedule(item, interval)
         try:
-            # Проверяем статус сервера
-            current_server_status = check_server_status()
-            if previous_server_status is not None and current_server_status != previous_server_status:
-                if current_server_status:
-                    message = "✅ <b>Сервер восстановлен</b>\nСервер снова доступен!"
-                    send_telegram_message(message)
-                    log_message("Сервер восстановлен")
-                else:
-                    message = "❌ <b>Сервер недоступен</b>\nПотеряна связь с сервером!"
-                    send_telegram_message(message)
-                    log_message("Сервер недоступен")
-            previous_server_status = current_server_status
-            
-            # Проверяем статус x-ui
-            current_xui_status = check_xui_status()
-            if previous_xui_status is not None and current_xui_status != previous_xui_status:
-                if current_xui_status:
-                    message = "✅ <b>3X-UI восстановлен</b>\nСервис 3X-UI снова активен!"
-                    send_telegram_message(message)
-                    log_message("3X-UI восстановлен")
-                else:
-                    message = "❌ <b>3X-UI упал</b>\nСервис 3X-UI остановлен!"
-                    send_telegram_message(message)
-                    log_message("3X-UI упал")
-            previous_xui_status = current_xui_status
-            
-            # Сохраняем текущее состояние с uptime
-            state = {
-                "last_status": {
-                    "server": current_server_status,
-                    "xui": current_xui_status
-                },
-                "last_check": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                "last_uptime": get_system_uptime()
-            }
-            save_state(state)
-            
-            # Ждем до следующей проверки
-            time.sleep(config['check_interval_seconds'])
-            
+            # Все юниты, чей срок пришелся на этот тик, - одним вызовом systemctl
+            names = [item for item in due if item in service_watcher.units]
+            if names:
+                check_services(names)
+            if SYSTEM_CHECK in due:
+                check_system()
+            # Проверки, чей срок пришелся на этот тик, выполняются параллельно
+            check_runner.run_due([item[1] for item in due if isinstance(item, tuple)])
         except Exception as e:
             log_message(f"Ошибка системного мониторинга: {e}")
-            time.sleep(30)
+        
+        # Ждем следующего тика без накопления сдвига
+        next_tick += MONITOR_TICK_SECONDS
+        time.sleep(max(0, next_tick - time.monotonic()))
 
 if __name__ == '__main__':
     monitor_system()
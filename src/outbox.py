@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Надежная очередь исходящих уведомлений.
+
+Сообщение сначала записывается в SQLite (outbox_file), и только потом его
+отправляет отдельный поток через HTTP API Telegram. Пока Telegram недоступен,
+отправка повторяется с экспоненциальной задержкой и случайным разбросом;
+записи переживают перезапуск бота. Если за время сбоя накопилось больше
+outbox_merge_threshold сообщений, они уходят несколькими сводными сообщениями,
+а не по одному.
+"""
+
+import html
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+DEFAULT_OUTBOX_FILE = '/var/lib/telegram-bot/outbox.db'
+DEFAULT_API_URL = 'https://api.telegram.org'
+
+MESSAGE_LIMIT = 4096       # предел длины сообщения Telegram
+BATCH_LIMIT = 200          # сколько записей очереди разбирается за один проход
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+REQUEST_TIMEOUT = 15
+
+# Теги разметки, которые используют уведомления бота, - для отправки без parse_mode
+HTML_TAG = re.compile(r'</?(?:b|i|u|s|code|pre|a)(?:\s[^>]*)?>')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL
+)
+"""
+
+
+class PermanentError(Exception):
+    """Telegram отклонил сообщение (400): повторная отправка не поможет"""
+
+
+def backoff_delay(failures, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Экспоненциальная задержка с разбросом ±50%, чтобы повторы не шли в такт"""
+    delay = min(cap, base * 2 ** max(0, failures - 1))
+    return delay * random.uniform(0.5, 1.5)
+
+
+def merge_messages(rows, limit=MESSAGE_LIMIT):
+    """
+    Сложить записи очереди [(id, text, created)] в сводные сообщения не длиннее limit.
+    Возвращает [(ids, текст)]; каждая запись помечается временем постановки в очередь.
+    """
+    chunks = []
+    ids, parts, size = [], [], 0
+    for row_id, text, created in rows:
+        part = f"<i>{datetime.fromtimestamp(created).strftime('%d.%m %H:%M:%S')}</i>\n{text}"
+        if parts and size + len(part) + 2 > limit - 100:  # запас под заголовок
+            chunks.append((ids, parts))
+            ids, parts, size = [], [], 0
+        ids.append(row_id)
+        parts.append(part)
+        size += len(part) + 2
+    if parts:
+        chunks.append((ids, parts))
+
+    merged = []
+    for ids, parts in chunks:
+        header = f"📬 <b>Накопленные уведомления</b> ({len(parts)})"
+        merged.append((ids, header + "\n\n" + "\n\n".join(parts)))
+    return merged
+
+
+class Outbox:
+    """Очередь в SQLite и поток, который ее отправляет"""
+
+    def __init__(self, token, path=DEFAULT_OUTBOX_FILE, merge_threshold=5, log=print, session=None,
+                 api_url=DEFAULT_API_URL):
+        self.url = f"{api_url.rstrip('/')}/bot{token}/sendMessage"
+        self.path = path
+        self.merge_threshold = merge_threshold
+        self.log = log
+        self.session = session or requests.Session()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.failures = 0
+        self.sent = 0
+        self.thread = None
+
+        # Без каталога connect падает, и оповещение потерялось бы еще до записи в очередь
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def enqueue(self, chat_id, text):
+        """Записать сообщение на диск и разбудить поток отправки"""
+        with self.lock:
+            self.db.execute('INSERT INTO outbox (chat_id, text, created) VALUES (?, ?, ?)',
+                            (chat_id, text, time.time()))
+            self.db.commit()
+        self.wakeup.set()
+
+    def pending(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def _next_batch(self):
+        """Записи первого по очереди чата (в порядке постановки)"""
+        with self.lock:
+            row = self.db.execute('SELECT chat_id FROM outbox ORDER BY id LIMIT 1').fetchone()
+            if row is None:
+                return None, []
+            rows = self.db.execute(
+                'SELECT id, text, created FROM outbox WHERE chat_id = ? ORDER BY id LIMIT ?',
+                (row[0], BATCH_LIMIT)
+            ).fetchall()
+        return row[0], rows
+
+    def _delete(self, ids):
+        with self.lock:
+            self.db.executemany('DELETE FROM outbox WHERE id = ?', [(row_id,) for row_id in ids])
+            self.db.commit()
+
+    def _post(self, chat_id, text):
+        """Один вызов sendMessage. Возвращает None при успехе или задержку до повтора"""
+        payload = {'chat_id': chat_id, 'text': text, 'parse_mode': 'HTML', 'disable_web_page_preview': True}
+        response = self.session.post(self.url, json=payload, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            return None
+        try:
+            description = response.json()
+        except ValueError:
+            description = {}
+        if response.status_code == 429:
+            # Telegram сам говорит, сколько ждать
+            return float(description.get('parameters', {}).get('retry_after', BACKOFF_BASE))
+        if response.status_code == 400:
+            raise PermanentError(description.get('description', response.text[:200]))
+        raise requests.RequestException(f"HTTP {response.status_code}: {description.get('description', '')}")
+
+    def _send(self, chat_id, text):
+        """Отправка с откатом на обычный текст, если Telegram не принял HTML-разметку"""
+        try:
+            return self._post(chat_id, text)
+        except PermanentError as e:
+            self.log(f"Telegram отклонил сообщение ({e}), отправляю без разметки")
+            plain = html.unescape(HTML_TAG.sub('', text))
+            payload = {'chat_id': chat_id, 'text': plain[:MESSAGE_LIMIT]}
+            response = self.session.post(self.url, json=payload, timeout=REQUEST_TIMEOUT)
+            if response.status_code != 200:
+                raise PermanentError(response.text[:200])
+            return None
+
+    def flush_once(self):
+        """
+        Отправить то, что накопилось для одного чата. Возвращает None, если все отправлено
+        или очередь пуста, иначе задержку до следующей попытки.
+        """
+        chat_id, rows = self._next_batch()
+        if not rows:
+            return None
+        if len(rows) > self.merge_threshold:
+            messages = merge_messages(rows)
+        else:
+            messages = [([row_id], text) for row_id, text, _ in rows]
+
+        for ids, text in messages:
+            try:
+                retry_after = self._send(chat_id, text)
+            except PermanentError as e:
+                # Повтор не поможет: запись удаляется, чтобы не блокировать очередь
+                self.log(f"Сообщение не принято Telegram и удалено из очереди: {e}")
+                self._delete(ids)
+                continue
+            except requests.RequestException as e:
+                self.failures += 1
+                delay = backoff_delay(self.failures)
+                self.log(f"Ошибка отправки Telegram сообщения (попытка {self.failures}, повтор через {delay:.0f} с): {e}")
+                return delay
+            if retry_after is not None:
+                self.log(f"Telegram ограничил частоту отправки, повтор через {retry_after:.0f} с")
+                return retry_after
+            self._delete(ids)
+            self.sent += len(ids)
+            if self.failures:
+                self.log(f"Связь с Telegram восстановлена после {self.failures} неудачных попыток")
+                self.failures = 0
+        return 0
+
+    def run(self):
+        """Цикл потока отправки"""
+        while True:
+            self.wakeup.clear()
+            try:
+                delay = self.flush_once()
+            except Exception as e:
+                self.log(f"Ошибка очереди уведомлений: {e}")
+                delay = backoff_delay(self.failures + 1)
+            if delay is None:
+                # Очередь пуста - ждем новых сообщений
+                self.wakeup.wait()
+            elif delay:
+                time.sleep(delay)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="OutboxThread", daemon=True)
+            self.thread.start()
+        return self
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared(config, log=print):
+    """Общая очередь процесса: создается при первом обращении любого модуля и сразу запускает отправку"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Outbox(
+                config['telegram_token'],
+                path=config.get('outbox_file', DEFAULT_OUTBOX_FILE),
+                merge_threshold=config.get('outbox_merge_threshold', 5),
+                log=lambda message: log(f"Очередь уведомлений: {message}"),
+                api_url=config.get('telegram_api_url') or DEFAULT_API_URL,
+            ).start()
+        return _shared
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Легковесный замер задержек обработчиков и внешних вызовов"""
+
+import functools
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from telegram.request import HTTPXRequest
+
+from sketches import QuantileSketch
+
+# Время запуска процесса (для отчета /perf)
+START_TIME = time.time()
+
+_lock = threading.Lock()
+_sketches = {}  # имя метрики -> QuantileSketch
+_errors = {}    # имя метрики -> количество ошибок
+
+
+def record(name, seconds, error=False):
+    """Записать одно измерение длительности в секундах"""
+    with _lock:
+        sketch = _sketches.get(name)
+        if sketch is None:
+            sketch = _sketches[name] = QuantileSketch()
+        sketch.add(seconds)
+        if error:
+            _errors[name] = _errors.get(name, 0) + 1
+
+
+@contextmanager
+def timed(name):
+    """Контекстный менеджер для замера произвольного блока кода"""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record(name, time.perf_counter() - start, error)
+
+
+def timed_handler(name, callback):
+    """Обернуть асинхронный обработчик Telegram замером длительности"""
+    metric = f"handler:{name}"
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        error = False
+        try:
+            return await callback(update, context)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            record(metric, time.perf_counter() - start, error)
+
+    return wrapper
+
+
+def timed_run(args, **kwargs):
+    """subprocess.run с замером; метрика называется по первым двум аргументам команды"""
+    if isinstance(args, str):
+        metric = "exec:" + " ".join(args.split()[:2])
+    else:
+        metric = "exec:" + " ".join(str(arg) for arg in args[:2])
+    with timed(metric):
+        return subprocess.run(args, **kwargs)
+
+
+class TimedRequest(HTTPXRequest):
+    """HTTP-транспорт python-telegram-bot с замером каждого вызова Bot API"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        with timed("api:" + url.rsplit('/', 1)[-1]):
+            return await super().do_request(url, method, *args, **kwargs)
+
+
+def snapshot():
+    """Срез всех метрик: список (имя, count, errors, p50, p95, p99, max), в секундах"""
+    with _lock:
+        rows = []
+        for name in sorted(_sketches):
+            sketch = _sketches[name]
+            rows.append((
+                name,
+                sketch.count,
+                _errors.get(name, 0),
+                sketch.quantile(0.5),
+                sketch.quantile(0.95),
+                sketch.quantile(0.99),
+                sketch.max,
+            ))
+        return rows
+
+
+def _format_ms(seconds):
+    ms = seconds * 1000
+    if ms >= 100:
+        return f"{ms:.0f}"
+    return f"{ms:.1f}"
+
+
+def render_report():
+    """Текст отчета для команды /perf (HTML)"""
+    rows = snapshot()
+    uptime_minutes = int((time.time() - START_TIME) // 60)
+    if not rows:
+        return f"📏 <b>Производительность</b> (с запуска {uptime_minutes} мин.)\n\nИзмерений пока нет."
+
+    width = max(len(row[0]) for row in rows)
+    lines = [f"{'метрика':<{width}} {'n':>6} {'err':>4} {'p50':>7} {'p95':>7} {'p99':>7}"]
+    for name, count, errors, p50, p95, p99, _ in rows:
+        lines.append(
+            f"{name:<{width}} {count:>6} {errors:>4} "
+            f"{_format_ms(p50):>7} {_format_ms(p95):>7} {_format_ms(p99):>7}"
+        )
+
+    table = "\n".join(lines)
+    return (
+        f"📏 <b>Производительность</b> (с запуска {uptime_minutes} мин., время в мс)\n\n"
+        f"<pre>{table}</pre>"
+    )
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Известные сети для SSH входов: доверенные CIDR префиксы в radix дереве.
+
+Префиксы IPv4 и IPv6 лежат в двух деревьях со сжатыми путями (Patricia):
+узел хранит сеть целым числом и длину префикса, цепочки узлов с одним
+потомком не создаются. Поиск самого длинного совпадающего префикса проходит
+не больше 32 (128) бит адреса и не делает сетевых запросов, поэтому
+выполняется прямо в цикле разбора событий sshd.
+
+Дерево строится из истории входов: при первом запуске доверенными становятся
+сети всех успешных входов из auth.log и его ротированных копий, дальше сеть
+(/24 для IPv4, /48 для IPv6) добавляется после learn_after входов из нее.
+Владелец правит список командой /trusted. Список сохраняется в JSON.
+"""
+
+import html
+import ipaddress
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+KNOWN_NETWORKS_FILE = '/var/lib/telegram-bot/known_networks.json'
+MAX_CANDIDATES = 1000  # сколько еще не доверенных сетей помнить для обучения
+
+
+class Node:
+    """Узел дерева: сеть (число, биты после length нулевые), длина префикса, данные"""
+    __slots__ = ('key', 'length', 'value', 'children')
+
+    def __init__(self, key, length, value=None):
+        self.key = key
+        self.length = length
+        self.value = value
+        self.children = [None, None]
+
+
+class PrefixTrie:
+    """Radix дерево префиксов одной ширины адреса (32 или 128 бит)"""
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.root = Node(0, 0)
+        self.size = 0
+
+    def bit(self, key, position):
+        return (key >> (self.bits - 1 - position)) & 1
+
+    def common_length(self, a, b, limit):
+        diff = a ^ b
+        return min(limit, self.bits - diff.bit_length() if diff else self.bits)
+
+    def insert(self, key, length, value):
+        """Добавить или заменить префикс key/length"""
+        node = self.root
+        while True:
+            if node.length == length:
+                if node.value is None:
+                    self.size += 1
+                node.value = value
+                return
+            index = self.bit(key, node.length)
+            child = node.children[index]
+            if child is None:
+                node.children[index] = Node(key, length, value)
+                self.size += 1
+                return
+            common = self.common_length(child.key, key, min(child.length, length))
+            if common == child.length:
+                node = child
+                continue
+            # Расхождение внутри пути к потомку: вставляем промежуточный узел
+            mask = self.mask(common)
+            middle = Node(key & mask, common)
+            middle.children[self.bit(child.key, common)] = child
+            node.children[index] = middle
+            if common == length:
+                middle.value = value
+            else:
+                middle.children[self.bit(key, common)] = Node(key, length, value)
+            self.size += 1
+            return
+
+    def mask(self, length):
+        return ((1 << length) - 1) << (self.bits - length) if length else 0
+
+    def lookup(self, key):
+        """Самый длинный префикс, содержащий адрес key: (сеть, длина, данные) или None"""
+        node = self.root
+        best = None
+        while node is not None:
+            if node.length and (key ^ node.key) >> (self.bits - node.length):
+                break
+            if node.value is not None:
+                best = node
+            if node.length == self.bits:
+                break
+            node = node.children[self.bit(key, node.length)]
+        return (best.key, best.length, best.value) if best is not None else None
+
+    def remove(self, key, length):
+        """Удалить префикс; возвращает его данные или None, если префикса нет"""
+        path = []
+        node = self.root
+        while node is not None and node.length < length:
+            index = self.bit(key, node.length)
+            path.append((node, index))
+            node = node.children[index]
+        if node is None or node.length != length or node.key != key or node.value is None:
+            return None
+        value, node.value = node.value, None
+        self.size -= 1
+        # Узлы без данных с одним потомком или без потомков больше не нужны: потомок поднимается к родителю
+        while path and node.value is None:
+            children = [child for child in node.children if child is not None]
+            if len(children) > 1:
+                break
+            parent, index = path.pop()
+            parent.children[index] = children[0] if children else None
+            node = parent
+        return value
+
+    def items(self):
+        """Все префиксы: (сеть, длина, данные) в порядке адресов"""
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.value is not None:
+                yield node.key, node.length, node.value
+            stack.extend(child for child in reversed(node.children) if child is not None)
+
+
+class KnownNetworks:
+    """Доверенные сети SSH входов (IPv4 и IPv6), обучение по входам и сохранение в файл"""
+
+    def __init__(self, path=KNOWN_NETWORKS_FILE, learn_after=3, learn_prefix_v4=24, learn_prefix_v6=48, log=print):
+        self.path = path
+        self.learn_after = learn_after
+        self.learn_prefix = {4: learn_prefix_v4, 6: learn_prefix_v6}
+        self.log = log
+        self.tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        self.candidates = OrderedDict()  # сеть -> число входов, пока она не стала доверенной
+        self.lock = threading.Lock()  # поток SSH мониторинга и обработчики бота
+        self.loaded = False
+
+    def match(self, ip):
+        """Доверенный префикс для адреса (ip_network) или None; некорректный адрес - None"""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        with self.lock:
+            found = self.tries[address.version].lookup(int(address))
+        if found is None:
+            return None
+        return ipaddress.ip_network((found[0], found[1]))
+
+    def add(self, network, source='manual'):
+        """Добавить доверенную сеть (строка CIDR или адрес); возвращает ip_network"""
+        network = ipaddress.ip_network(network, strict=False)
+        with self.lock:
+            self._insert(network, {'source': source, 'added': int(time.time()), 'logins': 0, 'last': None})
+            self.candidates.pop(str(network), None)
+            self.save()
+        return network
+
+    def remove(self, network):
+        """Убрать доверенную сеть; True, если она была в списке"""
+        network = ipaddress.ip_network(network, strict=False)
+        with self.lock:
+            removed = self.tries[network.version].remove(int(network.network_address), network.prefixlen)
+            if removed is not None:
+                self.save()
+        return removed is not None
+
+    def _insert(self, network, value):
+        self.tries[network.version].insert(int(network.network_address), network.prefixlen, value)
+
+    def observe(self, ip, timestamp=None):
+        """
+        Учесть успешный вход с адреса ip. Возвращает (сеть, состояние):
+        'trusted' - доверенный префикс, 'learned' - сеть стала доверенной этим входом,
+        'unknown' - неизвестная сеть (в ответе префикс, которым ее можно добавить)
+        """
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None, 'unknown'
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        last = timestamp or time.strftime('%Y-%m-%d %H:%M:%S')
+        network = ipaddress.ip_network((int(address), self.learn_prefix[address.version]), strict=False)
+        with self.lock:
+            found = self.tries[address.version].lookup(int(address))
+            if found is not None:
+                found[2]['logins'] = found[2].get('logins', 0) + 1
+                found[2]['last'] = last
+                self.save()
+                return ipaddress.ip_network((found[0], found[1])), 'trusted'
+            if not self.learn_after:
+                return network, 'unknown'
+            key = str(network)
+            count = self.candidates.pop(key, 0) + 1
+            if count < self.learn_after:
+                self.candidates[key] = count
+                while len(self.candidates) > MAX_CANDIDATES:
+                    self.candidates.popitem(last=False)
+                self.save()
+                return network, 'unknown'
+            self._insert(network, {'source': 'learned', 'added': int(time.time()), 'logins': count, 'last': last})
+            self.save()
+        self.log(f"Сеть {network} стала доверенной после {count} входов")
+        return network, 'learned'
+
+    def bootstrap(self, events):
+        """Первое заполнение по истории входов: доверенными становятся сети всех успешных входов"""
+        learned = {}
+        for event in events:
+            try:
+                address = ipaddress.ip_address(event['ip'])
+            except ValueError:
+                continue
+            network = ipaddress.ip_network((int(address), self.learn_prefix[address.version]), strict=False)
+            entry = learned.setdefault(network, {'source': 'history', 'added': int(time.time()),
+                                                 'logins': 0, 'last': None})
+            entry['logins'] += 1
+            entry['last'] = event.get('timestamp')
+        with self.lock:
+            for network, value in learned.items():
+                self._insert(network, value)
+            self.save()
+        return list(learned)
+
+    def networks(self):
+        """Доверенные сети: список (ip_network, данные)"""
+        with self.lock:
+            return [(ipaddress.ip_network((key, length)), dict(value))
+                    for trie in self.tries.values() for key, length, value in trie.items()]
+
+    def load(self):
+        """
+        Загрузить список из файла; False, если файла еще нет (нужно первое заполнение).
+        Если файл поврежден, изменения не сохраняются, чтобы не затереть его
+        """
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            self.loaded = True
+            return False
+        except Exception as e:
+            self.log(f"Ошибка загрузки известных сетей: {e}")
+            return True
+        self.loaded = True
+        with self.lock:
+            for network, value in data.get('trusted', {}).items():
+                try:
+                    self._insert(ipaddress.ip_network(network, strict=False), value)
+                except ValueError:
+                    continue
+            self.candidates.update(data.get('candidates', {}))
+        return True
+
+    def save(self):
+        """Атомарное сохранение (вызывается под self.lock)"""
+        if not self.loaded:
+            return
+        data = {
+            'trusted': {str(ipaddress.ip_network((key, length))): value
+                        for trie in self.tries.values() for key, length, value in trie.items()},
+            'candidates': dict(self.candidates),
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.log(f"Ошибка сохранения известных сетей: {e}")
+
+
+SOURCE_NAMES = {'manual': 'вручную', 'learned': 'обучение', 'history': 'история'}
+
+
+def render_trusted(known, limit=50):
+    """Текст ответа /trusted (HTML)"""
+    networks = known.networks()
+    if not networks:
+        return ("🛡 Доверенных сетей пока нет: о каждом SSH входе приходит срочное оповещение.\n"
+                "Добавить: <code>/trusted add 203.0.113.0/24</code>")
+    networks.sort(key=lambda item: (item[0].version, item[0]))
+    lines = [f"🛡 <b>Доверенные сети для SSH</b> ({len(networks)}):", ""]
+    for network, value in networks[:limit]:
+        source = SOURCE_NAMES.get(value.get('source'), value.get('source', '?'))
+        last = f", последний {html.escape(str(value['last']))}" if value.get('last') else ""
+        lines.append(f"• <code>{network}</code> - {source}, входов {value.get('logins', 0)}{last}")
+    if len(networks) > limit:
+        lines.append(f"… и еще {len(networks) - limit}")
+    if known.learn_after:
+        lines.append("")
+        lines.append(f"<i>Новая сеть становится доверенной после {known.learn_after} входов из нее</i>")
+    return "\n".join(lines)
+
+
+def from_config(config, log=print):
+    return KnownNetworks(
+        path=config.get('known_networks_file', KNOWN_NETWORKS_FILE),
+        learn_after=config.get('known_networks_learn_after', 3),
+        learn_prefix_v4=config.get('known_networks_prefix_v4', 24),
+        learn_prefix_v6=config.get('known_networks_prefix_v6', 48),
+        log=log,
+    )
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка доступности сети: задержка и потери до шлюза, DNS и внешних узлов.
+
+Все цели (probe_targets) опрашиваются из одного цикла событий asyncio в
+отдельном потоке: у каждой цели своя корутина с собственным интервалом,
+число одновременных проб ограничено семафором. Поэтому сотни целей не
+требуют ни потока, ни процесса ping на пробу.
+
+Проба TCP - неблокирующий connect() к host:port (отказ в соединении тоже
+ответ узла). Проба ICMP - эхо-запрос через непривилегированный сокет
+SOCK_DGRAM/IPPROTO_ICMP (нужен net.ipv4.ping_group_range или root).
+
+Задержки складываются в почасовые скетчи квантилей (сутки истории), по
+последним window пробам считаются потери и медиана. Оповещение приходит
+при смене состояния цели: 'down' (подряд нет ответа), 'loss' (потери выше
+порога), 'slow' (медиана выросла относительно прошлых часов) и обратно 'ok'.
+"""
+
+import asyncio
+import html
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+from sketches import QuantileSketch
+
+HOUR = 3600
+RESOLVE_TTL = 300          # как часто заново разрешать имена целей, с
+DOWN_AFTER = 3             # подряд неудачных проб до состояния 'down'
+BASELINE_MIN_SAMPLES = 30  # сколько задержек прошлых часов нужно для сравнения
+LATENCY_MIN_DELTA_MS = 20  # рост медианы меньше этого не считается деградацией
+
+STATUS_TEXT = {
+    'ok': ("✅", "в норме"),
+    'down': ("❌", "не отвечает"),
+    'loss': ("⚠️", "потери пакетов"),
+    'slow': ("🐢", "выросла задержка"),
+}
+
+
+def default_gateway(route_path='/proc/net/route'):
+    """IPv4 адрес шлюза по умолчанию из таблицы маршрутизации; None, если его нет"""
+    try:
+        with open(route_path, 'r') as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if len(fields) > 3 and fields[1] == '00000000' and int(fields[3], 16) & 2:
+                    return socket.inet_ntoa(struct.pack('<L', int(fields[2], 16)))
+    except (OSError, StopIteration, ValueError):
+        pass
+    return None
+
+
+def icmp_checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def icmp_echo_request(sequence, payload=b'tgbot-probe'):
+    header = struct.pack('!BBHHH', 8, 0, 0, 0, sequence)
+    checksum = icmp_checksum(header + payload)
+    return struct.pack('!BBHHH', 8, 0, checksum, 0, sequence) + payload
+
+
+class Target:
+    """Цель проверки, ее последние результаты и почасовые скетчи задержки"""
+
+    def __init__(self, name, host, port=None, kind='tcp', interval=30, timeout=3,
+                 loss_percent=20, latency_ms=None, latency_factor=3, window=20, history_hours=24):
+        if kind not in ('tcp', 'icmp'):
+            raise ValueError(f"неизвестный тип пробы: {kind}")
+        if kind == 'tcp' and not port:
+            raise ValueError("для TCP пробы нужен port")
+        self.name = name
+        self.host = host
+        self.port = port
+        self.kind = kind
+        self.interval = interval
+        self.timeout = timeout
+        self.loss_percent = loss_percent
+        self.latency_ms = latency_ms
+        self.latency_factor = latency_factor
+        self.results = deque(maxlen=window)   # задержка в мс или None (нет ответа)
+        self.hours = deque(maxlen=history_hours)  # [(начало часа, QuantileSketch)]
+        self.status = None
+        self.error = None
+        self.address = None
+        self.resolved_at = 0.0
+        self.sequence = 0
+
+    @classmethod
+    def from_dict(cls, data, defaults):
+        host = data['host']
+        kind = data.get('type', 'icmp' if 'port' not in data else 'tcp')
+        return cls(
+            name=data.get('name', host if 'port' not in data else f"{host}:{data['port']}"),
+            host=host,
+            port=data.get('port'),
+            kind=kind,
+            interval=data.get('interval_seconds', defaults['interval']),
+            timeout=data.get('timeout_seconds', defaults['timeout']),
+            loss_percent=data.get('loss_percent', defaults['loss_percent']),
+            latency_ms=data.get('latency_ms'),
+            latency_factor=data.get('latency_factor', defaults['latency_factor']),
+        )
+
+    @property
+    def label(self):
+        return f"{self.host}:{self.port}" if self.kind == 'tcp' else f"{self.host} (ICMP)"
+
+    def record(self, latency, now=None):
+        """Учесть результат пробы (мс или None)"""
+        self.results.append(latency)
+        if latency is None:
+            return
+        hour = int((time.time() if now is None else now) // HOUR) * HOUR
+        if not self.hours or self.hours[-1][0] != hour:
+            self.hours.append((hour, QuantileSketch()))
+        self.hours[-1][1].add(latency)
+
+    def loss(self):
+        """Потери по последним пробам, %; None, если проб еще не было"""
+        if not self.results:
+            return None
+        return 100.0 * sum(1 for latency in self.results if latency is None) / len(self.results)
+
+    def recent_median(self):
+        values = sorted(latency for latency in self.results if latency is not None)
+        return values[len(values) // 2] if values else None
+
+    def histogram(self, include_current=True):
+        """Слияние почасовых скетчей (без текущего часа - база для сравнения)"""
+        merged = QuantileSketch()
+        hours = list(self.hours) if include_current else list(self.hours)[:-1]
+        for _, sketch in hours:
+            merged.merge(sketch)
+        return merged
+
+    def evaluate(self):
+        """Текущее состояние цели: 'ok', 'down', 'loss' или 'slow'"""
+        results = self.results
+        if len(results) >= DOWN_AFTER and all(results[-i] is None for i in range(1, DOWN_AFTER + 1)):
+            return 'down'
+        loss = self.loss()
+        if len(results) >= results.maxlen // 2 and loss >= self.loss_percent:
+            return 'loss'
+        median = self.recent_median()
+        if median is not None and len(results) >= results.maxlen // 2:
+            if self.latency_ms is not None and median > self.latency_ms:
+                return 'slow'
+            baseline = self.histogram(include_current=False)
+            if baseline.count >= BASELINE_MIN_SAMPLES:
+                usual = baseline.quantile(0.5)
+                if median > usual * self.latency_factor and median - usual > LATENCY_MIN_DELTA_MS:
+                    return 'slow'
+        return 'ok'
+
+
+async def tcp_probe(address, port, timeout):
+    """Время установления TCP соединения в мс или None"""
+    loop = asyncio.get_running_loop()
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, (address, port)), timeout)
+        except ConnectionRefusedError:
+            pass  # RST - узел ответил, сеть до него есть
+        return (time.perf_counter() - started) * 1000
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        sock.close()
+
+
+async def icmp_probe(address, sequence, timeout):
+    """Время ответа на ICMP эхо-запрос в мс или None; PermissionError, если ping сокеты запрещены"""
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    sock.setblocking(False)
+    try:
+        started = time.perf_counter()
+        deadline = started + timeout
+        # Идентификатор в запросе подставляет ядро (порт ping сокета), ответы фильтруются им же
+        sock.sendto(icmp_echo_request(sequence), (address, 0))
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return None
+            try:
+                reply = await asyncio.wait_for(loop.sock_recv(sock, 1024), remaining)
+            except asyncio.TimeoutError:
+                return None
+            if len(reply) >= 8 and reply[0] == 0 and struct.unpack('!H', reply[6:8])[0] == sequence:
+                return (time.perf_counter() - started) * 1000
+    except PermissionError:
+        raise
+    except OSError:
+        return None
+    finally:
+        sock.close()
+
+
+class ProbeMonitor:
+    """Цикл событий с пробами всех целей и оповещения о смене их состояния"""
+
+    def __init__(self, targets, alert=None, log=print, max_concurrency=100):
+        self.targets = targets
+        self.alert = alert
+        self.log = log
+        self.max_concurrency = max_concurrency
+        self.lock = threading.Lock()
+        self.thread = None
+        self.loop = None
+        self.probes = 0
+
+    async def resolve(self, target, loop):
+        """Адрес цели с кэшем на RESOLVE_TTL; разрешение имени не входит в измеряемую задержку"""
+        now = time.monotonic()
+        if target.address is not None and now - target.resolved_at < RESOLVE_TTL:
+            return target.address
+        if target.host == 'gateway':
+            address = default_gateway()
+            if address is None:
+                raise OSError("нет шлюза по умолчанию")
+        else:
+            family = socket.AF_INET if target.kind == 'icmp' else socket.AF_UNSPEC
+            infos = await loop.getaddrinfo(target.host, target.port or 0, family=family, type=socket.SOCK_STREAM)
+            address = infos[0][4][0]
+        target.address, target.resolved_at = address, now
+        return address
+
+    async def probe(self, target):
+        """Одна проба цели; результат записывается в target"""
+        loop = asyncio.get_running_loop()
+        try:
+            address = await self.resolve(target, loop)
+            if target.kind == 'tcp':
+                latency = await tcp_probe(address, target.port, target.timeout)
+            else:
+                target.sequence = (target.sequence + 1) & 0xffff
+                latency = await icmp_probe(address, target.sequence, target.timeout)
+            target.error = None if latency is not None else "нет ответа"
+        except PermissionError:
+            latency = None
+            if target.error != "ICMP запрещен":
+                self.log(f"Проба {target.name}: ICMP сокеты запрещены (net.ipv4.ping_group_range)")
+            target.error = "ICMP запрещен"
+        except OSError as e:
+            latency = None
+            target.address = None
+            target.error = str(e) or e.__class__.__name__
+        self.record(target, latency)
+
+    def record(self, target, latency):
+        """Записать результат и оповестить о смене состояния"""
+        with self.lock:
+            self.probes += 1
+            target.record(latency)
+            status = target.evaluate()
+            previous, target.status = target.status, status
+        if previous is None or status == previous:
+            # Первое состояние при запуске не рассылается, как и начальные предупреждения о клиентах
+            return
+        self.log(f"Проба {target.name}: {previous} -> {status} (потери {target.loss():.0f}%)")
+        if self.alert is not None:
+            self.alert(format_event(target, previous, status))
+
+    async def run_target(self, target, semaphore, delay):
+        await asyncio.sleep(delay)
+        loop = asyncio.get_running_loop()
+        next_run = loop.time()
+        while True:
+            async with semaphore:
+                try:
+                    await self.probe(target)
+                except Exception as e:
+                    self.log(f"Ошибка пробы {target.name}: {e}")
+            # Ровный шаг без накопления сдвига; пропущенные из-за перегрузки пробы не догоняются
+            next_run = max(next_run + target.interval, loop.time())
+            await asyncio.sleep(next_run - loop.time())
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        count = len(self.targets)
+        # Старт целей разнесен по интервалу, чтобы пробы не шли одной пачкой
+        await asyncio.gather(*(
+            self.run_target(target, semaphore, target.interval * i / count)
+            for i, target in enumerate(self.targets)
+        ))
+
+    def start(self):
+        if self.thread is None and self.targets:
+            self.thread = threading.Thread(target=lambda: asyncio.run(self.run()), name="ProbeThread", daemon=True)
+            self.thread.start()
+            self.log(f"Проверка сети запущена, целей: {len(self.targets)}")
+        return self
+
+    def network_online(self):
+        """
+        Есть ли связь с сетью: хотя бы одна цель не в состоянии 'down'.
+        Без целей или до первых результатов - True (состояние неизвестно).
+        """
+        with self.lock:
+            statuses = [target.status for target in self.targets if target.status is not None]
+        return not statuses or any(status != 'down' for status in statuses)
+
+
+def format_event(target, previous, status):
+    """Текст оповещения о смене состояния цели (HTML)"""
+    icon, text = STATUS_TEXT[status]
+    lines = [f"{icon} <b>Сеть: {html.escape(target.name)}</b> - {text}",
+             f"Цель: <code>{html.escape(target.label)}</code>"]
+    loss = target.loss()
+    median = target.recent_median()
+    details = [f"потери {loss:.0f}% за {len(target.results)} проб"]
+    if median is not None:
+        details.append(f"медиана {median:.1f} мс")
+    if status == 'slow':
+        usual = target.histogram(include_current=False).quantile(0.5)
+        if usual is not None:
+            details.append(f"обычно {usual:.1f} мс")
+    if status == 'down' and target.error:
+        details.append(html.escape(target.error))
+    if status == 'ok':
+        details.append(f"было: {STATUS_TEXT[previous][1]}")
+    lines.append(", ".join(details))
+    return "\n".join(lines)
+
+
+def render_probes(monitor):
+    """Текст ответа /probes (HTML)"""
+    if not monitor.targets:
+        return "ℹ️ Цели проверки сети не заданы (probe_targets в config.json)."
+    lines = ["🌐 <b>Проверка сети</b>", ""]
+    with monitor.lock:
+        for target in monitor.targets:
+            icon, text = STATUS_TEXT.get(target.status, ("❔", "нет данных"))
+            lines.append(f"{icon} <b>{html.escape(target.name)}</b> <code>{html.escape(target.label)}</code>")
+            loss = target.loss()
+            if loss is None:
+                lines.append("   ожидание первой пробы")
+                continue
+            last = target.results[-1]
+            parts = [f"потери {loss:.0f}%", f"последняя {f'{last:.1f} мс' if last is not None else 'без ответа'}"]
+            histogram = target.histogram()
+            if histogram.count:
+                p50, p95, p99 = (histogram.quantile(q) for q in (0.5, 0.95, 0.99))
+                parts.append(f"p50/p95/p99 за {len(target.hours)} ч: {p50:.1f}/{p95:.1f}/{p99:.1f} мс")
+            lines.append("   " + ", ".join(parts))
+    lines.append(f"\n<i>Проб выполнено: {monitor.probes}</i>")
+    return "\n".join(lines)
+
+
+def from_config(config, alert=None, log=print):
+    """Монитор по probe_targets; некорректные цели пропускаются с записью в лог"""
+    defaults = {
+        'interval': config.get('probe_interval_seconds', 30),
+        'timeout': config.get('probe_timeout_seconds', 3),
+        'loss_percent': config.get('probe_loss_percent', 20),
+        'latency_factor': config.get('probe_latency_factor', 3),
+    }
+    targets = []
+    for data in config.get('probe_targets', []):
+        try:
+            targets.append(Target.from_dict(data, defaults))
+        except (KeyError, ValueError) as e:
+            log(f"Некорректная цель проверки сети {data}: {e}")
+    return ProbeMonitor(targets, alert=alert, log=log,
+                        max_concurrency=config.get('probe_max_concurrency', 100))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Процессы с наибольшей загрузкой CPU и памятью для /top.
+
+Фоновый поток раз в interval секунд обходит процессы через
+psutil.process_iter с фиксированным набором атрибутов (один проход по
+/proc/<pid> на процесс) и запоминает суммарное время CPU каждого PID.
+Загрузка считается по разнице с предыдущим обходом, поэтому /top отвечает
+готовым снимком, а не меряет CPU секунду. Кэш времени CPU на каждом обходе
+собирается заново только из живых процессов: завершившиеся PID из него
+выпадают, и память не растет при их смене.
+"""
+
+import heapq
+import html
+import threading
+import time
+
+import psutil
+
+ATTRS = ('pid', 'name', 'username', 'cpu_times', 'memory_info', 'create_time')
+DEFAULT_INTERVAL = 5
+
+
+class ProcessRow:
+    """Процесс в снимке"""
+    __slots__ = ('pid', 'name', 'user', 'cpu_percent', 'rss')
+
+    def __init__(self, pid, name, user, cpu_percent, rss):
+        self.pid = pid
+        self.name = name
+        self.user = user
+        self.cpu_percent = cpu_percent  # от одного ядра, как в top; None - первый обход процесса
+        self.rss = rss
+
+
+class ProcessSampler:
+    """Периодические снимки процессов с загрузкой CPU по разнице между обходами"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, log=print):
+        self.interval = interval
+        self.log = log
+        self.previous = {}     # pid -> (create_time, время CPU, с)
+        self.previous_at = None
+        self.snapshot = None   # (time.time(), интервал замера, [ProcessRow])
+        self.samples = 0
+        self.thread = None
+
+    def sample(self):
+        """Один обход процессов; снимок заменяется целиком, читатели видят либо старый, либо новый"""
+        now = time.monotonic()
+        elapsed = now - self.previous_at if self.previous_at is not None else None
+        previous = self.previous
+        current = {}
+        rows = []
+        for process in psutil.process_iter(ATTRS, ad_value=None):
+            info = process.info
+            pid, cpu_times, created = info['pid'], info['cpu_times'], info['create_time']
+            cpu_percent = None
+            if cpu_times is not None:
+                cpu = cpu_times.user + cpu_times.system
+                current[pid] = (created, cpu)
+                before = previous.get(pid)
+                # Совпадение времени создания отличает тот же процесс от нового с переиспользованным PID
+                if elapsed and before is not None and before[0] == created:
+                    cpu_percent = max(0.0, (cpu - before[1]) / elapsed * 100)
+            memory = info['memory_info']
+            rows.append(ProcessRow(pid, info['name'] or '?', info['username'] or '?',
+                                   cpu_percent, memory.rss if memory is not None else 0))
+        self.previous = current
+        self.previous_at = now
+        self.snapshot = (time.time(), elapsed, rows)
+        self.samples += 1
+        return rows
+
+    def run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                self.log(f"Ошибка обхода процессов: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="ProcessSamplerThread", daemon=True)
+            self.thread.start()
+        return self
+
+    def top(self, limit=10, by='cpu'):
+        """Первые limit процессов по CPU ('cpu') или памяти ('mem'); None, если снимков еще нет"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        if by == 'mem':
+            key = lambda row: row.rss
+        else:
+            key = lambda row: (row.cpu_percent or 0.0, row.rss)
+        return snapshot[0], snapshot[1], len(snapshot[2]), heapq.nlargest(limit, snapshot[2], key=key)
+
+
+def format_rss(size):
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def render_top(sampler, limit=10, by='cpu'):
+    """Текст ответа /top (HTML)"""
+    result = sampler.top(limit, by)
+    if result is None:
+        return "⏳ Первый обход процессов еще не закончен, повторите через несколько секунд."
+    taken, elapsed, total, rows = result
+    order = "памяти" if by == 'mem' else "CPU"
+    lines = [f"{'PID':>7} {'CPU%':>6} {'RSS':>9}  {'USER':<10} COMMAND"]
+    for row in rows:
+        cpu = f"{row.cpu_percent:.1f}" if row.cpu_percent is not None else "-"
+        lines.append(f"{row.pid:>7} {cpu:>6} {format_rss(row.rss):>9}  {row.user[:10]:<10} {row.name[:24]}")
+    window = f" за {elapsed:.0f} с" if elapsed else ""
+    age = max(0, time.time() - taken)
+    return (f"🔝 <b>Процессы по {order}</b> (всего {total}, CPU%{window} от одного ядра, "
+            f"ядер: {psutil.cpu_count() or 1})\n"
+            f"<pre>{html.escape(chr(10).join(lines))}</pre>\n"
+            f"<i>Снимок {age:.0f} с назад</i>")
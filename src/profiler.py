@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Профилирование работающего бота по запросу: /profile и /memsnap.
+
+Пока команды не вызваны, модуль ничего не делает: нет ни фонового потока,
+ни трассировки. /profile N на N секунд запускает поток, который с шагом
+PROFILE_INTERVAL опрашивает стеки всех потоков процесса через
+sys._current_frames() (бот с циклом событий, мониторинг, SSH, Xray) и
+складывает их в формат collapsed stacks ("поток;функция;функция count"),
+который понимают flamegraph.pl и speedscope.
+
+/memsnap при первом вызове включает tracemalloc и запоминает снимок,
+следующие вызовы показывают крупнейшие места выделения памяти и разницу
+с предыдущим снимком. /memsnap stop выключает трассировку.
+"""
+
+import collections
+import html
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_INTERVAL = 0.01   # шаг опроса стеков, с
+MAX_PROFILE_SECONDS = 300
+MEMSNAP_FRAMES = 1        # глубина стека tracemalloc: места выделения, без цепочек вызовов
+
+_profile_lock = threading.Lock()
+_previous_snapshot = None
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collect_stacks(seconds, interval=PROFILE_INTERVAL):
+    """
+    Опрос стеков всех потоков, кроме собственного, в течение seconds.
+    Возвращает (Counter свернутых стеков, количество опросов).
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("Профилирование уже идет")
+    try:
+        own = threading.get_ident()
+        stacks = collections.Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks[';'.join(reversed(labels))] += 1
+            samples += 1
+            time.sleep(interval)
+        return stacks, samples
+    finally:
+        _profile_lock.release()
+
+
+def write_collapsed(stacks, path):
+    """Записать стеки в формате collapsed stacks (по строке на стек)"""
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def render_profile_summary(stacks, samples, seconds, limit=10):
+    """Сводка профиля: функции с наибольшим собственным временем по каждому потоку (HTML)"""
+    own_time = collections.Counter()
+    thread_samples = collections.Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        thread_samples[frames[0]] += count
+        if len(frames) > 1:
+            own_time[(frames[0], frames[-1])] += count
+
+    lines = [f"🔬 <b>Профиль за {seconds} с</b>: {samples} опросов, стеков: {len(stacks)}", ""]
+    for (thread, function), count in own_time.most_common(limit):
+        share = 100 * count / thread_samples[thread]
+        lines.append(f"• {share:5.1f}% <code>{html.escape(thread)}</code>: <code>{html.escape(function)}</code>")
+    lines.append("\nФайл - collapsed stacks для flamegraph.pl или speedscope.app. "
+                 "Ожидание (select, sleep, read) тоже попадает в профиль: смотрите на потоки, где его мало.")
+    return "\n".join(lines)
+
+
+def memory_snapshot(limit=15):
+    """
+    Снимок tracemalloc: при первом вызове включает трассировку и возвращает None,
+    затем - текст отчета (HTML) с разницей относительно предыдущего снимка.
+    """
+    global _previous_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(MEMSNAP_FRAMES)
+        _previous_snapshot = tracemalloc.take_snapshot()
+        return None
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+
+    top_lines = []
+    for stat in snapshot.statistics('lineno')[:limit]:
+        frame = stat.traceback[0]
+        top_lines.append(f"{stat.size / 1024:9.1f} КБ {stat.count:>7}  {html.escape(os.path.basename(frame.filename))}:{frame.lineno}")
+
+    diff_lines = []
+    if _previous_snapshot is not None:
+        for stat in snapshot.compare_to(_previous_snapshot, 'lineno')[:limit]:
+            if not stat.size_diff:
+                continue
+            frame = stat.traceback[0]
+            diff_lines.append(f"{stat.size_diff / 1024:+9.1f} КБ {stat.count_diff:>+7}  "
+                              f"{html.escape(os.path.basename(frame.filename))}:{frame.lineno}")
+    _previous_snapshot = snapshot
+
+    return (
+        f"🧠 <b>Память</b>: отслеживается {current / 1024 / 1024:.1f} МБ, пик {peak / 1024 / 1024:.1f} МБ\n\n"
+        f"<b>Крупнейшие места выделения</b>\n<pre>" + "\n".join(top_lines) + "</pre>\n"
+        f"<b>Изменение с прошлого снимка</b>\n<pre>" + ("\n".join(diff_lines) or "без изменений") + "</pre>"
+    )
+
+
+def stop_memory_tracing():
+    """Выключить tracemalloc. Возвращает True, если трассировка была включена"""
+    global _previous_snapshot
+    _previous_snapshot = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        return True
+    return False
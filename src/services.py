@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Слежение за списком systemd юнитов.
+
+Проверки планируются хешированным колесом таймеров: постановка и снятие
+проверки стоят O(1) независимо от их количества. Все юниты, чей срок
+пришелся на один тик, опрашиваются одним вызовом
+`systemctl show -p Id,LoadState,ActiveState,SubState,NRestarts юнит1 юнит2 ...`.
+NRestarts показывает автоматические перезапуски, которые `is-active` не видит.
+Вызов идет через perf.timed_run и виден в /perf как exec:systemctl show.
+"""
+
+import math
+
+import alerts
+import perf
+
+SHOW_PROPERTIES = ('Id', 'LoadState', 'ActiveState', 'SubState', 'NRestarts')
+
+
+class TimerWheel:
+    """
+    Хешированное колесо таймеров: slots ячеек по tick_seconds.
+    Элемент с задержкой больше оборота колеса хранит количество оставшихся оборотов.
+    """
+
+    def __init__(self, tick_seconds=1.0, slots=512):
+        self.tick_seconds = tick_seconds
+        self.slots = [[] for _ in range(slots)]
+        self.position = 0
+
+    def schedule(self, item, delay_seconds):
+        """Поставить элемент на срабатывание через delay_seconds (не раньше следующего тика)"""
+        ticks = max(1, math.ceil(delay_seconds / self.tick_seconds))
+        size = len(self.slots)
+        self.slots[(self.position + ticks) % size].append([(ticks - 1) // size, item])
+
+    def advance(self):
+        """Сдвинуть колесо на один тик и вернуть элементы, срок которых наступил"""
+        self.position = (self.position + 1) % len(self.slots)
+        slot = self.slots[self.position]
+        if not slot:
+            return []
+        due = []
+        pending = []
+        for entry in slot:
+            if entry[0] == 0:
+                due.append(entry[1])
+            else:
+                entry[0] -= 1
+                pending.append(entry)
+        self.slots[self.position] = pending
+        return due
+
+
+def parse_systemctl_show(output, units):
+    """
+    Разобрать вывод `systemctl show -p ... u1 u2 ...`: блоки свойств через пустую строку,
+    в порядке перечисления юнитов. Возвращает {юнит: {свойство: значение}}.
+    """
+    blocks = []
+    current = {}
+    for line in output.splitlines():
+        if not line.strip():
+            if current:
+                blocks.append(current)
+                current = {}
+            continue
+        key, _, value = line.partition('=')
+        current[key] = value
+    if current:
+        blocks.append(current)
+    return dict(zip(units, blocks))
+
+
+class WatchedUnit:
+    """Юнит из списка слежения и его последнее известное состояние"""
+    __slots__ = ('unit', 'title', 'interval', 'active', 'state', 'restarts', 'missing', 'flaps')
+
+    def __init__(self, unit, title=None, interval=60, flap_settings=None):
+        self.unit = unit
+        self.title = title or unit
+        self.interval = interval
+        self.active = None
+        self.state = None
+        self.restarts = None
+        self.missing = False
+        self.flaps = alerts.FlapDetector(**(flap_settings or {}))
+
+
+class ServiceWatcher:
+    """Опрос юнитов пачками и события об изменениях их состояния"""
+
+    def __init__(self, units, run_command=perf.timed_run):
+        self.units = {unit.unit: unit for unit in units}
+        self.run_command = run_command
+
+    def query(self, names):
+        """Один вызов systemctl show для всех переданных юнитов"""
+        result = self.run_command(
+            ['systemctl', 'show', '-p', ','.join(SHOW_PROPERTIES), '--'] + list(names),
+            capture_output=True, text=True, timeout=15
+        )
+        return parse_systemctl_show(result.stdout, names)
+
+    def check(self, names):
+        """
+        Опросить юниты и вернуть события:
+        ('state', юнит, событие FlapDetector), ('restarts', юнит, прирост), ('missing', юнит).
+        """
+        events = []
+        for name, properties in self.query(names).items():
+            unit = self.units[name]
+            if properties.get('LoadState') == 'not-found':
+                if not unit.missing:
+                    unit.missing = True
+                    events.append(('missing', unit))
+                continue
+            unit.missing = False
+
+            unit.state = f"{properties.get('ActiveState', '?')}/{properties.get('SubState', '?')}"
+            active = properties.get('ActiveState') == 'active'
+            first_check = unit.active is None
+            unit.active = active
+            flap_event = unit.flaps.update(active)
+            if flap_event and not first_check:
+                events.append(('state', unit, flap_event))
+
+            try:
+                restarts = int(properties.get('NRestarts') or 0)
+            except ValueError:
+                restarts = 0
+            if unit.restarts is not None and restarts > unit.restarts:
+                events.append(('restarts', unit, restarts - unit.restarts))
+            unit.restarts = restarts
+        return events
+
+
+def units_from_config(config, flap_settings=None):
+    """
+    Список юнитов из config['watch_units']: строки ("nginx") или объекты
+    {"unit": "x-ui", "title": "3X-UI", "interval_seconds": 30}.
+    """
+    default_interval = config.get('check_interval_seconds', 60)
+    entries = config.get('watch_units') or [{"unit": "x-ui", "title": "3X-UI"}]
+    units = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"unit": entry}
+        units.append(WatchedUnit(
+            entry['unit'],
+            title=entry.get('title'),
+            interval=entry.get('interval_seconds', default_interval),
+            flap_settings=flap_settings,
+        ))
+    return units
+
+
+def format_event(event):
+    """Текст оповещения по событию ServiceWatcher.check (HTML)"""
+    kind, unit = event[0], event[1]
+    if kind == 'missing':
+        return f"❓ <b>{unit.title}</b>: юнит <code>{unit.unit}</code> не найден в systemd"
+    if kind == 'restarts':
+        return (f"🔁 <b>{unit.title} перезапускался</b>\n"
+                f"systemd перезапустил сервис {event[2]} раз (всего {unit.restarts}), сейчас: {unit.state}")
+
+    flap_event = event[2]
+    if flap_event[0] == 'change':
+        if flap_event[1]:
+            return f"✅ <b>{unit.title} восстановлен</b>\nСервис {unit.title} снова активен!"
+        return f"❌ <b>{unit.title} упал</b>\nСервис {unit.title} остановлен ({unit.state})!"
+    if flap_event[0] == 'flapping':
+        minutes = unit.flaps.window_seconds // 60
+        return (f"⚠️ <b>{unit.title}: нестабильное состояние</b>\n"
+                f"{flap_event[1]} переключений за {minutes} мин. Отдельные уведомления приостановлены до стабилизации.")
+    _, stable_state, suppressed, duration = flap_event
+    state_text = "активен" if stable_state else f"остановлен ({unit.state})"
+    icon = "✅" if stable_state else "❌"
+    return (f"{icon} <b>{unit.title}: состояние стабилизировалось</b> ({state_text})\n"
+            f"Дребезг длился {int(duration // 60)} мин., подавлено переключений: {suppressed}.")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Сессии доступа к панели.
+
+Каждый /getlink создает отдельную сессию со своим сроком: доступ либо только
+с указанного IP (правило UFW "allow from IP to any port"), либо для всех (как раньше).
+Сроки всех сессий хранятся в одной куче, которую обслуживает единственная
+задача asyncio. Изменения правил UFW копятся и применяются пачкой: несколько
+сессий с одного IP дают одно правило, а открытия/закрытия в пределах
+FLUSH_DELAY выполняются одним проходом.
+"""
+
+import asyncio
+import heapq
+import itertools
+import re
+import secrets
+import time
+
+# Сколько ждать новых изменений перед применением правил UFW, секунд.
+# Изменения, пришедшие во время уже идущего прохода, попадают в следующий
+FLUSH_DELAY = 0.05
+
+# Источник для сессии без ограничения по IP
+ANY_SOURCE = '*'
+
+
+class Session:
+    """Одна сессия доступа к панели"""
+    __slots__ = ('id', 'chat_id', 'ip', 'minutes', 'expires_at')
+
+    def __init__(self, session_id, chat_id, ip, minutes, expires_at):
+        self.id = session_id
+        self.chat_id = chat_id
+        self.ip = ip
+        self.minutes = minutes
+        self.expires_at = expires_at  # по time.monotonic()
+
+    @property
+    def source(self):
+        return self.ip or ANY_SOURCE
+
+    def remaining_minutes(self):
+        return max(0, int((self.expires_at - time.monotonic() + 59) // 60))
+
+
+def firewall_command(action, port, source):
+    """Команда UFW для добавления ('add') или снятия ('remove') доступа к порту"""
+    if source == ANY_SOURCE:
+        # Прежнее поведение бота: allow/deny для всего порта
+        return ['ufw', 'allow' if action == 'add' else 'deny', str(port)]
+    rule = ['allow', 'from', source, 'to', 'any', 'port', str(port), 'proto', 'tcp']
+    if action == 'add':
+        # prepend: правило должно стоять раньше "deny <порт>", оставшегося от прошлых сессий
+        return ['ufw', 'prepend'] + rule
+    return ['ufw', 'delete'] + rule
+
+
+def find_scoped_allow_rules(ufw_output, port):
+    """
+    Номера ALLOW правил порта с конкретным источником (не Anywhere) в выводе
+    `ufw status numbered`, по убыванию.
+    """
+    # Пример строки: [ 1] 8080/tcp                   ALLOW IN    203.0.113.7
+    pattern = re.compile(
+        rf'^\s*\[\s*(\d+)\s*\]\s+{port}(/tcp)?\s+ALLOW(?: IN)?\s+(?!Anywhere)\S+', re.MULTILINE
+    )
+    rule_numbers = [int(match.group(1)) for match in pattern.finditer(ufw_output)]
+    return [str(number) for number in sorted(rule_numbers, reverse=True)]
+
+
+class SessionManager:
+    """Параллельные сессии доступа с общей кучей сроков и пакетным применением правил"""
+
+    def __init__(self, run_command, get_port, on_expire=None, log=print):
+        self.run_command = run_command
+        self.get_port = get_port
+        self.on_expire = on_expire  # async функция(session)
+        self.log = log
+        self.sessions = {}
+        self.heap = []            # (expires_at, порядковый номер, id сессии)
+        self.counter = itertools.count()
+        self.applied = set()      # (порт, источник) - правила, открытые в UFW
+        self.dirty = False
+        self.flush_at = 0.0
+        self.waiters = []
+        self.expired = []         # истекшие сессии, ждущие применения правил и уведомления
+        self.wakeup = None
+        self.task = None
+
+    # --- публичный интерфейс ---
+
+    def start(self):
+        """Запустить задачу планировщика в текущем цикле событий"""
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.get_running_loop().create_task(self.run(), name="panel-sessions")
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def sessions_for(self, chat_id=None):
+        """Активные сессии чата (или все), от ближайшего истечения"""
+        sessions = [s for s in self.sessions.values() if chat_id is None or s.chat_id == chat_id]
+        return sorted(sessions, key=lambda s: s.expires_at)
+
+    async def open(self, chat_id, ip, minutes):
+        """Создать сессию и дождаться применения правил. Возвращает (session, успех)"""
+        session = Session(secrets.token_hex(3), chat_id, ip, minutes, time.monotonic() + minutes * 60)
+        self.sessions[session.id] = session
+        heapq.heappush(self.heap, (session.expires_at, next(self.counter), session.id))
+        await self.request_flush()
+        # Успех определяется по своему правилу: ошибка чужого правила в том же проходе не мешает
+        if (self.get_port(), session.source) not in self.applied:
+            self.sessions.pop(session.id, None)
+            return session, False
+        return session, True
+
+    async def close(self, session_ids):
+        """Закрыть сессии по id. Возвращает успех применения правил"""
+        closed = [self.sessions.pop(session_id) for session_id in session_ids if session_id in self.sessions]
+        if not closed:
+            return True
+        return await self.request_flush()
+
+    def schedule_flush(self):
+        """Пересчитать правила при ближайшем проходе (например, после смены порта панели)"""
+        if self.task is not None:
+            self._mark_dirty(FLUSH_DELAY)
+
+    async def request_flush(self):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        self._mark_dirty(FLUSH_DELAY)
+        return await future
+
+    # --- планировщик ---
+
+    def _mark_dirty(self, delay):
+        deadline = time.monotonic() + delay
+        if not self.dirty or deadline < self.flush_at:
+            self.flush_at = deadline
+        self.dirty = True
+        self.wakeup.set()
+
+    def _pop_expired(self, now):
+        expired = []
+        while self.heap and self.heap[0][0] <= now:
+            _, _, session_id = heapq.heappop(self.heap)
+            # Закрытые вручную сессии остаются в куче и просто пропускаются
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                expired.append(session)
+        return expired
+
+    def _apply(self, desired):
+        """Привести правила UFW к желаемому набору (выполняется в отдельном потоке)"""
+        for port, source in sorted(desired - self.applied):
+            try:
+                self.run_command(firewall_command('add', port, source), check=True, capture_output=True)
+                self.applied.add((port, source))
+                self.log(f"Доступ к порту {port} открыт для {source}")
+            except Exception as e:
+                self.log(f"Ошибка открытия порта {port} для {source}: {e}")
+        for port, source in sorted(self.applied - desired):
+            try:
+                self.run_command(firewall_command('remove', port, source), check=True, capture_output=True)
+                self.applied.discard((port, source))
+                self.log(f"Доступ к порту {port} для {source} закрыт")
+            except Exception as e:
+                self.log(f"Ошибка закрытия порта {port} для {source}: {e}")
+        return self.applied == desired
+
+    async def _flush(self):
+        self.dirty = False
+        waiters, self.waiters = self.waiters, []
+        port = self.get_port()
+        desired = {(port, session.source) for session in self.sessions.values()}
+        try:
+            ok = await asyncio.to_thread(self._apply, desired)
+        except Exception as e:
+            self.log(f"Ошибка применения правил сессий: {e}")
+            ok = False
+        for future in waiters:
+            if not future.done():
+                future.set_result(ok)
+
+    async def run(self):
+        """Единственная задача: истечение сессий и применение накопленных изменений"""
+        while True:
+            expired = self._pop_expired(time.monotonic())
+            if expired:
+                self.expired.extend(expired)
+                self._mark_dirty(0)
+            now = time.monotonic()
+            if self.dirty and now >= self.flush_at:
+                await self._flush()
+                expired, self.expired = self.expired, []
+                if self.on_expire:
+                    for session in expired:
+                        try:
+                            await self.on_expire(session)
+                        except Exception as e:
+                            self.log(f"Ошибка уведомления о завершении сессии {session.id}: {e}")
+                continue
+
+            timeout = None
+            if self.heap:
+                timeout = self.heap[0][0] - now
+            if self.dirty:
+                timeout = min(timeout, self.flush_at - now) if timeout is not None else self.flush_at - now
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def cleanup_scoped_rules(self):
+        """Удалить правила "allow from IP", оставшиеся после аварийного завершения бота"""
+        port = self.get_port()
+        try:
+            result = self.run_command(['ufw', 'status', 'numbered'], capture_output=True, text=True, timeout=10)
+            for rule_num in find_scoped_allow_rules(result.stdout, port):
+                self.run_command(['ufw', '--force', 'delete', str(rule_num)], check=True, capture_output=True, text=True)
+                self.log(f"Удалено оставшееся правило доступа к порту {port}: [{rule_num}]")
+        except Exception as e:
+            self.log(f"Ошибка очистки правил доступа к порту {port}: {e}")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Потоковые скетчи с фиксированным объемом памяти"""
+
+import hashlib
+import math
+
+
+class QuantileSketch:
+    """
+    Потоковый скетч квантилей с относительной точностью (по мотивам DDSketch).
+    Значения раскладываются по логарифмическим корзинам, поэтому память
+    зависит только от диапазона значений, а не от их количества.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=1e-6):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._bins = {}
+        self._zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        """Добавить одно значение"""
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= self.min_value:
+            self._zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._bins[index] = self._bins.get(index, 0) + 1
+
+    def merge(self, other):
+        """Слить другой скетч с той же точностью в текущий"""
+        if other.count == 0:
+            return
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Нельзя слить скетчи с разной точностью")
+        for index, count in other._bins.items():
+            self._bins[index] = self._bins.get(index, 0) + count
+        self._zero_count += other._zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Оценка квантиля q (0..1); None, если значений нет"""
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        seen = self._zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        for index in sorted(self._bins):
+            seen += self._bins[index]
+            if seen > rank:
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                # Оценка корзины не должна выходить за реально наблюдавшиеся границы
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+
+class HyperLogLog:
+    """
+    Оценка количества уникальных элементов (HyperLogLog).
+    Память фиксирована: 2**precision однобайтовых регистров (1 КБ при precision=10,
+    стандартная ошибка около 1.04 / sqrt(2**precision), т.е. ~3%).
+    """
+
+    def __init__(self, precision=10):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision должна быть в диапазоне 4..16")
+        self.precision = precision
+        self._m = 1 << precision
+        self._registers = bytearray(self._m)
+        if self._m >= 128:
+            self._alpha = 0.7213 / (1 + 1.079 / self._m)
+        else:
+            self._alpha = {16: 0.673, 32: 0.697, 64: 0.709}[self._m]
+
+    @staticmethod
+    def _hash(item):
+        if isinstance(item, str):
+            item = item.encode('utf-8')
+        return int.from_bytes(hashlib.blake2b(item, digest_size=8).digest(), 'big')
+
+    def add(self, item):
+        """Добавить элемент (str или bytes). Возвращает True, если оценка могла измениться"""
+        value = self._hash(item)
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        # Позиция первой единицы в оставшихся битах
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        """Слить другой скетч той же точности в текущий"""
+        if other.precision != self.precision:
+            raise ValueError("Нельзя слить скетчи с разной точностью")
+        registers = self._registers
+        for i, rank in enumerate(other._registers):
+            if rank > registers[i]:
+                registers[i] = rank
+
+    def count(self):
+        """Оценка количества уникальных элементов"""
+        m = self._m
+        estimate = self._alpha * m * m / sum(2.0 ** -rank for rank in self._registers)
+        if estimate <= 2.5 * m:
+            zeros = self._registers.count(0)
+            if zeros:
+                # Поправка для малых количеств (linear counting)
+                estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class SpaceSaving:
+    """
+    Самые частые элементы потока (алгоритм Space-Saving).
+    Хранится не больше capacity счетчиков. Новый элемент при заполненной таблице
+    вытесняет элемент с минимальным счетчиком и наследует его значение как ошибку,
+    поэтому оценка завышена не больше чем на error, а каждый элемент с частотой
+    больше N / capacity гарантированно остается в таблице.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.counters = {}  # элемент -> [оценка, ошибка]
+        self.total = 0
+
+    def add(self, item, count=1):
+        """Учесть элемент count раз"""
+        self.total += count
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            return
+        victim = min(self.counters, key=lambda key: self.counters[key][0])
+        floor = self.counters.pop(victim)[0]
+        self.counters[item] = [floor + count, floor]
+
+    def merge(self, other):
+        """Слить другой скетч в текущий (суммы счетчиков, затем capacity наибольших)"""
+        for item, (count, error) in other.counters.items():
+            counter = self.counters.get(item)
+            if counter is None:
+                self.counters[item] = [count, error]
+            else:
+                counter[0] += count
+                counter[1] += error
+        self.total += other.total
+        if len(self.counters) > self.capacity:
+            keep = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)[:self.capacity]
+            self.counters = dict(keep)
+
+    def top(self, limit=10):
+        """[(элемент, оценка, ошибка)] по убыванию оценки"""
+        entries = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)[:limit]
+        return [(item, count, error) for item, (count, error) in entries]
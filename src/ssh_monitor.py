@@ -1,19 +1,60 @@
 #!/usr/bin/env python3
 
 import json
+import mmap
+import multiprocessing
+import os
 import subprocess
 import time
 import re
+import selectors
+from concurrent.futures import ProcessPoolExecutor
 import urllib3
 import requests
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 from datetime import datetime
-from telegram import Bot
+
+import logs
+import outbox
+import prefixes
+import ssh_stats
 
 # Загрузка конфигурации
 with open('config.json', 'r') as f:
     config = json.load(f)
 
+# Файл контрольной точки: позиция чтения и inode SSH лога
+CHECKPOINT_FILE = '/var/lib/telegram-bot/ssh_monitor_state.json'
+
+# Начиная с какого объема пропущенного лога разбор идет параллельно в пуле процессов
+PARALLEL_REPLAY_THRESHOLD = 8 * 1024 * 1024
+
+# Сколько успешных входов перечислять в сводке после простоя
+REPLAY_SUMMARY_LIMIT = 15
+
+# Агрегаты событий за минуты, часы и дни для /ssh_stats (бот читает их из этого же процесса)
+stats = ssh_stats.SSHStats()
+
+# Доверенные сети SSH входов (см. prefixes.py): входы из них только пишутся в лог.
+# Бот правит список командой /trusted в этом же процессе
+known_networks = prefixes.from_config(config, log=lambda message: log_message(message))
+
+# Сколько последних успешных входов из auth.log брать для первого заполнения известных сетей
+KNOWN_NETWORKS_HISTORY_LIMIT = 10000
+
+# Курсор journald, до которого события уже обработаны
+JOURNALD_CURSOR_FILE = '/var/lib/telegram-bot/ssh_journald_cursor'
+
+# Идентификаторы sshd в журнале (OpenSSH 9.8+ пишет от имени sshd-session)
+SSHD_IDENTIFIERS = ['sshd', 'sshd-session']
+
+# Шаблоны сообщений sshd без отметки времени (journald отдает время отдельным полем)
+SSHD_MESSAGE_PATTERNS = [
+    (re.compile(r'^Accepted (?P<auth_type>\w+) for (?P<user>\S+) from (?P<ip>[0-9A-Fa-f:.]+) port (?P<port>\d+)'), 'success'),
+    (re.compile(r'^Failed (?P<auth_type>\w+) for (?P<user>\S+) from (?P<ip>[0-9A-Fa-f:.]+) port (?P<port>\d+)'), 'failed'),
+    (re.compile(r'^Invalid user (?P<user>\S*) from (?P<ip>[0-9A-Fa-f:.]+) port (?P<port>\d+)'), 'failed'),
+]
+
 def log_message(message):
     """Функция для логирования сообщений"""
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -28,13 +69,12 @@ def log_message(message):
         pass # Игнорируем ошибки записи в лог
 
 def send_telegram_message(message):
-    """Функция отправки сообщения через Telegram бот"""
+    """Постановка сообщения владельцу в очередь отправки (outbox.py)"""
     try:
-        bot = Bot(token=config['telegram_token'])
-        bot.send_message(chat_id=config['owner_chat_id'], text=message, parse_mode='HTML')
+        outbox.shared(config, log_message).enqueue(config['owner_chat_id'], message)
         return True
     except Exception as e:
-        log_message(f"Ошибка отправки Telegram сообщения: {e}")
+        log_message(f"Ошибка постановки сообщения в очередь: {e}")
         return False
 
 def get_geo_info(ip):
@@ -128,48 +168,529 @@ def parse_ssh_log_line(line):
             
     return None
 
-def monitor_ssh_logs():
-    """Основной цикл мониторинга SSH логов"""
-    log_message("SSH мониторинг запущен")
-    
-    # Получаем текущую позицию в логе
+def load_checkpoint():
+    """Загрузка контрольной точки SSH лога; None, если ее нет"""
     try:
-        with open(config['ssh_log_file'], 'r') as f:
-            f.seek(0, 2)  # Переходим в конец файла
-            last_position = f.tell()
+        if os.path.exists(CHECKPOINT_FILE):
+            with open(CHECKPOINT_FILE, 'r') as f:
+                return json.load(f)
     except Exception as e:
-        log_message(f"Ошибка открытия SSH лога: {e}")
+        log_message(f"Ошибка загрузки контрольной точки: {e}")
+    return None
+
+def save_checkpoint(path, inode, offset):
+    """Атомарное сохранение контрольной точки (через временный файл)"""
+    try:
+        os.makedirs(os.path.dirname(CHECKPOINT_FILE), exist_ok=True)
+        tmp_path = CHECKPOINT_FILE + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                "path": path,
+                "inode": inode,
+                "offset": offset,
+                "updated": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }, f)
+        os.replace(tmp_path, CHECKPOINT_FILE)
+    except Exception as e:
+        log_message(f"Ошибка сохранения контрольной точки: {e}")
+
+def parse_chunk(path, start, end):
+    """Разбор фрагмента файла [start, end) через mmap. Выполняется в процессе пула"""
+    events = []
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = mm[start:end]
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        parsed = parse_ssh_log_line(line.strip())
+        if parsed:
+            events.append(parsed)
+    return events
+
+def split_on_newlines(path, start, end, parts):
+    """Разбить диапазон [start, end) на части по границам строк"""
+    bounds = [start]
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            step = (end - start) // parts
+            for i in range(1, parts):
+                newline = mm.find(b'\n', start + i * step, end)
+                if newline == -1:
+                    break
+                if newline + 1 > bounds[-1]:
+                    bounds.append(newline + 1)
+    bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def last_line_end(path, start, end):
+    """Позиция после последнего перевода строки в [start, end) или start, если его нет (поиск по mmap с конца)"""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm.rfind(b'\n', start, end) + 1 or start
+
+def replay_backlog(path, start, end):
+    """
+    Разбор пропущенной части лога [start, end).
+    Большие объемы разбиваются на части и разбираются в пуле процессов,
+    результаты сливаются в хронологическом порядке.
+    """
+    workers = min(os.cpu_count() or 1, 8)
+    if end - start < PARALLEL_REPLAY_THRESHOLD or workers < 2:
+        events = parse_chunk(path, start, end)
+    else:
+        ranges = split_on_newlines(path, start, end, workers * 4)
+        # fork из многопоточного процесса (бот, мониторы, очередь) может заблокировать дочерний
+        # процесс на чужой блокировке - рабочие процессы запускаются через forkserver
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+            chunks = pool.map(parse_chunk, [path] * len(ranges),
+                              [r[0] for r in ranges], [r[1] for r in ranges])
+            events = [event for chunk in chunks for event in chunk]
+    # Сортировка стабильна: события с одинаковым временем остаются в порядке файла
+    events.sort(key=lambda event: event['timestamp'])
+    return events
+
+def notify_replayed_events(events):
+    """Одна сводка о входах, пропущенных за время простоя, вместо отдельных уведомлений"""
+    for event in events:
+        stats.record_event(event)
+    successes = [event for event in events if event['type'] == 'success']
+    failed_count = sum(1 for event in events if event['type'] == 'failed')
+    log_message(f"Восстановлено из лога: {len(successes)} успешных входов, {failed_count} неудачных попыток")
+    if not successes:
         return
 
-    while True:
+    # Входы из неизвестных сетей помечаются и перечисляются первыми
+    unknown = set()
+    for index, event in enumerate(successes):
+        if known_networks.observe(event['ip'], event['timestamp'])[1] == 'unknown':
+            unknown.add(index)
+    order = sorted(range(len(successes)), key=lambda index: index not in unknown)
+    lines = [
+        f"• {'🆕 ' if index in unknown else ''}{successes[index]['timestamp']} — "
+        f"<b>{successes[index]['user']}</b> с {successes[index]['ip']} ({successes[index]['auth_type']})"
+        for index in order[:REPLAY_SUMMARY_LIMIT]
+    ]
+    if len(successes) > REPLAY_SUMMARY_LIMIT:
+        lines.append(f"… и еще {len(successes) - REPLAY_SUMMARY_LIMIT}")
+
+    message = f"""📜 <b>SSH входы за время простоя бота</b>
+
+<b>Успешных входов:</b> {len(successes)}
+<b>Из неизвестных сетей (🆕):</b> {len(unknown)}
+<b>Неудачных попыток:</b> {failed_count}
+
+""" + "\n".join(lines)
+    send_telegram_message(message)
+
+def find_rotated(path, inode):
+    """Ротированная копия лога (auth.log.1 и т.п.) с данным inode или None; сжатые копии - уже другие файлы"""
+    for candidate in logs.rotated_files(path)[1:]:
+        if candidate.endswith('.gz'):
+            continue
         try:
-            with open(config['ssh_log_file'], 'r') as f:
-                f.seek(last_position)
-                new_lines = f.readlines()
-                last_position = f.tell()
-
-            for line in new_lines:
-                parsed = parse_ssh_log_line(line.strip())
-                if parsed:
-                    if parsed['type'] == 'success':
-                        # Отправляем уведомление о успешной авторизации
-                        message = f"""🔐 <b>SSH авторизация</b>
+            if os.stat(candidate).st_ino == inode:
+                return candidate
+        except OSError:
+            continue
+    return None
+
+def catch_up(path):
+    """
+    Определить стартовую позицию по контрольной точке и воспроизвести пропущенное.
+    Возвращает (inode, позиция, с которой продолжать слежение)
+    """
+    stat = os.stat(path)
+    checkpoint = load_checkpoint()
+    events = None
+
+    if checkpoint is None:
+        # Первый запуск: как и раньше, начинаем с конца файла
+        start = stat.st_size
+    elif checkpoint.get('inode') == stat.st_ino and checkpoint.get('offset', 0) <= stat.st_size:
+        start = checkpoint['offset']
+    else:
+        # Файл ротирован (другой inode или укоротился) - новый файл читается с начала,
+        # а хвост старого после контрольной точки дочитывается из ротированной копии
+        start = 0
+        rotated = find_rotated(path, checkpoint.get('inode')) if checkpoint.get('inode') != stat.st_ino else None
+        if rotated is not None:
+            offset = checkpoint.get('offset', 0)
+            size = os.path.getsize(rotated)
+            log_message(f"SSH лог ротирован с момента последнего запуска, дочитываем {rotated} с позиции {offset}")
+            events = replay_backlog(rotated, offset, size) if offset < size else []
+        else:
+            log_message("SSH лог ротирован с момента последнего запуска, прежний файл не найден - читаем новый с начала")
+
+    # Дочитываем только до последней полной строки
+    if start < stat.st_size:
+        end = last_line_end(path, start, stat.st_size)
+        if end > start:
+            log_message(f"Воспроизведение пропущенного SSH лога: {end - start} байт")
+            events = (events or []) + replay_backlog(path, start, end)
+            start = end
+    if events is not None:
+        notify_replayed_events(events)
+
+    save_checkpoint(path, stat.st_ino, start)
+    return stat.st_ino, start
+
+def parse_sshd_message(message):
+    """Разбор текста сообщения sshd (без времени и имени хоста). Возвращает словарь или None"""
+    for pattern, type_str in SSHD_MESSAGE_PATTERNS:
+        match = pattern.match(message)
+        if match:
+            data = match.groupdict()
+            data['type'] = type_str
+            return data
+    return None
+
+def handle_event(parsed):
+    """
+    Обработка одного события sshd: вход из доверенной сети только пишется в лог,
+    из неизвестной - срочное уведомление, неудачная попытка - в лог
+    """
+    stats.record_event(parsed)
+    if parsed['type'] == 'success':
+        # Поиск по дереву префиксов в памяти, без сетевых запросов
+        network, status = known_networks.observe(parsed['ip'], parsed.get('timestamp'))
+        if status == 'trusted':
+            log_message(f"SSH авторизация из доверенной сети {network}: {parsed['user']} с {parsed['ip']}")
+            return
+
+        if status == 'learned':
+            title = "🔐 <b>SSH авторизация</b>"
+            note = f"\n\nСеть <code>{network}</code> добавлена в доверенные: следующие входы из нее придут только в лог."
+        else:
+            title = "🚨 <b>SSH вход из неизвестной сети</b>"
+            note = (f"\n\nЕсли это вы, добавьте сеть в доверенные: <code>/trusted add {network}</code>"
+                    if network is not None else "")
+        message = f"""{title}
 
 <b>Время:</b> {parsed['timestamp']}
 <b>Пользователь:</b> {parsed['user']}
 <b>IP адрес:</b> {parsed['ip']}
 <b>Порт:</b> {parsed['port']} (порт сервера)
-<b>Тип авторизации:</b> {parsed['auth_type']}
-<b>Геоинформация:</b> {get_geo_info(parsed['ip'])}"""
-                        
-                        send_telegram_message(message)
-                        log_message(f"SSH авторизация: {parsed['user']} с {parsed['ip']}")
+<b>Тип авторизации:</b> {parsed.get('auth_type', 'N/A')}
+<b>Геоинформация:</b> {get_geo_info(parsed['ip'])}{note}"""
+
+        send_telegram_message(message)
+        log_message(f"SSH авторизация: {parsed['user']} с {parsed['ip']}")
+
+    elif parsed['type'] == 'failed':
+        # Логируем неудачные попытки
+        log_message(f"SSH неудачная попытка: {parsed['user']} с {parsed['ip']}")
+
+# ==================== ИСТОЧНИКИ СОБЫТИЙ SSH ====================
+
+class EventSource:
+    """
+    Источник событий sshd.
+    start() готовит источник и отправляет сводку о пропущенном за время простоя,
+    poll() ждет новые события (не дольше ~1 секунды) и возвращает список разобранных
+    событий в формате parse_ssh_log_line.
+    """
+    name = 'base'
+
+    def start(self):
+        pass
+
+    def poll(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class AuthLogSource(EventSource):
+    """Слежение за текстовым логом (/var/log/auth.log) с контрольной точкой и учетом ротации"""
+    name = 'auth.log'
 
-                    elif parsed['type'] == 'failed':
-                        # Логируем неудачные попытки
-                        log_message(f"SSH неудачная попытка: {parsed['user']} с {parsed['ip']}")
+    def __init__(self, path):
+        self.path = path
+        self.inode = None
+        self.position = 0
+        self.file = None  # открытый файл: после ротации он дочитывается до конца
 
-            time.sleep(1)  # Проверяем каждую секунду
+    def start(self):
+        self.inode, self.position = catch_up(self.path)
+        self.file = open(self.path, 'rb')
+        inode = os.fstat(self.file.fileno()).st_ino
+        if inode != self.inode:
+            # Ротация между catch_up и открытием
+            self.inode, self.position = inode, 0
+
+    def poll(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None  # старый файл уже переименован, новый еще не создан
+        lines = []
+        moved = False
+        if stat is not None and stat.st_ino != self.inode:
+            # Лог ротирован: сначала дочитываем старый файл через открытый дескриптор
+            rest, _ = logs.read_lines_from(self.file, self.position, final=True)
+            lines.extend(rest)
+            self.file.close()
+            self.file = open(self.path, 'rb')
+            self.inode, self.position = os.fstat(self.file.fileno()).st_ino, 0
+            moved = True
+            log_message(f"SSH лог ротирован: старый файл дочитан ({len(rest)} строк), читаем новый с начала")
+        elif stat is not None and stat.st_size < self.position:
+            # Файл укорочен на месте (copytruncate)
+            log_message("SSH лог укорочен, читаем с начала")
+            self.position = 0
+            moved = True
+
+        new_lines, position = logs.read_lines_from(self.file, self.position)
+        lines.extend(new_lines)
+        events = []
+        for line in lines:
+            parsed = parse_ssh_log_line(line.strip())
+            if parsed:
+                events.append(parsed)
+        if position != self.position or moved:
+            self.position = position
+            save_checkpoint(self.path, self.inode, self.position)
+        else:
+            time.sleep(1)  # Новых строк нет - проверяем раз в секунду
+        return events
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class JournaldSource(EventSource):
+    """
+    Структурированные записи sshd из systemd-journald.
+    Использует нативный API (python3-systemd), если он установлен, иначе один
+    долгоживущий процесс `journalctl -f -o json`. Позиция хранится курсором журнала.
+    Параметр stream позволяет подать заранее записанный поток JSON строк.
+    """
+    name = 'journald'
+
+    def __init__(self, cursor_file=JOURNALD_CURSOR_FILE, stream=None, use_native=True):
+        self.cursor_file = cursor_file
+        self.cursor = None
+        self.stream = stream
+        self.use_native = use_native and stream is None
+        self.reader = None
+        self.process = None
+        self.selector = None
+        self.buffer = b''
+        self.saved_cursor = None
+
+    # --- курсор ---
+
+    def load_cursor(self):
+        try:
+            if os.path.exists(self.cursor_file):
+                with open(self.cursor_file, 'r') as f:
+                    return f.read().strip() or None
+        except Exception as e:
+            log_message(f"Ошибка загрузки курсора journald: {e}")
+        return None
+
+    def save_cursor(self):
+        if not self.cursor or not self.cursor_file or self.cursor == self.saved_cursor:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cursor_file), exist_ok=True)
+            tmp_path = self.cursor_file + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(self.cursor)
+            os.replace(tmp_path, self.cursor_file)
+            self.saved_cursor = self.cursor
+        except Exception as e:
+            log_message(f"Ошибка сохранения курсора journald: {e}")
+
+    # --- разбор записей ---
+
+    @staticmethod
+    def entry_to_event(entry):
+        """Преобразовать запись журнала в событие; None, если это не вход по SSH"""
+        message = entry.get('MESSAGE')
+        if isinstance(message, list):
+            # journalctl кодирует не-UTF8 сообщения массивом байтов
+            message = bytes(message).decode('utf-8', errors='replace')
+        if not message:
+            return None
+        parsed = parse_sshd_message(message)
+        if not parsed:
+            return None
+
+        realtime = entry.get('__REALTIME_TIMESTAMP')
+        if isinstance(realtime, datetime):
+            dt_obj = realtime
+        elif realtime:
+            dt_obj = datetime.fromtimestamp(int(realtime) / 1_000_000)
+        else:
+            dt_obj = datetime.now()
+        parsed['timestamp'] = dt_obj.strftime('%Y-%m-%d %H:%M:%S')
+        return parsed
+
+    def _collect(self, entries):
+        events = []
+        for entry in entries:
+            self.cursor = entry.get('__CURSOR', self.cursor)
+            event = self.entry_to_event(entry)
+            if event:
+                events.append(event)
+        return events
+
+    # --- чтение ---
+
+    def _journalctl_args(self, follow):
+        args = ['journalctl', '-o', 'json', '--no-pager']
+        if follow:
+            args.append('-f')
+        if self.cursor:
+            args.append(f'--after-cursor={self.cursor}')
+        elif follow:
+            args += ['-n', '0']
+        return args + [f'SYSLOG_IDENTIFIER={name}' for name in SSHD_IDENTIFIERS]
+
+    def _open_native(self):
+        try:
+            from systemd import journal
+        except ImportError:
+            return False
+        reader = journal.Reader()
+        for name in SSHD_IDENTIFIERS:
+            reader.add_match(SYSLOG_IDENTIFIER=name)
+        if self.cursor:
+            reader.seek_cursor(self.cursor)
+            reader.get_next()  # Запись под курсором уже обработана
+        else:
+            reader.seek_tail()
+            reader.get_previous()
+        self.reader = reader
+        return True
+
+    def _start_follower(self):
+        self.process = subprocess.Popen(
+            self._journalctl_args(follow=True),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self.buffer = b''
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.process.stdout, selectors.EVENT_READ)
+
+    def _replay_backlog(self):
+        """Однократно дочитать записи после сохраненного курсора и отправить сводку"""
+        result = subprocess.run(self._journalctl_args(follow=False),
+                                capture_output=True, text=True, timeout=300)
+        entries = (json.loads(line) for line in result.stdout.splitlines() if line.strip())
+        events = self._collect(entries)
+        events.sort(key=lambda event: event['timestamp'])
+        notify_replayed_events(events)
+        self.save_cursor()
+
+    def start(self):
+        if self.stream is not None:
+            return
+        self.cursor = self.saved_cursor = self.load_cursor()
+        if self.use_native and self._open_native():
+            log_message("journald: используется нативный API systemd")
+            if self.cursor:
+                # Пропущенное за время простоя - одной сводкой
+                notify_replayed_events(self._collect(self._native_entries()))
+                self.save_cursor()
+            return
+        if self.cursor:
+            self._replay_backlog()
+        self._start_follower()
+        log_message("journald: запущен journalctl -f -o json")
+
+    def _native_entries(self):
+        while True:
+            entry = self.reader.get_next()
+            if not entry:
+                return
+            yield entry
+
+    def poll(self):
+        if self.stream is not None:
+            line = next(self.stream, None)
+            if line is None:
+                raise EOFError("Записанный поток journald закончился")
+            events = self._collect([json.loads(line)] if line.strip() else [])
+        elif self.reader is not None:
+            self.reader.wait(1)
+            events = self._collect(self._native_entries())
+        else:
+            if self.process.poll() is not None:
+                log_message("journalctl завершился, перезапускаем")
+                self.close()
+                self._start_follower()
+                time.sleep(1)
+                return []
+            lines = []
+            # Забираем все, что уже пришло, но не ждем дольше секунды
+            while self.selector.select(timeout=1 if not lines else 0):
+                chunk = os.read(self.process.stdout.fileno(), 65536)
+                if not chunk:
+                    break
+                self.buffer += chunk
+                *complete, self.buffer = self.buffer.split(b'\n')
+                lines.extend(json.loads(line) for line in complete if line.strip())
+            events = self._collect(lines)
+        self.save_cursor()
+        return events
+
+    def close(self):
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+def load_known_networks():
+    """Загрузить доверенные сети; при первом запуске заполнить их по истории входов в auth.log"""
+    if known_networks.load():
+        log_message(f"Доверенных сетей SSH: {len(known_networks.networks())}")
+        return
+    path = config.get('ssh_log_file', '/var/log/auth.log')
+    events = []
+    if os.path.exists(path):
+        lines = logs.tail(path, KNOWN_NETWORKS_HISTORY_LIMIT, 'Accepted')[0]
+        events = [event for event in map(parse_ssh_log_line, lines) if event and event['type'] == 'success']
+    networks = known_networks.bootstrap(events)
+    log_message(f"Доверенные сети SSH заполнены по истории входов: {len(networks)} сетей из {len(events)} входов")
+
+def create_event_source():
+    """Выбрать источник событий по параметру ssh_event_source: auto, auth_log или journald"""
+    kind = config.get('ssh_event_source', 'auto')
+    path = config.get('ssh_log_file', '/var/log/auth.log')
+    if kind == 'journald' or (kind == 'auto' and not os.path.exists(path)):
+        return JournaldSource()
+    return AuthLogSource(path)
+
+def monitor_ssh_logs():
+    """Основной цикл мониторинга SSH логов"""
+    log_message("SSH мониторинг запущен")
+
+    try:
+        load_known_networks()
+    except Exception as e:
+        log_message(f"Ошибка загрузки доверенных сетей SSH: {e}")
+
+    # Источник готовит стартовую позицию и воспроизводит пропущенное за время простоя
+    source = create_event_source()
+    try:
+        source.start()
+        log_message(f"Источник SSH событий: {source.name}")
+    except Exception as e:
+        log_message(f"Ошибка запуска источника SSH событий ({source.name}): {e}")
+        return
+
+    while True:
+        try:
+            for event in source.poll():
+                handle_event(event)
 
         except Exception as e:
             log_message(f"Ошибка мониторинга SSH: {e}")
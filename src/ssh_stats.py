@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Статистика SSH за последние часы и дни без повторного чтения логов.
+
+Каждое событие sshd сразу учитывается в трех кольцевых буферах корзин:
+минутных (последние 3 часа, только счетчики), часовых (двое суток) и
+суточных (30 дней). В часовых и суточных корзинах кроме счетчиков лежат
+скетчи Space-Saving самых частых IP и имен пользователей. Память
+фиксирована: размер колец и емкость скетчей не зависят от количества событий.
+
+Запрос за окно выбирает самый мелкий уровень, который его покрывает, и
+складывает корзины: за 24 часа это 24-25 часовых корзин и слияние их скетчей.
+"""
+
+import html
+import threading
+import time
+from datetime import datetime
+
+from sketches import SpaceSaving
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+
+class Bucket:
+    """Корзина уровня: начало интервала, счетчики и (не для минут) скетчи"""
+    __slots__ = ('start', 'success', 'failed', 'ips', 'users')
+
+    def __init__(self, start, capacity):
+        self.start = start
+        self.success = 0
+        self.failed = 0
+        self.ips = SpaceSaving(capacity) if capacity else None
+        self.users = SpaceSaving(capacity) if capacity else None
+
+
+class Tier:
+    """Кольцо из size корзин шириной width секунд"""
+
+    def __init__(self, width, size, capacity=0):
+        self.width = width
+        self.size = size
+        self.capacity = capacity
+        self.slots = [None] * size
+
+    @property
+    def span(self):
+        return self.width * self.size
+
+    def bucket(self, timestamp):
+        """Корзина для момента timestamp; устаревшая корзина в той же ячейке переиспользуется"""
+        start = int(timestamp // self.width) * self.width
+        index = (start // self.width) % self.size
+        bucket = self.slots[index]
+        if bucket is None or bucket.start != start:
+            if bucket is not None and bucket.start > start:
+                return None  # событие старше кольца
+            bucket = self.slots[index] = Bucket(start, self.capacity)
+        return bucket
+
+    def buckets_since(self, since):
+        return [bucket for bucket in self.slots if bucket is not None and bucket.start + self.width > since]
+
+
+class SSHStats:
+    """Агрегаты событий sshd: минуты, часы и дни"""
+
+    def __init__(self, capacity_hour=32, capacity_day=64):
+        self.tiers = (
+            Tier(MINUTE, 180),
+            Tier(HOUR, 48, capacity_hour),
+            Tier(DAY, 30, capacity_day),
+        )
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.events = 0
+
+    def record(self, event_type, ip, user, timestamp=None):
+        """Учесть событие ('success' или 'failed')"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            self.events += 1
+            for tier in self.tiers:
+                if timestamp < time.time() - tier.span:
+                    continue
+                bucket = tier.bucket(timestamp)
+                if bucket is None:
+                    continue
+                if event_type == 'success':
+                    bucket.success += 1
+                else:
+                    bucket.failed += 1
+                if bucket.ips is not None:
+                    bucket.ips.add(ip)
+                    bucket.users.add(user)
+
+    def record_event(self, parsed):
+        """Учесть разобранное событие ssh_monitor (время в формате '%Y-%m-%d %H:%M:%S')"""
+        try:
+            timestamp = datetime.strptime(parsed['timestamp'], '%Y-%m-%d %H:%M:%S').timestamp()
+        except (KeyError, ValueError):
+            timestamp = None
+        self.record(parsed['type'], parsed.get('ip', '?'), parsed.get('user', '?'), timestamp)
+
+    def query(self, window_seconds, now=None, level=None):
+        """
+        Сводка за окно: (успешных, неудачных, скетч IP, скетч пользователей, фактическое окно).
+        Уровень - самый мелкий, покрывающий окно (или level); у минутного уровня скетчей нет (None).
+        """
+        now = time.time() if now is None else now
+        since = now - window_seconds
+        with self.lock:
+            if level is None:
+                level = next((i for i, tier in enumerate(self.tiers) if window_seconds <= tier.span),
+                             len(self.tiers) - 1)
+            tier = self.tiers[level]
+            buckets = tier.buckets_since(since)
+            success = sum(bucket.success for bucket in buckets)
+            failed = sum(bucket.failed for bucket in buckets)
+            ips = users = None
+            if tier.capacity:
+                ips, users = SpaceSaving(tier.capacity), SpaceSaving(tier.capacity)
+                for bucket in buckets:
+                    ips.merge(bucket.ips)
+                    users.merge(bucket.users)
+        return success, failed, ips, users, min(window_seconds, tier.span)
+
+    def top_for_window(self, window_seconds, now=None):
+        """
+        Как query, но для окон минутного уровня частые IP и пользователи берутся
+        из часовых корзин. Возвращает еще признак такой замены.
+        """
+        success, failed, ips, users, covered = self.query(window_seconds, now)
+        if ips is not None:
+            return success, failed, ips, users, covered, False
+        _, _, ips, users, _ = self.query(window_seconds, now, level=1)
+        return success, failed, ips, users, covered, True
+
+
+def parse_window(text):
+    """'30m', '24h', '7d' или число часов -> секунды; ValueError для некорректного ввода"""
+    text = text.strip().lower()
+    units = {'m': MINUTE, 'h': HOUR, 'd': DAY}
+    if text[-1:] in units:
+        value, unit = text[:-1], units[text[-1]]
+    else:
+        value, unit = text, HOUR
+    seconds = int(float(value) * unit)
+    if seconds <= 0:
+        raise ValueError("Окно должно быть больше нуля")
+    return min(seconds, 30 * DAY)
+
+
+def format_window(seconds):
+    if seconds % DAY == 0:
+        return f"{seconds // DAY} д."
+    if seconds % HOUR == 0:
+        return f"{seconds // HOUR} ч."
+    return f"{seconds // MINUTE} мин."
+
+
+def render_stats(stats, window_seconds, limit=10):
+    """Текст ответа /ssh_stats (HTML)"""
+    started = time.perf_counter()
+    success, failed, ips, users, covered, hourly = stats.top_for_window(window_seconds)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    lines = [f"📈 <b>SSH за {format_window(covered)}</b>",
+             f"✅ Успешных входов: {success}",
+             f"❌ Неудачных попыток: {failed}"]
+    if covered < window_seconds:
+        lines.append(f"<i>История хранится {format_window(covered)}</i>")
+    if ips is not None and ips.total:
+        note = " (с точностью до часа)" if hourly else ""
+        lines.append(f"\n<b>Частые IP</b>{note}:")
+        lines.extend(f"• <code>{html.escape(ip)}</code> - {count}{f' (±{error})' if error else ''}" for ip, count, error in ips.top(limit))
+        lines.append(f"\n<b>Частые пользователи</b>{note}:")
+        lines.extend(f"• <code>{html.escape(user)}</code> - {count}{f' (±{error})' if error else ''}" for user, count, error in users.top(limit))
+    since = datetime.fromtimestamp(stats.started).strftime('%Y-%m-%d %H:%M')
+    lines.append(f"\n<i>Учет с {since}, событий: {stats.events}, ответ за {elapsed_ms:.1f} мс</i>")
+    return "\n".join(lines)
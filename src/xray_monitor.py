@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import html
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import logs
+import outbox
+from sketches import HyperLogLog
+
+# Загрузка конфигурации
+with open('config.json', 'r') as f:
+    config = json.load(f)
+
+# Пример строки access.log Xray (3x-ui):
+# 2025/09/17 10:22:45.123456 from 203.0.113.7:51234 accepted tcp:www.google.com:443 [inbound-443 >> direct] email: client1
+ACCESS_LINE_PATTERN = re.compile(
+    r'^(?P<time>\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2})(?:\.\d+)? '
+    r'(?:from )?(?:(?:tcp|udp):)?(?P<ip>\[[0-9A-Fa-f:.]+\]|[0-9.]+|[0-9A-Fa-f:]+):\d+ '
+    r'accepted .*?email: (?P<email>\S+)'
+)
+
+def log_message(message):
+    """Функция для логирования сообщений"""
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    log_entry = f"{timestamp} - XRAY_MONITOR - {message}"
+    print(log_entry)
+
+    try:
+        with open(config['log_file'], 'a') as log_file:
+            log_file.write(log_entry + '\n')
+    except Exception:
+        pass # Игнорируем ошибки записи в лог
+
+def send_telegram_message(message):
+    """Постановка сообщения владельцу в очередь отправки (outbox.py)"""
+    try:
+        outbox.shared(config, log_message).enqueue(config['owner_chat_id'], message)
+        return True
+    except Exception as e:
+        log_message(f"Ошибка постановки сообщения в очередь: {e}")
+        return False
+
+def parse_access_line(line):
+    """Разбор строки access.log. Возвращает (время, ip, email) или None для чужих строк"""
+    # Быстрый отсев строк без клиента до запуска регулярного выражения
+    if ' accepted ' not in line or 'email: ' not in line:
+        return None
+    match = ACCESS_LINE_PATTERN.match(line)
+    if not match:
+        return None
+    return match.group('time'), match.group('ip').strip('[]'), match.group('email')
+
+class ClientStats:
+    """Счетчики одного клиента: подключения и оценка уникальных IP в текущем окне"""
+    __slots__ = ('connections', 'window_connections', 'ips', 'unique_ips',
+                 'previous_unique_ips', 'last_ip', 'last_seen', 'alerted')
+
+    def __init__(self, precision):
+        self.connections = 0
+        self.window_connections = 0
+        self.ips = HyperLogLog(precision)
+        self.unique_ips = 0
+        self.previous_unique_ips = 0
+        self.last_ip = None
+        self.last_seen = 0.0
+        self.alerted = False
+
+class XrayAnalyzer:
+    """
+    Потоковый анализ access.log: счетчики подключений и оценка количества
+    уникальных IP на клиента в скользящем по окнам интервале (HyperLogLog).
+    Память на клиента фиксирована и не зависит от количества подключений.
+    """
+
+    def __init__(self, ip_limit=3, limits=None, window_seconds=3600, precision=10):
+        self.ip_limit = ip_limit
+        self.limits = limits or {}
+        self.window_seconds = window_seconds
+        self.precision = precision
+        self.window_started = time.time()
+        self.clients = {}
+        self.lines_total = 0
+        self.lock = threading.Lock()
+
+    def limit_for(self, email):
+        return self.limits.get(email, self.ip_limit)
+
+    def rotate_window(self, now):
+        """Начать новое окно: сбросить скетчи, забыть давно неактивных клиентов"""
+        stale_before = now - 2 * self.window_seconds
+        for email in [email for email, stats in self.clients.items() if stats.last_seen < stale_before]:
+            del self.clients[email]
+        for stats in self.clients.values():
+            stats.previous_unique_ips = stats.unique_ips
+            stats.unique_ips = 0
+            stats.window_connections = 0
+            stats.ips = HyperLogLog(self.precision)
+            stats.alerted = False
+        self.window_started = now
+
+    def add_lines(self, lines, now=None):
+        """Учесть новые строки лога. Возвращает список клиентов, впервые превысивших лимит в этом окне"""
+        now = now or time.time()
+        exceeded = []
+        with self.lock:
+            if now - self.window_started >= self.window_seconds:
+                self.rotate_window(now)
+            for line in lines:
+                self.lines_total += 1
+                parsed = parse_access_line(line)
+                if not parsed:
+                    continue
+                _, ip, email = parsed
+                stats = self.clients.get(email)
+                if stats is None:
+                    stats = self.clients[email] = ClientStats(self.precision)
+                stats.connections += 1
+                stats.window_connections += 1
+                stats.last_seen = now
+                if ip == stats.last_ip:
+                    continue
+                stats.last_ip = ip
+                # Пересчитываем оценку только если изменились регистры скетча
+                if stats.ips.add(ip):
+                    stats.unique_ips = stats.ips.count()
+                    if not stats.alerted and stats.unique_ips > self.limit_for(email):
+                        stats.alerted = True
+                        exceeded.append((email, stats.unique_ips, self.limit_for(email)))
+        return exceeded
+
+    def report(self, top=15):
+        """Клиенты, отсортированные по количеству уникальных IP: [(email, ips, прошлое окно, подключения, лимит)]"""
+        with self.lock:
+            rows = [
+                (email, stats.unique_ips, stats.previous_unique_ips, stats.window_connections, self.limit_for(email))
+                for email, stats in self.clients.items()
+            ]
+            window_minutes = int((time.time() - self.window_started) // 60)
+        rows.sort(key=lambda row: (row[1], row[3]), reverse=True)
+        return rows[:top], len(rows), window_minutes
+
+analyzer = XrayAnalyzer(
+    ip_limit=config.get('xray_ip_limit', 3),
+    limits=config.get('xray_ip_limits', {}),
+    window_seconds=config.get('xray_ip_window_minutes', 60) * 60,
+    precision=config.get('xray_hll_precision', 10),
+)
+
+# Признак того, что поток слежения за access.log запущен в этом процессе
+running = False
+
+def render_sharing_report(top=15):
+    """Текст отчета /sharing (HTML)"""
+    if not running:
+        return "ℹ️ Анализ access.log Xray не запущен (см. параметр xray_access_log)."
+
+    rows, total, window_minutes = analyzer.report(top)
+    if not rows:
+        return f"👥 <b>Совместное использование</b>\n\nПодключений клиентов за {window_minutes} мин. не было."
+
+    lines = []
+    for email, unique_ips, previous, connections, limit in rows:
+        mark = "🔴" if unique_ips > limit else "🟢"
+        lines.append(f"{mark} <code>{html.escape(email)}</code>: ~{unique_ips} IP (лимит {limit}, пред. окно ~{previous}), {connections} подкл.")
+
+    return (
+        f"👥 <b>Совместное использование</b> (окно {window_minutes} мин., клиентов: {total})\n\n"
+        + "\n".join(lines)
+    )
+
+def monitor_xray_access_log():
+    """Основной цикл слежения за access.log Xray"""
+    global running
+    path = config.get('xray_access_log', '/usr/local/x-ui/access.log')
+    log_message(f"Мониторинг access.log Xray запущен ({path})")
+
+    # Ждем появления лога: в настройках Xray он может быть отключен
+    while not os.path.exists(path):
+        time.sleep(60)
+
+    running = True
+    stat = os.stat(path)
+    inode, position = stat.st_ino, stat.st_size
+
+    while True:
+        try:
+            stat = os.stat(path)
+            if stat.st_ino != inode or stat.st_size < position:
+                # Лог ротирован или очищен панелью - продолжаем с начала
+                inode, position = stat.st_ino, 0
+
+            new_lines, position = logs.read_new_lines(path, position)
+            for email, unique_ips, limit in analyzer.add_lines(new_lines):
+                message = f"""👥 <b>Возможная передача аккаунта</b>
+
+<b>Клиент:</b> <code>{html.escape(email)}</code>
+<b>Уникальных IP за окно:</b> ~{unique_ips} (лимит {limit})"""
+                send_telegram_message(message)
+                log_message(f"Клиент {email}: ~{unique_ips} уникальных IP при лимите {limit}")
+
+            time.sleep(1)
+
+        except FileNotFoundError:
+            time.sleep(5)
+        except Exception as e:
+            log_message(f"Ошибка мониторинга access.log: {e}")
+            time.sleep(5)
+
+if __name__ == '__main__':
+    monitor_xray_access_log()
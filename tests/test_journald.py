@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Разбор записанного потока journalctl -o json (benchmarks/data/journald_sshd.jsonl)
+через JournaldSource(stream=...).
+
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from benchmarks.common import DATA_DIR, prepare_environment
+
+RECORDED = os.path.join(DATA_DIR, 'journald_sshd.jsonl')
+
+# Время в ожидаемых событиях - по __REALTIME_TIMESTAMP записи в UTC
+EXPECTED = [
+    ('failed', 'admin', '45.148.10.183', '51724', '2025-09-17 07:22:46'),
+    ('failed', 'root', '218.92.0.112', '23516', '2025-09-17 07:22:51'),
+    ('failed', 'root', '218.92.0.112', '23516', '2025-09-17 07:22:53'),
+    ('success', 'root', '203.0.113.25', '50312', '2025-09-17 07:22:58'),
+    ('failed', 'deploy', '2001:db8:85a3::8a2e:370:7334', '40022', '2025-09-17 07:23:02'),
+    ('success', 'deploy', '2001:db8:85a3::8a2e:370:7334', '40022', '2025-09-17 07:23:04'),
+    ('failed', 'test', '193.32.162.7', '38110', '2025-09-17 07:23:05'),
+    ('failed', '��', '193.32.162.7', '38112', '2025-09-17 07:23:07'),
+    ('failed', 'git', '198.51.100.77', '60111', '2025-09-17 07:23:14'),
+    ('success', 'git', '198.51.100.77', '60111', '2025-09-17 07:23:16'),
+]
+
+
+class JournaldStreamTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cwd = os.getcwd()
+        cls.tz = os.environ.get('TZ')
+        os.environ['TZ'] = 'UTC'
+        time.tzset()
+        cls.workdir = prepare_environment(tempfile.mkdtemp(prefix='bot-test-'))
+        import ssh_monitor
+        cls.ssh_monitor = ssh_monitor
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+        if cls.tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = cls.tz
+        time.tzset()
+
+    def replay(self, cursor_file):
+        with open(RECORDED, 'r') as f:
+            lines = f.readlines()
+        source = self.ssh_monitor.JournaldSource(stream=iter(lines), cursor_file=cursor_file)
+        source.start()
+        events = []
+        with self.assertRaises(EOFError):
+            while True:
+                events.extend(source.poll())
+        return source, events, [json.loads(line) for line in lines if line.strip()]
+
+    def test_events(self):
+        _, events, _ = self.replay(None)
+        self.assertEqual(
+            [(e['type'], e['user'], e['ip'], e['port'], e['timestamp']) for e in events],
+            EXPECTED,
+        )
+
+    def test_ipv6_deploy(self):
+        _, events, _ = self.replay(None)
+        deploy = [e for e in events if e['user'] == 'deploy']
+        self.assertEqual([e['type'] for e in deploy], ['failed', 'success'])
+        for event in deploy:
+            self.assertEqual(event['ip'], '2001:db8:85a3::8a2e:370:7334')
+            self.assertEqual(event['port'], '40022')
+            self.assertEqual(event['auth_type'], 'password')
+
+    def test_message_as_byte_array(self):
+        _, events, entries = self.replay(None)
+        self.assertTrue(any(isinstance(entry['MESSAGE'], list) for entry in entries))
+        event = next(e for e in events if e['port'] == '38112')
+        self.assertEqual(event['type'], 'failed')
+        self.assertEqual(event['ip'], '193.32.162.7')
+        self.assertEqual(event['user'], '��')
+
+    def test_cursor_saved(self):
+        cursor_file = os.path.join(self.workdir, 'state', 'journald_cursor')
+        source, _, entries = self.replay(cursor_file)
+        self.assertEqual(source.cursor, entries[-1]['__CURSOR'])
+        with open(cursor_file, 'r') as f:
+            self.assertEqual(f.read(), entries[-1]['__CURSOR'])
+
+
+if __name__ == '__main__':
+    unittest.main()